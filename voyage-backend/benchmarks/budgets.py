@@ -0,0 +1,74 @@
+"""
+Database round trip budgets per endpoint, so N+1 regressions fail CI
+
+Budgets are the most round trips one request to the endpoint may make. When a
+change legitimately needs another query, raise the budget in the same change.
+
+    with db_budget(4, "GET /offers/{offer_id}"):
+        await client.get(f"/api/v1/offers/{offer_id}", headers=headers)
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from benchmarks.environment import RoundTripCounter, current_counter
+from benchmarks.scenarios import Sample
+
+# Endpoint (as named in the scenarios) -> maximum round trips per request
+ROUTE_BUDGETS: Dict[str, int] = {
+    "GET /agents/dmc/search": 2,
+    "GET /bookings": 5,
+    "GET /bookings/{booking_id}": 4,
+    "GET /hotels/availability/search": 2,
+    "GET /hotels/search": 2,
+    "GET /hotels/{hotel_id}": 1,
+    "GET /offers/export": 4,
+    "GET /offers/{offer_id}": 4,
+    "POST /bookings": 7,
+    "POST /offers/request": 6,
+    "PUT /offers/{offer_id}/accept": 6,
+    "PUT /offers/{offer_id}/quote": 4,
+}
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def db_budget(max_round_trips: int, label: str = "block") -> Iterator[RoundTripCounter]:
+    """Fail if the database round trips made inside the block exceed the budget.
+
+    Requires the application to run on the counting database of a
+    BenchmarkEnvironment; the block's round trips are available on the
+    yielded counter.
+    """
+    counter = RoundTripCounter()
+    token = current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        current_counter.reset(token)
+
+    if counter.count > max_round_trips:
+        raise BudgetExceeded(f"{label}: {counter.count} database round trips, budget is {max_round_trips}")
+
+
+def check_budgets(samples: List[Sample], budgets: Optional[Dict[str, int]] = None) -> List[str]:
+    """Endpoints whose busiest request exceeded its budget, measured endpoints without one,
+    and endpoints that answered with a server error"""
+    budgets = ROUTE_BUDGETS if budgets is None else budgets
+    worst: Dict[str, int] = {}
+    server_errors: Dict[str, int] = {}
+    for sample in samples:
+        worst[sample.name] = max(worst.get(sample.name, 0), sample.round_trips)
+        if sample.status_code >= 500:
+            server_errors[sample.name] = server_errors.get(sample.name, 0) + 1
+
+    violations = [f"{name}: {count} server errors" for name, count in sorted(server_errors.items())]
+    for name, round_trips in sorted(worst.items()):
+        budget = budgets.get(name)
+        if budget is None:
+            violations.append(f"{name}: no round trip budget (measured {round_trips})")
+        elif round_trips > budget:
+            violations.append(f"{name}: {round_trips} round trips, budget is {budget}")
+    return violations
@@ -0,0 +1,218 @@
+"""
+Benchmark environment: database connection, round trip counting and seed data
+"""
+import inspect
+import os
+import random
+import sys
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Make the application and the seed data generators importable
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "src"))
+sys.path.insert(0, str(BACKEND_DIR / "scripts"))
+
+# Settings are read on import, so benchmark defaults must be in place first
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from faker import Faker
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from core.config import settings
+from core.security import create_access_token
+from db.mongodb import db as mongodb
+from services.hotel_index import hotel_search_index
+from data_generators.users import UserGenerator
+from data_generators.hotels import HotelGenerator
+from data_generators.offers import OfferGenerator
+from data_generators.bookings import BookingGenerator
+
+BENCHMARK_DATABASE = "voyage_benchmark"
+
+
+class RoundTripCounter:
+    """Number of database round trips made while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+
+
+# Counter for the request currently being measured; the ASGI app runs in the caller's task
+current_counter: ContextVar[Optional[RoundTripCounter]] = ContextVar("current_counter", default=None)
+
+
+def record_round_trip():
+    counter = current_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+class CountingCursor:
+    """Cursor proxy counting one round trip per consumption (getMore batches are not counted)"""
+
+    def __init__(self, cursor: Any):
+        self._cursor = cursor
+        self._started = False
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if result is self._cursor:
+                return self
+            if inspect.isawaitable(result):
+                record_round_trip()
+            return result
+
+        return wrapper
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._started:
+            self._started = True
+            record_round_trip()
+        return await self._cursor.__anext__()
+
+
+class CountingCollection:
+    """Collection proxy counting awaited operations and cursor consumption"""
+
+    def __init__(self, collection: Any):
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if inspect.isawaitable(result):
+                record_round_trip()
+                return result
+            if hasattr(result, "to_list"):
+                return CountingCursor(result)
+            return result
+
+        return wrapper
+
+    def with_options(self, **kwargs) -> "CountingCollection":
+        collection = self._collection.with_options(**kwargs)
+        if not inspect.iscoroutinefunction(collection.find_one):
+            # mongomock-motor hands back its synchronous collection; read
+            # preferences mean nothing in memory, so keep this one
+            return self
+        return CountingCollection(collection)
+
+
+class CountingDatabase:
+    """Database proxy handing out counting collections"""
+
+    def __init__(self, database: Any):
+        self._database = database
+
+    def __getitem__(self, name: str) -> CountingCollection:
+        return CountingCollection(self._database[name])
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._database, name)
+        if hasattr(attr, "find_one"):
+            return CountingCollection(attr)
+        if callable(attr):
+            def wrapper(*args, **kwargs):
+                result = attr(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    record_round_trip()
+                return result
+            return wrapper
+        return attr
+
+
+def create_client(mongo: str):
+    """Create a Motor client for a MongoDB URL, or an in-memory stand-in for "memory" """
+    if mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit(
+                "The in-memory backend needs mongomock-motor: pip install -r benchmarks/requirements.txt"
+            )
+        return AsyncMongoMockClient()
+    return AsyncIOMotorClient(mongo)
+
+
+class BenchmarkEnvironment:
+    """Seeded database wired into the application with round trip counting"""
+
+    def __init__(self, mongo: str = "memory", database_name: str = BENCHMARK_DATABASE, seed: int = 42):
+        self.mongo = mongo
+        self.database_name = database_name
+        self.seed = seed
+        self.client = None
+        self.database = None
+        self.travel_agents: List[Dict[str, Any]] = []
+        self.dmc_agents: List[Dict[str, Any]] = []
+        self.hotels: List[Dict[str, Any]] = []
+        self.active_hotels: List[Dict[str, Any]] = []
+        self.offers: List[Dict[str, Any]] = []
+        self.tokens: Dict[str, str] = {}
+        self.dmc_agents_by_id: Dict[Any, Dict[str, Any]] = {}
+
+    async def setup(self, num_agents: int = 25, num_hotels: int = 75, num_offers: int = 125):
+        """Connect, seed fresh data and point the application at the counting database"""
+        self.client = create_client(self.mongo)
+        self.database = self.client[self.database_name]
+        await self.client.drop_database(self.database_name)
+
+        await self.seed_data(num_agents, num_hotels, num_offers)
+
+        mongodb.client = self.client
+        mongodb.database = CountingDatabase(self.database)
+
+        # The application loads the search index at startup, which the benchmark client does not run
+        if settings.HOTEL_SEARCH_INDEX_ENABLED:
+            await hotel_search_index.load(self.database.hotels)
+
+    async def seed_data(self, num_agents: int, num_hotels: int, num_offers: int):
+        """Generate deterministic data with the seed data generators"""
+        random.seed(self.seed)
+        Faker.seed(self.seed)
+        fake = Faker()
+
+        users_data = await UserGenerator(self.database, fake).generate_users_and_agents(num_agents)
+        self.travel_agents = users_data["travel_agents"]
+        self.dmc_agents = users_data["dmc_agents"]
+        self.hotels = await HotelGenerator(self.database, fake).generate_hotels(self.dmc_agents, num_hotels)
+        self.offers = await OfferGenerator(self.database, fake).generate_offers(
+            self.travel_agents, self.dmc_agents, self.hotels, num_offers
+        )
+        await BookingGenerator(self.database, fake).generate_bookings(self.offers)
+
+        # Sign tokens directly so bcrypt logins do not dominate the measurements
+        for agent in self.travel_agents + self.dmc_agents:
+            self.tokens[str(agent["_id"])] = create_access_token(subject=str(agent["user_id"]))
+
+        # Scenarios only use bookable hotels, quoting as the DMC agent that owns them
+        self.active_hotels = [hotel for hotel in self.hotels if hotel["is_active"]]
+        self.dmc_agents_by_id = {agent["_id"]: agent for agent in self.dmc_agents}
+
+    def auth_headers(self, agent: Dict[str, Any]) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[str(agent['_id'])]}"}
+
+    async def teardown(self):
+        if self.client is not None:
+            await self.client.drop_database(self.database_name)
+            self.client.close()
+        await hotel_search_index.stop()
+        mongodb.client = None
+        mongodb.database = None
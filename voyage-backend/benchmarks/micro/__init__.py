@@ -0,0 +1 @@
+# Micro-benchmarks Package
\ No newline at end of file
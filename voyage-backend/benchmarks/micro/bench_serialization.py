@@ -0,0 +1,49 @@
+"""
+Serialization hot paths: document preparation and response model construction
+"""
+import copy
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from schemas.booking import BookingResponse
+from schemas.hotel import HotelResponse
+from schemas.offer import OfferResponse
+from utils.helpers import prepare_document_for_response
+
+RESPONSE_MODELS = {
+    "hotel": HotelResponse,
+    "offer": OfferResponse,
+    "booking": BookingResponse,
+}
+
+
+@pytest.mark.parametrize("name", sorted(RESPONSE_MODELS))
+def test_prepare_document_for_response(benchmark, raw_documents, name):
+    doc = raw_documents[name]
+
+    # prepare_document_for_response mutates its argument, so every round gets a fresh copy
+    result = benchmark.pedantic(
+        prepare_document_for_response,
+        setup=lambda: ((copy.deepcopy(doc),), {}),
+        rounds=2000
+    )
+    assert result["id"] == str(doc["_id"])
+
+
+@pytest.mark.parametrize("name", sorted(RESPONSE_MODELS))
+def test_response_model_construction(benchmark, prepared_documents, name):
+    model = RESPONSE_MODELS[name]
+    doc = prepared_documents[name]
+
+    result = benchmark(lambda: model(**doc))
+    assert result.id == doc["id"]
+
+
+@pytest.mark.parametrize("name", sorted(RESPONSE_MODELS))
+def test_response_model_dump(benchmark, prepared_documents, name):
+    response = RESPONSE_MODELS[name](**prepared_documents[name])
+
+    result = benchmark(response.model_dump_json)
+    assert result
@@ -0,0 +1,36 @@
+"""
+Validation and security hot paths run on every request
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from core.security import verify_token
+from models.base import PyObjectId
+from utils.validators import validate_object_id
+
+
+class ObjectIdHolder(BaseModel):
+    id: PyObjectId
+
+
+def test_validate_object_id(benchmark):
+    object_id = str(ObjectId())
+
+    assert benchmark(validate_object_id, object_id, "hotel_id") == object_id
+
+
+@pytest.mark.parametrize("as_string", [True, False], ids=["str", "objectid"])
+def test_pyobjectid_validation(benchmark, as_string):
+    object_id = ObjectId()
+    value = str(object_id) if as_string else object_id
+
+    result = benchmark(ObjectIdHolder, id=value)
+    assert result.id == object_id
+
+
+def test_verify_token(benchmark, access_token, raw_documents):
+    assert benchmark(verify_token, access_token) == str(raw_documents["user"]["_id"])
@@ -0,0 +1,69 @@
+"""
+Fixtures for the micro-benchmarks: realistic documents from the seed data generators
+"""
+import asyncio
+import copy
+import random
+
+import pytest
+from faker import Faker
+
+import benchmarks.environment  # noqa: F401  (puts src/ and scripts/ on sys.path, sets settings defaults)
+from data_generators.users import UserGenerator
+from data_generators.hotels import HotelGenerator
+from data_generators.offers import OfferGenerator
+from data_generators.bookings import BookingGenerator
+from core.security import create_access_token
+from utils.helpers import prepare_document_for_response
+
+SEED = 42
+
+
+class DiscardingCollection:
+    """Collection sink: the generators insert what they build, the benchmarks keep it in memory"""
+
+    async def insert_many(self, documents):
+        return None
+
+
+class DiscardingDatabase:
+    def __getattr__(self, name: str) -> DiscardingCollection:
+        return DiscardingCollection()
+
+
+async def generate_documents() -> dict:
+    random.seed(SEED)
+    Faker.seed(SEED)
+    fake = Faker()
+    db = DiscardingDatabase()
+
+    users_data = await UserGenerator(db, fake).generate_users_and_agents(10)
+    hotels = await HotelGenerator(db, fake).generate_hotels(users_data["dmc_agents"], 30)
+    offers = await OfferGenerator(db, fake).generate_offers(
+        users_data["travel_agents"], users_data["dmc_agents"], hotels, 60
+    )
+    bookings = await BookingGenerator(db, fake).generate_bookings(offers)
+
+    return {
+        "user": users_data["users"][0],
+        "hotel": hotels[0],
+        "offer": next(offer for offer in offers if offer.get("quoted_rooms")),
+        "booking": bookings[0]
+    }
+
+
+@pytest.fixture(scope="session")
+def raw_documents() -> dict:
+    """Raw MongoDB documents as stored (ObjectIds and datetimes)"""
+    return asyncio.run(generate_documents())
+
+
+@pytest.fixture(scope="session")
+def prepared_documents(raw_documents) -> dict:
+    """Documents as the services return them, ready for response models"""
+    return {name: prepare_document_for_response(copy.deepcopy(doc)) for name, doc in raw_documents.items()}
+
+
+@pytest.fixture(scope="session")
+def access_token(raw_documents) -> str:
+    return create_access_token(subject=str(raw_documents["user"]["_id"]))
@@ -0,0 +1,110 @@
+"""
+Benchmark statistics, baselines and regression checks
+"""
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.scenarios import Sample
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[Sample], duration: float) -> Dict[str, Any]:
+    """Latency percentiles (ms), throughput and round trips per request, overall and per endpoint"""
+
+    def stats(group: List[Sample]) -> Dict[str, Any]:
+        latencies = sorted(sample.latency * 1000 for sample in group)
+        return {
+            "requests": len(group),
+            "errors": sum(1 for sample in group if sample.status_code >= 400),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "round_trips": round(sum(sample.round_trips for sample in group) / len(group), 2) if group else 0
+        }
+
+    endpoints: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        endpoints.setdefault(sample.name, []).append(sample)
+
+    overall = stats(samples)
+    overall["duration_s"] = round(duration, 3)
+    overall["throughput_rps"] = round(len(samples) / duration, 2) if duration else 0
+
+    return {
+        "overall": overall,
+        "endpoints": {name: stats(group) for name, group in sorted(endpoints.items())}
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    header = f"{'endpoint':<34}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'trips':>8}"
+    lines = [header, "-" * len(header)]
+
+    for name, stats in list(summary["endpoints"].items()) + [("TOTAL", summary["overall"])]:
+        lines.append(
+            f"{name:<34}{stats['requests']:>7}{stats['errors']:>6}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['round_trips']:>8.2f}"
+        )
+
+    overall = summary["overall"]
+    lines.append("")
+    lines.append(f"Throughput: {overall['throughput_rps']:.2f} req/s over {overall['duration_s']:.2f}s")
+    return "\n".join(lines)
+
+
+def baseline_path(name: str) -> Path:
+    """Baselines are referenced by name (stored in benchmarks/baselines) or by path"""
+    path = Path(name)
+    if path.suffix == ".json" or path.parent != Path("."):
+        return path
+    return BASELINES_DIR / f"{name}.json"
+
+
+def save_baseline(name: str, result: Dict[str, Any]) -> Path:
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2, sort_keys=True))
+    return path
+
+
+def load_baseline(name: str) -> Dict[str, Any]:
+    return json.loads(baseline_path(name).read_text())
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """List regressions: p95 latency beyond the tolerance, more round trips, or new errors"""
+    regressions = []
+
+    for name, stats in current["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+
+        if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms"
+            )
+        if stats["round_trips"] > before["round_trips"]:
+            regressions.append(
+                f"{name}: round trips {before['round_trips']:.2f} -> {stats['round_trips']:.2f}"
+            )
+        if stats["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {stats['errors']}")
+
+    before_rps = baseline["overall"]["throughput_rps"]
+    after_rps = current["overall"]["throughput_rps"]
+    if after_rps < before_rps * (1 - tolerance):
+        regressions.append(f"throughput {before_rps:.2f} -> {after_rps:.2f} req/s")
+
+    return regressions
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Load-test the API in process and report latency, throughput and DB round trips
+
+Usage (from voyage-backend/):
+    python -m benchmarks.run --mix mixed --operations 500 --concurrency 20
+    python -m benchmarks.run --mongo mongodb://localhost:27017 --save local
+    python -m benchmarks.run --compare local
+    python -m benchmarks.run --check-budgets
+"""
+import argparse
+import asyncio
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.budgets import check_budgets
+from benchmarks.environment import BenchmarkEnvironment
+from benchmarks.report import compare, format_summary, load_baseline, save_baseline, summarize
+from benchmarks.scenarios import MIXES, SCENARIOS, Sample, Session
+
+
+async def run_operations(
+    client: httpx.AsyncClient,
+    env: BenchmarkEnvironment,
+    mix: Dict[str, int],
+    operations: int,
+    concurrency: int,
+    seed: int
+) -> List[Sample]:
+    """Run scenarios drawn from the mix on `concurrency` concurrent workers"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    remaining = operations
+    samples: List[Sample] = []
+
+    async def worker(worker_id: int):
+        nonlocal remaining
+        session = Session(client, env, random.Random(seed + worker_id))
+        while remaining > 0:
+            remaining -= 1
+            scenario = SCENARIOS[session.rng.choices(names, weights)[0]]
+            await scenario(session)
+        samples.extend(session.samples)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Voyage API in process")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed",
+                        help="Scenario mix to run (default: mixed)")
+    parser.add_argument("--operations", type=int, default=300,
+                        help="Scenarios to run, each one or more requests (default: 300)")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="Concurrent virtual users (default: 10)")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="Unmeasured scenarios run first (default: 20)")
+    parser.add_argument("--mongo", default="memory",
+                        help='MongoDB URL, or "memory" for the in-process stand-in (default: memory)')
+    parser.add_argument("--agents", type=int, default=25, help="Seeded agents (default: 25)")
+    parser.add_argument("--hotels", type=int, default=75, help="Seeded hotels (default: 75)")
+    parser.add_argument("--offers", type=int, default=125, help="Seeded offers (default: 125)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--save", metavar="BASELINE",
+                        help="Save results as a baseline (name in benchmarks/baselines or a .json path)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Compare against a baseline and exit non-zero on regressions")
+    parser.add_argument("--check-budgets", action="store_true",
+                        help="Exit non-zero if any request exceeds its endpoint's round trip budget")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before flagging a regression (default: 0.2)")
+    args = parser.parse_args()
+
+    # Imported after the environment module has set benchmark defaults for the settings
+    from main import app
+
+    env = BenchmarkEnvironment(args.mongo, seed=args.seed)
+    print(f"Seeding {args.agents} agents, {args.hotels} hotels and {args.offers} offers ({args.mongo})...")
+    await env.setup(args.agents, args.hotels, args.offers)
+
+    mix = MIXES[args.mix]
+    try:
+        # Application errors are recorded as 500s rather than aborting the run
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            if args.warmup:
+                await run_operations(client, env, mix, args.warmup, min(args.concurrency, args.warmup), args.seed)
+
+            print(f"Running {args.operations} '{args.mix}' scenarios with concurrency {args.concurrency}...")
+            started = time.perf_counter()
+            samples = await run_operations(
+                client, env, mix, args.operations, args.concurrency, args.seed + 1000
+            )
+            duration = time.perf_counter() - started
+    finally:
+        await env.teardown()
+
+    result = summarize(samples, duration)
+    result["meta"] = {
+        "mix": args.mix,
+        "operations": args.operations,
+        "concurrency": args.concurrency,
+        "backend": "memory" if args.mongo == "memory" else "mongod",
+        "python": platform.python_version(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+    print()
+    print(format_summary(result))
+
+    if args.save:
+        path = save_baseline(args.save, result)
+        print(f"\nBaseline saved to {path}")
+
+    failed = False
+    if args.check_budgets:
+        violations = check_budgets(samples)
+        if violations:
+            print("\nRound trip budgets exceeded:")
+            for violation in violations:
+                print(f"  - {violation}")
+            failed = True
+        else:
+            print("\nAll endpoints within their round trip budgets")
+
+    if args.compare:
+        regressions = compare(load_baseline(args.compare), result, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against '{args.compare}':")
+            for regression in regressions:
+                print(f"  - {regression}")
+            failed = True
+        else:
+            print(f"\nNo regressions against '{args.compare}'")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
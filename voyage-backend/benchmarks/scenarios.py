@@ -0,0 +1,190 @@
+"""
+Benchmark scenarios: user journeys made of one or more API requests
+"""
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.environment import BenchmarkEnvironment, RoundTripCounter, current_counter
+
+API = "/api/v1"
+
+
+@dataclass
+class Sample:
+    """One measured request"""
+    name: str
+    status_code: int
+    latency: float
+    round_trips: int
+
+
+class Session:
+    """Issues requests against the app and records a sample for each"""
+
+    def __init__(self, client: httpx.AsyncClient, env: BenchmarkEnvironment, rng: random.Random):
+        self.client = client
+        self.env = env
+        self.rng = rng
+        self.samples: List[Sample] = []
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        counter = RoundTripCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        finally:
+            latency = time.perf_counter() - started
+            current_counter.reset(token)
+
+        self.samples.append(Sample(name, response.status_code, latency, counter.count))
+        return response
+
+
+def random_stay(rng: random.Random) -> Dict[str, str]:
+    check_in = date.today() + timedelta(days=rng.randint(14, 120))
+    check_out = check_in + timedelta(days=rng.randint(2, 7))
+    return {"check_in_date": check_in.isoformat(), "check_out_date": check_out.isoformat()}
+
+
+async def search(session: Session):
+    """Browse: hotel search, DMC agent search, availability and a hotel detail page"""
+    rng = session.rng
+    hotel = rng.choice(session.env.active_hotels)
+    location = hotel["location"]
+
+    await session.request(
+        "GET /hotels/search", "GET", f"{API}/hotels/search",
+        params={
+            "city": location["city"],
+            "sort": rng.choice(["price_asc", "rating"]),
+            "facets": ["star_rating", "amenities", "price"],
+            "size": 20
+        }
+    )
+    await session.request(
+        "GET /agents/dmc/search", "GET", f"{API}/agents/dmc/search",
+        params={"country": location["country"], "size": 20}
+    )
+    await session.request(
+        "GET /hotels/availability/search", "GET", f"{API}/hotels/availability/search",
+        params={"country": location["country"], **random_stay(rng)}
+    )
+    await session.request("GET /hotels/{hotel_id}", "GET", f"{API}/hotels/{hotel['_id']}")
+
+
+async def offer_lifecycle(session: Session) -> Optional[Dict[str, Any]]:
+    """Travel agent requests a quote, the DMC agent quotes it and the travel agent reviews and accepts it"""
+    rng = session.rng
+    env = session.env
+    travel_agent = rng.choice(env.travel_agents)
+    hotel = rng.choice(env.active_hotels)
+    dmc_agent = env.dmc_agents_by_id[hotel["dmc_agent_id"]]
+    room_rate = rng.choice(hotel["room_types"])
+
+    response = await session.request(
+        "POST /offers/request", "POST", f"{API}/offers/request",
+        headers=env.auth_headers(travel_agent),
+        json={
+            "hotel_id": str(hotel["_id"]),
+            "rooms": [{"room_type": room_rate["room_type"], "quantity": 1, "adults": 2}],
+            **random_stay(rng)
+        }
+    )
+    if response.status_code != 200:
+        return None
+    offer = response.json()["data"]
+
+    rate = room_rate["base_rate"]
+    response = await session.request(
+        "PUT /offers/{offer_id}/quote", "PUT", f"{API}/offers/{offer['id']}/quote",
+        headers=env.auth_headers(dmc_agent),
+        json={
+            "quoted_rooms": [{
+                "room_type": room_rate["room_type"],
+                "quantity": 1,
+                "rate_per_night": rate,
+                "total_rate": rate * 3
+            }],
+            "total_price": rate * 3
+        }
+    )
+    if response.status_code != 200:
+        return None
+
+    # The travel agent reviews the quote before accepting it
+    await session.request(
+        "GET /offers/{offer_id}", "GET", f"{API}/offers/{offer['id']}",
+        headers=env.auth_headers(travel_agent)
+    )
+
+    response = await session.request(
+        "PUT /offers/{offer_id}/accept", "PUT", f"{API}/offers/{offer['id']}/accept",
+        headers=env.auth_headers(travel_agent)
+    )
+    if response.status_code != 200:
+        return None
+
+    return {"offer": offer, "travel_agent": travel_agent}
+
+
+async def booking(session: Session):
+    """Accept an offer, book it, then read the booking back"""
+    accepted = await offer_lifecycle(session)
+    if not accepted:
+        return
+
+    headers = session.env.auth_headers(accepted["travel_agent"])
+    response = await session.request(
+        "POST /bookings", "POST", f"{API}/bookings",
+        headers=headers,
+        json={
+            "offer_id": accepted["offer"]["id"],
+            "lead_guest": {"first_name": "Bench", "last_name": "Mark"}
+        }
+    )
+    if response.status_code != 200:
+        return
+
+    booking_id = response.json()["data"]["id"]
+    await session.request("GET /bookings/{booking_id}", "GET", f"{API}/bookings/{booking_id}", headers=headers)
+    await session.request("GET /bookings", "GET", f"{API}/bookings", headers=headers, params={"size": 20})
+
+
+async def export(session: Session):
+    """Travel agent exports the offers checking in over the coming months"""
+    travel_agent = session.rng.choice(session.env.travel_agents)
+    today = date.today()
+    await session.request(
+        "GET /offers/export", "GET", f"{API}/offers/export",
+        headers=session.env.auth_headers(travel_agent),
+        params={
+            "format": "ndjson",
+            "check_in_from": today.isoformat(),
+            "check_in_to": (today + timedelta(days=120)).isoformat()
+        }
+    )
+
+
+Scenario = Callable[[Session], Awaitable[Any]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "search": search,
+    "offer_lifecycle": offer_lifecycle,
+    "booking": booking,
+    "export": export,
+}
+
+# Weighted scenario mixes selectable from the command line
+MIXES: Dict[str, Dict[str, int]] = {
+    "mixed": {"search": 65, "offer_lifecycle": 20, "booking": 10, "export": 5},
+    "search": {"search": 1},
+    "offers": {"offer_lifecycle": 1},
+    "bookings": {"booking": 1},
+    "exports": {"export": 1},
+}
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Recompute the search fields of existing hotels: amenity and room type bitmasks and USD prices
+Run it once for hotels stored before these fields existed; the API reprices hotels itself when exchange rates change
+"""
+import asyncio
+import argparse
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from core.config import settings
+from services.hotel import HotelService
+from services.exchange_rates import exchange_rates
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Recompute hotel bitmasks and USD prices')
+    parser.add_argument('--batch-size', type=int, default=500,
+                       help='Updates sent per bulk write (default: 500)')
+    parser.add_argument('--mongodb-url', type=str,
+                       help='MongoDB connection URL (default: from settings)')
+    parser.add_argument('--database', type=str,
+                       help='Database name (default: from settings)')
+
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongodb_url or settings.MONGODB_URL)
+    db = client[args.database or settings.DATABASE_NAME]
+
+    try:
+        await exchange_rates.refresh()
+        updated = await HotelService(db).refresh_search_fields(exchange_rates.rates, args.batch_size)
+        print(f"✓ Updated the search fields of {updated} hotels")
+    except Exception as e:
+        print(f"❌ Error during backfill: {e}")
+        return 1
+    finally:
+        client.close()
+
+    return 0
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    sys.exit(exit_code)
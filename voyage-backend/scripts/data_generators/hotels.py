@@ -10,6 +10,8 @@ from bson import ObjectId
 
 # Import models and enums
 from models.hotel import Hotel, HotelLocation, RoomRate, HotelAmenity, RoomType
+from services.hotel import compute_search_fields
+from services.exchange_rates import exchange_rates
 
 class HotelGenerator:
     def __init__(self, db, faker):
@@ -238,6 +240,7 @@ class HotelGenerator:
                     "created_at": datetime.utcnow() - timedelta(days=random.randint(30, 730)),
                     "updated_at": datetime.utcnow() - timedelta(days=random.randint(0, 30))
                 }
+                hotel.update(compute_search_fields(hotel, exchange_rates.rates))
                 
                 hotels.append(hotel)
         
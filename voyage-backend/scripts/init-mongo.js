@@ -6,6 +6,8 @@ db.createCollection('dmc_agents');
 db.createCollection('hotels');
 db.createCollection('offers');
 db.createCollection('bookings');
+db.createCollection('idempotency_keys');
+db.createCollection('slow_queries', { capped: true, size: 16 * 1024 * 1024 });
 
 // Create indexes for better performance
 db.users.createIndex({ "email": 1 }, { unique: true });
@@ -15,11 +17,34 @@ db.dmc_agents.createIndex({ "regions": 1 });
 db.dmc_agents.createIndex({ "specializations": 1 });
 db.hotels.createIndex({ "dmc_agent_id": 1 });
 db.hotels.createIndex({ "location.country": 1, "location.city": 1 });
+// Amenity and room type filters ($bitsAllSet / $bitsAnySet) are evaluated on the index keys
+db.hotels.createIndex({ "is_active": 1, "amenity_mask": 1, "room_type_mask": 1 });
+// USD price range filters and the price and rating orderings of the searches
+db.hotels.createIndex({ "is_active": 1, "min_rate_usd": 1 });
+db.hotels.createIndex({ "is_active": 1, "max_rate_usd": 1 });
+db.hotels.createIndex({ "is_active": 1, "star_rating": -1 });
+// Change polling of the in-memory hotel search index
+db.hotels.createIndex({ "updated_at": 1 });
+db.hotels.createIndex({ "created_at": 1 });
+db.hotels.createIndex({ "search_updated_at": 1 });
+db.hotels.createIndex(
+    { "dmc_agent_id": 1, "external_id": 1 },
+    { unique: true, partialFilterExpression: { "external_id": { $type: "string" } } }
+);
 db.offers.createIndex({ "travel_agent_id": 1 });
 db.offers.createIndex({ "dmc_agent_id": 1 });
 db.offers.createIndex({ "status": 1 });
 db.offers.createIndex({ "created_at": 1 });
+db.offers.createIndex(
+    { "rfq_id": 1, "travel_agent_id": 1 },
+    { partialFilterExpression: { "rfq_id": { $type: "objectId" } } }
+);
+db.offers.createIndex({ "travel_agent_id": 1, "created_at": -1 });
+db.offers.createIndex({ "dmc_agent_id": 1, "created_at": -1 });
 db.bookings.createIndex({ "offer_id": 1 });
+db.bookings.createIndex({ "travel_agent_id": 1, "booking_date": -1 });
+db.bookings.createIndex({ "dmc_agent_id": 1, "booking_date": -1 });
 db.bookings.createIndex({ "confirmation_number": 1 }, { unique: true });
+db.idempotency_keys.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
 
 print('Database initialized successfully');
\ No newline at end of file
@@ -1,8 +1,11 @@
-from fastapi import HTTPException, status, Depends
+import secrets
+from typing import Optional
+from fastapi import HTTPException, status, Depends, Header
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from services.auth import get_current_active_user
 from services.agent import AgentService
+from core.config import settings
 from core.constants import UserType
 from db.session import get_db
 
@@ -82,4 +85,20 @@ async def require_verified_agent(
             detail="Verified agent status required"
         )
     
-    return agent
\ No newline at end of file
+    return agent
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency to require the operator token for admin endpoints"""
+    if not settings.ADMIN_API_KEY:
+        # Admin endpoints are disabled unless a key is configured
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
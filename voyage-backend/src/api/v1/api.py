@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from api.v1.endpoints import auth, agents, hotels, offers, bookings
+from api.v1.endpoints import auth, agents, hotels, offers, bookings, events, admin
 
 api_router = APIRouter()
 
@@ -8,4 +8,6 @@ api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(agents.router, prefix="/agents", tags=["agents"])
 api_router.include_router(hotels.router, prefix="/hotels", tags=["hotels"])
 api_router.include_router(offers.router, prefix="/offers", tags=["offers"])
-api_router.include_router(bookings.router, prefix="/bookings", tags=["bookings"])
\ No newline at end of file
+api_router.include_router(bookings.router, prefix="/bookings", tags=["bookings"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
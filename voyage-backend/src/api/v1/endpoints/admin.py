@@ -0,0 +1,187 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from api.dependencies import require_admin
+from services.slow_queries import SlowQueryService
+from schemas.admin import (
+    SlowQueryShape, ProfilingRequest, ProfilingStatus, MemoryTracingRequest, MemoryStatus,
+    MemorySnapshot, MemoryDiff, RouteAllocation
+)
+from schemas.base import ResponseModel
+from db.session import get_db
+from core.config import settings
+from core.profiling import request_profiler
+from core.memory import GROUP_BY, memory_profiler
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+GROUP_BY_PATTERN = f"^({'|'.join(GROUP_BY)})$"
+
+
+@router.get("/slow-queries", response_model=ResponseModel[List[SlowQueryShape]])
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=100),
+    collection: Optional[str] = Query(None, description="Only shapes on this collection"),
+    since_hours: Optional[int] = Query(None, ge=1, description="Only queries logged in the last N hours"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Slow query shapes ranked by total time spent, with the explain of each new shape"""
+    slow_query_service = SlowQueryService(db)
+    shapes = await slow_query_service.rank_shapes(limit, collection, since_hours)
+    
+    return ResponseModel(
+        data=[SlowQueryShape(**shape) for shape in shapes],
+        message=f"Found {len(shapes)} slow query shapes"
+    )
+
+
+@router.post("/profiling", response_model=ResponseModel[ProfilingStatus])
+async def start_profiling(profiling_request: ProfilingRequest):
+    """Sample the stacks of the next N requests to a route (replaces any earlier session)"""
+    if not profiling_request.route.startswith("/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Route must be a path template starting with /"
+        )
+    
+    try:
+        session = request_profiler.arm(
+            profiling_request.route,
+            profiling_request.method,
+            profiling_request.requests,
+            settings.PROFILING_SAMPLE_INTERVAL_MS / 1000
+        )
+    except (AssertionError, ValueError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid route template: {exc}"
+        )
+    
+    return ResponseModel(
+        data=ProfilingStatus(**session.summary()),
+        message=f"Profiling the next {session.requests} {session.method} {session.route} requests"
+    )
+
+
+@router.get("/profiling")
+async def get_profiling(
+    format: str = Query("json", pattern="^(json|folded)$", description="folded: stacks for flamegraph.pl or speedscope")
+):
+    """Progress and results of the current profiling session"""
+    session = request_profiler.session
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No profiling session"
+        )
+    
+    if format == "folded":
+        return PlainTextResponse(session.folded())
+    
+    return ResponseModel(
+        data=ProfilingStatus(**session.summary()),
+        message="Profiling finished" if session.finished else "Profiling in progress"
+    )
+
+
+@router.delete("/profiling", response_model=ResponseModel[ProfilingStatus])
+async def stop_profiling():
+    """Stop profiling further requests, keeping the samples collected so far"""
+    session = request_profiler.session
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No profiling session"
+        )
+    
+    request_profiler.disarm()
+    return ResponseModel(
+        data=ProfilingStatus(**session.summary()),
+        message="Profiling stopped"
+    )
+
+
+@router.get("/memory", response_model=ResponseModel[MemoryStatus])
+async def get_memory_status():
+    """tracemalloc state, traced and resident memory"""
+    return ResponseModel(data=MemoryStatus(**memory_profiler.status()))
+
+
+@router.post("/memory/tracing", response_model=ResponseModel[MemoryStatus])
+async def start_memory_tracing(tracing_request: MemoryTracingRequest):
+    """Start tracing allocations (slows the worker down while enabled)"""
+    memory_profiler.start_tracing(tracing_request.frames)
+    return ResponseModel(
+        data=MemoryStatus(**memory_profiler.status()),
+        message=f"Tracing allocations with {tracing_request.frames} frames"
+    )
+
+
+@router.delete("/memory/tracing", response_model=ResponseModel[MemoryStatus])
+async def stop_memory_tracing():
+    """Stop tracing allocations; snapshots already taken are kept"""
+    memory_profiler.stop_tracing()
+    return ResponseModel(
+        data=MemoryStatus(**memory_profiler.status()),
+        message="Stopped tracing allocations"
+    )
+
+
+@router.post("/memory/snapshots", response_model=ResponseModel[MemorySnapshot])
+async def take_memory_snapshot(
+    group_by: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Snapshot traced allocations and list the largest allocation sites"""
+    if not memory_profiler.status()["tracing"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Allocation tracing is not running; start it with POST /admin/memory/tracing"
+        )
+    
+    snapshot_id, taken_at, snapshot = memory_profiler.take_snapshot()
+    snapshot_status = memory_profiler.status()
+    
+    return ResponseModel(
+        data=MemorySnapshot(
+            snapshot_id=snapshot_id,
+            taken_at=taken_at,
+            traced_bytes=snapshot_status["traced_bytes"],
+            rss_bytes=snapshot_status["rss_bytes"],
+            top=memory_profiler.top(snapshot, group_by, limit)
+        ),
+        message=f"Snapshot {snapshot_id} taken"
+    )
+
+
+@router.get("/memory/snapshots/{snapshot_id}/diff", response_model=ResponseModel[MemoryDiff])
+async def diff_memory_snapshots(
+    snapshot_id: int,
+    against: Optional[int] = Query(None, description="Earlier snapshot (default: the previous one)"),
+    group_by: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Allocation sites that grew the most between two snapshots"""
+    diff = memory_profiler.diff(snapshot_id, against, group_by, limit)
+    if diff is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Snapshot not found, or no earlier snapshot to compare with"
+        )
+    
+    return ResponseModel(
+        data=MemoryDiff(**diff),
+        message=f"Snapshot {diff['snapshot_id']} against {diff['against_id']}"
+    )
+
+
+@router.get("/memory/routes", response_model=ResponseModel[List[RouteAllocation]])
+async def get_route_allocations(limit: int = Query(20, ge=1, le=100)):
+    """Routes ranked by average peak allocation per sampled request (MEMORY_ROUTE_SAMPLE_RATE)"""
+    routes = memory_profiler.route_allocations(limit)
+    return ResponseModel(
+        data=[RouteAllocation(**route) for route in routes],
+        message=f"Found {len(routes)} sampled routes"
+    )
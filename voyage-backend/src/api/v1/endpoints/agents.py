@@ -1,5 +1,5 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from services.auth import get_current_active_user
@@ -12,6 +12,8 @@ from schemas.agent import (
 from schemas.base import ResponseModel, PaginationParams, PaginatedResponse
 from db.session import get_db
 from core.constants import UserType
+from utils.validators import validate_object_id
+from utils.etag import compute_etag, etag_matches, not_modified_response
 
 router = APIRouter()
 
@@ -68,6 +70,8 @@ async def get_my_travel_agent_profile(
 @router.put("/travel/me", response_model=ResponseModel[TravelAgentResponse])
 async def update_my_travel_agent_profile(
     update_data: TravelAgentUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -88,7 +92,11 @@ async def update_my_travel_agent_profile(
             detail="Travel agent profile not found"
         )
     
-    agent = await agent_service.update_travel_agent(current_agent["id"], current_user["id"], update_data)
+    agent = await agent_service.update_travel_agent(
+        current_agent["id"], current_user["id"], update_data, if_match
+    )
+    
+    response.headers["ETag"] = compute_etag(agent)
     
     return ResponseModel(
         data=TravelAgentResponse(**agent),
@@ -166,6 +174,8 @@ async def get_my_dmc_agent_profile(
 @router.put("/dmc/me", response_model=ResponseModel[DMCAgentResponse])
 async def update_my_dmc_agent_profile(
     update_data: DMCAgentUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -186,7 +196,11 @@ async def update_my_dmc_agent_profile(
             detail="DMC agent profile not found"
         )
     
-    agent = await agent_service.update_dmc_agent(current_agent["id"], current_user["id"], update_data)
+    agent = await agent_service.update_dmc_agent(
+        current_agent["id"], current_user["id"], update_data, if_match
+    )
+    
+    response.headers["ETag"] = compute_etag(agent)
     
     return ResponseModel(
         data=DMCAgentResponse(**agent),
@@ -232,10 +246,21 @@ async def search_dmc_agents(
 @router.get("/dmc/{agent_id}", response_model=ResponseModel[DMCAgentResponse])
 async def get_dmc_agent(
     agent_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get DMC agent by ID"""
+    validate_object_id(agent_id, "agent_id")
+    
     agent_service = AgentService(db)
+    
+    # Answer conditional requests from a projection-only read
+    if if_none_match:
+        version = await agent_service.get_dmc_agent_version(agent_id)
+        if version and etag_matches(if_none_match, compute_etag(version)):
+            return not_modified_response(compute_etag(version))
+    
     agent = await agent_service.get_dmc_agent(agent_id)
     
     if not agent:
@@ -244,6 +269,8 @@ async def get_dmc_agent(
             detail="DMC agent not found"
         )
     
+    response.headers["ETag"] = compute_etag(agent)
+    
     return ResponseModel(
         data=DMCAgentResponse(**agent),
         message="DMC agent retrieved successfully"
@@ -1,25 +1,52 @@
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from services.auth import get_current_active_user
 from services.booking import BookingService
+from services.idempotency import IdempotencyService
 from services.agent import AgentService
 from schemas.booking import (
     BookingCreate, BookingUpdate, BookingResponse, BookingCancellation, BookingSearchFilters
 )
 from schemas.base import ResponseModel, PaginationParams, PaginatedResponse
 from db.session import get_db
-from core.constants import UserType, BookingStatus, PaymentStatus
+from core.constants import UserType, BookingStatus, PaymentStatus, ExportFormat
 from utils.validators import validate_object_id
+from utils.export import EXPORT_MEDIA_TYPES, export_filename
+from utils.etag import compute_etag, etag_matches, not_modified_response
+from middleware.compression import compression_exempt
 
 router = APIRouter()
 
 
+async def check_booking_access(db: AsyncIOMotorDatabase, current_user: dict, booking: dict):
+    """Raise 403 unless the current user is a party to the booking"""
+    if current_user["user_type"] == UserType.TRAVEL_AGENT:
+        agent_service = AgentService(db)
+        travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
+        if not travel_agent or booking["travel_agent_id"] != travel_agent["id"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+    elif current_user["user_type"] == UserType.DMC_AGENT:
+        agent_service = AgentService(db)
+        dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
+        if not dmc_agent or booking["dmc_agent_id"] != dmc_agent["id"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+
+
 @router.post("", response_model=ResponseModel[BookingResponse])
 async def create_booking(
     booking_data: BookingCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -41,7 +68,17 @@ async def create_booking(
         )
     
     booking_service = BookingService(db)
-    booking = await booking_service.create_booking(travel_agent["id"], booking_data)
+    idempotency_service = IdempotencyService(db)
+    booking, replayed = await idempotency_service.execute(
+        idempotency_key,
+        current_user["id"],
+        "bookings.create",
+        booking_data.dict(),
+        lambda: booking_service.create_booking(travel_agent["id"], booking_data)
+    )
+    
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     
     return ResponseModel(
         data=BookingResponse(**booking),
@@ -106,6 +143,49 @@ async def get_booking_statistics(
     )
 
 
+@router.get("/export", response_class=StreamingResponse)
+@compression_exempt
+async def export_bookings(
+    format: ExportFormat = Query(ExportFormat.CSV),
+    compress: bool = Query(False, description="Gzip-compress the export"),
+    status: BookingStatus = Query(None),
+    payment_status: PaymentStatus = Query(None),
+    hotel_id: str = Query(None),
+    confirmation_number: str = Query(None),
+    booking_from: datetime = Query(None),
+    booking_to: datetime = Query(None),
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Stream all bookings matching the filters as CSV or NDJSON (filtered by user type)"""
+    if hotel_id:
+        validate_object_id(hotel_id, "hotel_id")
+    
+    filters = BookingSearchFilters(
+        status=status,
+        payment_status=payment_status,
+        hotel_id=hotel_id,
+        confirmation_number=confirmation_number,
+        booking_from=booking_from,
+        booking_to=booking_to
+    )
+    
+    booking_service = BookingService(db)
+    query = await booking_service.build_search_query(
+        current_user["id"], 
+        current_user["user_type"], 
+        filters
+    )
+    
+    filename = export_filename("bookings", format, compress)
+    
+    return StreamingResponse(
+        booking_service.export_bookings(query, format, compress),
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/confirmation/{confirmation_number}", response_model=ResponseModel[BookingResponse])
 async def get_booking_by_confirmation(
     confirmation_number: str,
@@ -123,22 +203,7 @@ async def get_booking_by_confirmation(
         )
     
     # Check if user has access to this booking
-    if current_user["user_type"] == UserType.TRAVEL_AGENT:
-        agent_service = AgentService(db)
-        travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
-        if not travel_agent or booking["travel_agent_id"] != travel_agent["id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
-    elif current_user["user_type"] == UserType.DMC_AGENT:
-        agent_service = AgentService(db)
-        dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
-        if not dmc_agent or booking["dmc_agent_id"] != dmc_agent["id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
+    await check_booking_access(db, current_user, booking)
     
     return ResponseModel(
         data=BookingResponse(**booking),
@@ -149,6 +214,8 @@ async def get_booking_by_confirmation(
 @router.get("/{booking_id}", response_model=ResponseModel[BookingResponse])
 async def get_booking(
     booking_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -156,6 +223,14 @@ async def get_booking(
     validate_object_id(booking_id, "booking_id")
     
     booking_service = BookingService(db)
+    
+    # Answer conditional requests from a projection-only read, still enforcing access
+    if if_none_match:
+        version = await booking_service.get_booking_version(booking_id)
+        if version and etag_matches(if_none_match, compute_etag(version)):
+            await check_booking_access(db, current_user, version)
+            return not_modified_response(compute_etag(version))
+    
     booking = await booking_service.get_booking(booking_id)
     
     if not booking:
@@ -165,22 +240,9 @@ async def get_booking(
         )
     
     # Check if user has access to this booking
-    if current_user["user_type"] == UserType.TRAVEL_AGENT:
-        agent_service = AgentService(db)
-        travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
-        if not travel_agent or booking["travel_agent_id"] != travel_agent["id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
-    elif current_user["user_type"] == UserType.DMC_AGENT:
-        agent_service = AgentService(db)
-        dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
-        if not dmc_agent or booking["dmc_agent_id"] != dmc_agent["id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
+    await check_booking_access(db, current_user, booking)
+    
+    response.headers["ETag"] = compute_etag(booking)
     
     return ResponseModel(
         data=BookingResponse(**booking),
@@ -192,6 +254,8 @@ async def get_booking(
 async def update_booking(
     booking_id: str,
     update_data: BookingUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -215,7 +279,9 @@ async def update_booking(
         )
     
     booking_service = BookingService(db)
-    booking = await booking_service.update_booking(booking_id, travel_agent["id"], update_data)
+    booking = await booking_service.update_booking(booking_id, travel_agent["id"], update_data, if_match)
+    
+    response.headers["ETag"] = compute_etag(booking)
     
     return ResponseModel(
         data=BookingResponse(**booking),
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from services.auth import get_current_active_user
+from services.agent import AgentService
+from services.events import event_broker, travel_agent_channel, dmc_agent_channel
+from db.session import get_db
+from core.constants import UserType
+
+router = APIRouter()
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_events(
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Stream offer and booking status changes for the current agent (Server-Sent Events)"""
+    agent_service = AgentService(db)
+    channels = []
+    
+    if current_user["user_type"] == UserType.TRAVEL_AGENT:
+        travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
+        if travel_agent:
+            channels.append(travel_agent_channel(travel_agent["id"]))
+    elif current_user["user_type"] == UserType.DMC_AGENT:
+        dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
+        if dmc_agent:
+            channels.append(dmc_agent_channel(dmc_agent["id"]))
+    
+    if not channels:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agent profile not found. Please create your profile first."
+        )
+    
+    return StreamingResponse(
+        event_broker.stream(channels),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,17 +1,19 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from services.auth import get_current_active_user
 from services.hotel import HotelService
 from services.agent import AgentService
 from schemas.hotel import (
-    HotelCreate, HotelUpdate, HotelResponse, HotelSearchFilters
+    HotelCreate, HotelUpdate, HotelResponse, HotelSearchFilters, HotelSearchPage, HotelFacets,
+    HotelSyncRequest, HotelSyncResult
 )
 from schemas.base import ResponseModel, PaginationParams, PaginatedResponse
 from db.session import get_db
-from core.constants import UserType, HotelAmenity, RoomType
+from core.constants import UserType, HotelAmenity, RoomType, MatchMode, HotelSort, HotelFacet
 from utils.validators import validate_object_id
+from utils.etag import compute_etag, etag_matches, not_modified_response
 
 router = APIRouter()
 
@@ -48,7 +50,39 @@ async def create_hotel(
     )
 
 
-@router.get("/search", response_model=ResponseModel[PaginatedResponse[HotelResponse]])
+@router.post("/sync", response_model=ResponseModel[HotelSyncResult])
+async def sync_hotels(
+    sync_data: HotelSyncRequest,
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Sync supplier hotel catalogue, writing only changed hotels (DMC agents only)"""
+    if current_user["user_type"] != UserType.DMC_AGENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only DMC agents can sync hotels"
+        )
+    
+    # Get DMC agent profile
+    agent_service = AgentService(db)
+    dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
+    
+    if not dmc_agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="DMC agent profile not found. Please create your profile first."
+        )
+    
+    hotel_service = HotelService(db)
+    result = await hotel_service.sync_hotels(dmc_agent["id"], sync_data.hotels)
+    
+    return ResponseModel(
+        data=HotelSyncResult(**result),
+        message="Hotel catalogue synced successfully"
+    )
+
+
+@router.get("/search", response_model=ResponseModel[HotelSearchPage])
 async def search_hotels(
     country: str = Query(None),
     city: str = Query(None),
@@ -57,8 +91,11 @@ async def search_hotels(
     max_star_rating: int = Query(None),
     amenities: List[HotelAmenity] = Query(None),
     room_types: List[RoomType] = Query(None),
-    min_rate: float = Query(None),
-    max_rate: float = Query(None),
+    match: MatchMode = Query(MatchMode.ANY, description="Require all or any of the amenities and room types"),
+    min_rate: float = Query(None, description="Lowest room rate in USD"),
+    max_rate: float = Query(None, description="Highest room rate in USD"),
+    sort: HotelSort = Query(None, description="Order by price (cheapest room in USD) or star rating; newest first by default"),
+    facets: List[HotelFacet] = Query(None, description="Also count the matching hotels per value of these facets"),
     pagination: PaginationParams = Depends(),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -71,15 +108,18 @@ async def search_hotels(
         max_star_rating=max_star_rating,
         amenities=amenities,
         room_types=room_types,
+        match=match,
         min_rate=min_rate,
         max_rate=max_rate
     )
     
     hotel_service = HotelService(db)
-    result = await hotel_service.search_hotels(filters, pagination)
+    result = await hotel_service.search_hotels(filters, pagination, sort, facets)
     
     hotels = [HotelResponse(**hotel) for hotel in result["items"]]
-    paginated_response = PaginatedResponse.create(hotels, result["total"], pagination)
+    paginated_response = HotelSearchPage.create(hotels, result["total"], pagination)
+    if result.get("facets"):
+        paginated_response.facets = HotelFacets(**result["facets"])
     
     return ResponseModel(
         data=paginated_response,
@@ -125,12 +165,21 @@ async def get_my_hotels(
 @router.get("/{hotel_id}", response_model=ResponseModel[HotelResponse])
 async def get_hotel(
     hotel_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get hotel by ID"""
     validate_object_id(hotel_id, "hotel_id")
     
     hotel_service = HotelService(db)
+    
+    # Answer conditional requests from a projection-only read
+    if if_none_match:
+        version = await hotel_service.get_hotel_version(hotel_id)
+        if version and etag_matches(if_none_match, compute_etag(version)):
+            return not_modified_response(compute_etag(version))
+    
     hotel = await hotel_service.get_hotel(hotel_id)
     
     if not hotel:
@@ -139,6 +188,8 @@ async def get_hotel(
             detail="Hotel not found"
         )
     
+    response.headers["ETag"] = compute_etag(hotel)
+    
     return ResponseModel(
         data=HotelResponse(**hotel),
         message="Hotel retrieved successfully"
@@ -149,6 +200,8 @@ async def get_hotel(
 async def update_hotel(
     hotel_id: str,
     update_data: HotelUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -172,7 +225,9 @@ async def update_hotel(
         )
     
     hotel_service = HotelService(db)
-    hotel = await hotel_service.update_hotel(hotel_id, dmc_agent["id"], update_data)
+    hotel = await hotel_service.update_hotel(hotel_id, dmc_agent["id"], update_data, if_match)
+    
+    response.headers["ETag"] = compute_etag(hotel)
     
     return ResponseModel(
         data=HotelResponse(**hotel),
@@ -229,6 +284,8 @@ async def search_available_hotels(
     city: str = Query(None),
     amenities: List[HotelAmenity] = Query(None),
     room_types: List[RoomType] = Query(None),
+    match: MatchMode = Query(MatchMode.ANY, description="Require all or any of the amenities and room types"),
+    sort: HotelSort = Query(None, description="Order by price (cheapest room in USD) or star rating; highest rated first by default"),
     pagination: PaginationParams = Depends(),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -237,12 +294,13 @@ async def search_available_hotels(
         country=country,
         city=city,
         amenities=amenities,
-        room_types=room_types
+        room_types=room_types,
+        match=match
     )
     
     hotel_service = HotelService(db)
     result = await hotel_service.get_available_hotels(
-        check_in_date, check_out_date, rooms, filters, pagination
+        check_in_date, check_out_date, rooms, filters, pagination, sort
     )
     
     hotels = [HotelResponse(**hotel) for hotel in result["items"]]
@@ -1,25 +1,53 @@
 from datetime import date, datetime
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from services.auth import get_current_active_user
 from services.offer import OfferService
+from services.idempotency import IdempotencyService
 from services.agent import AgentService
 from schemas.offer import (
-    OfferCreate, OfferQuote, OfferResponse, OfferSearchFilters
+    OfferCreate, OfferRFQCreate, OfferQuote, OfferResponse, OfferSearchFilters,
+    OfferQuoteBatch, OfferQuoteBatchResponse, RFQResponse, RFQComparisonResponse
 )
 from schemas.base import ResponseModel, PaginationParams, PaginatedResponse
 from db.session import get_db
-from core.constants import UserType, OfferStatus
+from core.constants import UserType, OfferStatus, ExportFormat
 from utils.validators import validate_object_id
+from utils.export import EXPORT_MEDIA_TYPES, export_filename
+from utils.etag import compute_etag, etag_matches, not_modified_response
+from middleware.compression import compression_exempt
 
 router = APIRouter()
 
 
+async def check_offer_access(db: AsyncIOMotorDatabase, current_user: dict, offer: dict):
+    """Raise 403 unless the current user is a party to the offer"""
+    if current_user["user_type"] == UserType.TRAVEL_AGENT:
+        agent_service = AgentService(db)
+        travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
+        if not travel_agent or offer["travel_agent_id"] != travel_agent["id"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+    elif current_user["user_type"] == UserType.DMC_AGENT:
+        agent_service = AgentService(db)
+        dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
+        if not dmc_agent or offer["dmc_agent_id"] != dmc_agent["id"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+
+
 @router.post("/request", response_model=ResponseModel[OfferResponse])
 async def create_offer_request(
     offer_data: OfferCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -41,7 +69,17 @@ async def create_offer_request(
         )
     
     offer_service = OfferService(db)
-    offer = await offer_service.create_offer_request(travel_agent["id"], offer_data)
+    idempotency_service = IdempotencyService(db)
+    offer, replayed = await idempotency_service.execute(
+        idempotency_key,
+        current_user["id"],
+        "offers.request",
+        offer_data.dict(),
+        lambda: offer_service.create_offer_request(travel_agent["id"], offer_data)
+    )
+    
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     
     return ResponseModel(
         data=OfferResponse(**offer),
@@ -49,6 +87,75 @@ async def create_offer_request(
     )
 
 
+@router.post("/rfq", response_model=ResponseModel[RFQResponse])
+async def create_rfq(
+    rfq_data: OfferRFQCreate,
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Request quotes from many hotels in one call (travel agents only)"""
+    if current_user["user_type"] != UserType.TRAVEL_AGENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only travel agents can create offer requests"
+        )
+    
+    for hotel_id in rfq_data.hotel_ids:
+        validate_object_id(hotel_id, "hotel_id")
+    
+    # Get travel agent profile
+    agent_service = AgentService(db)
+    travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
+    
+    if not travel_agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Travel agent profile not found. Please create your profile first."
+        )
+    
+    offer_service = OfferService(db)
+    rfq = await offer_service.create_rfq(travel_agent["id"], rfq_data)
+    
+    return ResponseModel(
+        data=RFQResponse(**rfq),
+        message="Offer requests created successfully"
+    )
+
+
+@router.get("/rfq/{rfq_id}", response_model=ResponseModel[RFQComparisonResponse])
+async def get_rfq_offers(
+    rfq_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Compare the quotes received for an RFQ side by side (travel agents only)"""
+    if current_user["user_type"] != UserType.TRAVEL_AGENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only travel agents can view RFQs"
+        )
+    
+    validate_object_id(rfq_id, "rfq_id")
+    
+    # Get travel agent profile
+    agent_service = AgentService(db)
+    travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
+    
+    if not travel_agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Travel agent profile not found"
+        )
+    
+    offer_service = OfferService(db)
+    comparison = await offer_service.get_rfq_offers(rfq_id, travel_agent["id"])
+    
+    return ResponseModel(
+        data=RFQComparisonResponse(**comparison),
+        message="RFQ offers retrieved successfully"
+    )
+
+
 @router.get("", response_model=ResponseModel[PaginatedResponse[OfferResponse]])
 async def list_offers(
     status: OfferStatus = Query(None),
@@ -59,8 +166,8 @@ async def list_offers(
     check_in_to: date = Query(None),
     created_from: datetime = Query(None),
     created_to: datetime = Query(None),
-    min_price: float = Query(None),
-    max_price: float = Query(None),
+    min_price: float = Query(None, description="Lowest total price in USD"),
+    max_price: float = Query(None, description="Highest total price in USD"),
     pagination: PaginationParams = Depends(),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
@@ -96,6 +203,60 @@ async def list_offers(
     )
 
 
+@router.get("/export", response_class=StreamingResponse)
+@compression_exempt
+async def export_offers(
+    format: ExportFormat = Query(ExportFormat.CSV),
+    compress: bool = Query(False, description="Gzip-compress the export"),
+    status: OfferStatus = Query(None),
+    hotel_id: str = Query(None),
+    dmc_agent_id: str = Query(None),
+    travel_agent_id: str = Query(None),
+    check_in_from: date = Query(None),
+    check_in_to: date = Query(None),
+    created_from: datetime = Query(None),
+    created_to: datetime = Query(None),
+    min_price: float = Query(None, description="Lowest total price in USD"),
+    max_price: float = Query(None, description="Highest total price in USD"),
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Stream all offers matching the filters as CSV or NDJSON (filtered by user type)"""
+    for field_name, value in (
+        ("hotel_id", hotel_id), ("dmc_agent_id", dmc_agent_id), ("travel_agent_id", travel_agent_id)
+    ):
+        if value:
+            validate_object_id(value, field_name)
+    
+    filters = OfferSearchFilters(
+        status=status,
+        hotel_id=hotel_id,
+        dmc_agent_id=dmc_agent_id,
+        travel_agent_id=travel_agent_id,
+        check_in_from=check_in_from,
+        check_in_to=check_in_to,
+        created_from=created_from,
+        created_to=created_to,
+        min_price=min_price,
+        max_price=max_price
+    )
+    
+    offer_service = OfferService(db)
+    query = await offer_service.build_search_query(
+        current_user["id"], 
+        current_user["user_type"], 
+        filters
+    )
+    
+    filename = export_filename("offers", format, compress)
+    
+    return StreamingResponse(
+        offer_service.export_offers(query, format, compress),
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/statistics", response_model=ResponseModel[dict])
 async def get_offer_statistics(
     current_user: dict = Depends(get_current_active_user),
@@ -117,6 +278,8 @@ async def get_offer_statistics(
 @router.get("/{offer_id}", response_model=ResponseModel[OfferResponse])
 async def get_offer(
     offer_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -124,6 +287,14 @@ async def get_offer(
     validate_object_id(offer_id, "offer_id")
     
     offer_service = OfferService(db)
+    
+    # Answer conditional requests from a projection-only read, still enforcing access
+    if if_none_match:
+        version = await offer_service.get_offer_version(offer_id)
+        if version and etag_matches(if_none_match, compute_etag(version)):
+            await check_offer_access(db, current_user, version)
+            return not_modified_response(compute_etag(version))
+    
     offer = await offer_service.get_offer(offer_id)
     
     if not offer:
@@ -133,22 +304,9 @@ async def get_offer(
         )
     
     # Check if user has access to this offer
-    if current_user["user_type"] == UserType.TRAVEL_AGENT:
-        agent_service = AgentService(db)
-        travel_agent = await agent_service.get_travel_agent_by_user_id(current_user["id"])
-        if not travel_agent or offer["travel_agent_id"] != travel_agent["id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
-    elif current_user["user_type"] == UserType.DMC_AGENT:
-        agent_service = AgentService(db)
-        dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
-        if not dmc_agent or offer["dmc_agent_id"] != dmc_agent["id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
+    await check_offer_access(db, current_user, offer)
+    
+    response.headers["ETag"] = compute_etag(offer)
     
     return ResponseModel(
         data=OfferResponse(**offer),
@@ -156,6 +314,38 @@ async def get_offer(
     )
 
 
+@router.put("/quotes/batch", response_model=ResponseModel[OfferQuoteBatchResponse])
+async def quote_offers_batch(
+    batch_data: OfferQuoteBatch,
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Provide quotes for many offers at once (DMC agents only)"""
+    if current_user["user_type"] != UserType.DMC_AGENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only DMC agents can provide quotes"
+        )
+    
+    # Get DMC agent profile
+    agent_service = AgentService(db)
+    dmc_agent = await agent_service.get_dmc_agent_by_user_id(current_user["id"])
+    
+    if not dmc_agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="DMC agent profile not found"
+        )
+    
+    offer_service = OfferService(db)
+    result = await offer_service.quote_offers_batch(dmc_agent["id"], batch_data.quotes)
+    
+    return ResponseModel(
+        data=OfferQuoteBatchResponse(**result),
+        message=f"{result['quoted']} of {result['total']} quotes provided successfully"
+    )
+
+
 @router.put("/{offer_id}/quote", response_model=ResponseModel[OfferResponse])
 async def quote_offer(
     offer_id: str,
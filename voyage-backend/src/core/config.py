@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import AnyHttpUrl, validator
 from pydantic_settings import BaseSettings
 
@@ -13,18 +13,145 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
     
+    # Server (src/server.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: int = 0  # Worker processes; 0 runs one per available CPU
+    SERVER_BACKLOG: int = 2048  # Pending connections the listening socket queues
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30  # Time workers get to drain requests on SIGTERM
+    
     # Database
     MONGODB_URL: str
     DATABASE_NAME: str = "voyage_db"
+    MONGODB_WARM_CONNECTIONS: int = 4  # Pool connections opened at startup, before serving
+    MONGODB_MAX_POOL_SIZE: int = 100  # Connections per server, per worker process
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_IDLE_TIME_MS: Optional[int] = 300000  # Idle pool connections are closed after this
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = 5000  # Wait for a free pool connection before failing
+    MONGODB_CONNECT_TIMEOUT_MS: int = 5000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_SOCKET_TIMEOUT_MS: Optional[int] = 30000
+    MONGODB_TIMEOUT_MS: Optional[int] = None  # Client-wide operation timeout (timeoutMS); unset for none
+    MONGODB_COMPRESSORS: str = ""  # Wire compression, comma-separated in preference order: zstd (needs zstandard), snappy (needs python-snappy), zlib
+    MONGODB_SEARCH_READ_PREFERENCE: str = "secondaryPreferred"  # Public searches; state transitions always read the primary
+    MONGODB_SEARCH_MAX_STALENESS_SECONDS: int = 90  # Secondaries lagging more are not read; -1 for no limit (min 90)
+    MONGODB_SEARCH_TIMEOUT_MS: int = 3000  # Time budget of search queries; 0 for none
+    MONGODB_REPORT_TIMEOUT_MS: int = 15000  # Time budget of statistics aggregations; 0 for none
+    
+    # In-memory hotel search index (one per worker)
+    HOTEL_SEARCH_INDEX_ENABLED: bool = True
+    HOTEL_SEARCH_INDEX_CHANGE_STREAM: bool = True  # Follow a change stream (replica sets); otherwise poll
+    HOTEL_SEARCH_INDEX_POLL_SECONDS: float = 5.0  # Polling interval for changed hotels without change streams
+    
+    # Hotel search facets
+    HOTEL_FACET_PRICE_BOUNDARIES: List[float] = [0, 50, 100, 200, 300, 500, 1000]  # USD, by cheapest room; the last bucket is open-ended
+    HOTEL_FACET_CITY_LIMIT: int = 50  # Cities with the most hotels
+    HOTEL_FACET_CACHE_SECONDS: float = 60.0  # Counts can lag writes by this long; 0 disables the cache
+    HOTEL_FACET_CACHE_SIZE: int = 1024  # Cached (filter, facet) counts per worker
+    
+    # Currency conversion
+    EXCHANGE_RATE_PROVIDER: str = "static"  # "static" (EXCHANGE_RATES_USD), "file" (EXCHANGE_RATE_FILE) or "http" (EXCHANGE_RATE_API_URL)
+    EXCHANGE_RATE_FILE: str = "exchange_rates.json"  # {"base": "USD", "rates": {"EUR": 0.93, ...}}: units per one base
+    EXCHANGE_RATE_API_URL: str = "https://v6.exchangerate-api.com/v6/{api_key}/latest/USD"  # Formatted with EXCHANGE_RATE_API_KEY
+    EXCHANGE_RATE_REFRESH_SECONDS: int = 3600  # One worker fetches the rates this often and stores them in MongoDB
+    EXCHANGE_RATE_SYNC_SECONDS: int = 60  # Each worker adopts the stored rates this often
+    EXCHANGE_RATE_TIMEOUT_SECONDS: float = 10.0
+    EXCHANGE_RATES_USD: Dict[str, float] = {  # USD value of one unit; the static rates, and those used until the first refresh
+        "USD": 1.0,
+        "EUR": 1.08,
+        "GBP": 1.27,
+        "CHF": 1.13,
+        "JPY": 0.0067,
+        "AUD": 0.66,
+        "CAD": 0.73,
+        "AED": 0.2723,
+        "THB": 0.028,
+    }
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     
+    # Event streaming
+    EVENTS_BACKEND: str = "memory"  # "memory" (single worker) or "redis" (pub/sub across workers)
+    EVENTS_QUEUE_SIZE: int = 100  # Events buffered per connection before it must resync
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    
+    # Idempotency keys
+    IDEMPOTENCY_TTL_HOURS: int = 24  # How long responses are kept for replay
+    IDEMPOTENCY_WAIT_SECONDS: int = 10  # How long a duplicate waits for the first execution
+    IDEMPOTENCY_LOCK_SECONDS: int = 60  # After this an unfinished execution is considered abandoned
+    
+    # Metrics
+    METRICS_ENABLED: bool = True  # Expose Prometheus metrics at /metrics
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    
+    # Per-request database stats (Server-Timing header and metrics)
+    REQUEST_DB_STATS_ENABLED: bool = True
+    REQUEST_DB_STATS_MEASURE_BYTES: bool = False  # Re-encodes every reply to measure bytes read; for investigations only
+    REQUEST_DB_STATS_SERVER_TIMING: bool = False  # Send Server-Timing to every client, not only requests with the admin token
+    
+    # Profiling
+    EVENT_LOOP_WATCHDOG_ENABLED: bool = True
+    EVENT_LOOP_BLOCK_THRESHOLD_MS: int = 500  # Log the stack of code blocking the loop this long
+    PROFILING_SAMPLE_INTERVAL_MS: float = 1.0  # Stack sampling interval of admin-armed request profiling
+    MEMORY_TRACEMALLOC_FRAMES: int = 10  # Frames kept per traced allocation
+    MEMORY_ROUTE_SAMPLE_RATE: float = 0.0  # Fraction of requests whose peak allocation is measured; > 0 starts tracemalloc
+    
+    # Slow query log
+    SLOW_QUERY_LOG_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: int = 100  # Commands slower than this are logged by query shape
+    SLOW_QUERY_EXPLAIN: bool = True  # Capture explain("executionStats") for each new slow shape
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = 5000
+    SLOW_QUERY_LOG_SIZE_MB: int = 16  # Size of the capped slow_queries collection
+    
+    # Request deadlines (bound each request's MongoDB operations; 504 once spent)
+    REQUEST_DEADLINE_ENABLED: bool = True
+    REQUEST_DEADLINE_MS: int = 10000  # Default per request; 0 for none
+    REQUEST_DEADLINE_RULES: Dict[str, int] = {  # Per path prefix
+        "/api/v1/hotels/search": 2500,
+        "/api/v1/hotels/availability/search": 2500,
+        "/api/v1/agents/dmc/search": 2500,
+    }
+    REQUEST_DEADLINE_EXCLUDED_PATHS: List[str] = [  # Streaming responses read the database after the handler returns
+        "/health",
+        "/metrics",
+        "/api/v1/events/stream",
+        "/api/v1/offers/export",
+        "/api/v1/bookings/export",
+    ]
+    
+    # Rate limiting and load shedding
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per worker) or "redis" (shared across workers)
+    RATE_LIMIT_DEFAULT: str = "300/minute"  # Per client, across all routes without a rule
+    RATE_LIMIT_RULES: Dict[str, str] = {  # Per client and path prefix
+        "/api/v1/auth/login": "10/minute",
+        "/api/v1/auth/register": "5/minute",
+        "/api/v1/hotels/search": "60/minute",
+        "/api/v1/hotels/availability/search": "60/minute",
+        "/api/v1/agents/dmc/search": "60/minute",
+    }
+    RATE_LIMIT_EXCLUDED_PATHS: List[str] = ["/health", "/metrics"]
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # Enable only behind a trusted proxy
+    MAX_IN_FLIGHT_REQUESTS: int = 256  # 0 disables load shedding
+    MAX_QUEUED_REQUESTS: int = 256  # Requests waiting for a slot before new ones get 503
+    REQUEST_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    
+    # Response compression
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # Smaller bodies are sent uncompressed
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Compressed bodies kept for reuse
+    COMPRESSION_EXCLUDED_PATHS: List[str] = ["/health"]
+    
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    ADMIN_API_KEY: Optional[str] = None  # X-Admin-Token for /admin endpoints; unset disables them
     
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
@@ -52,6 +52,33 @@ class RoomType(str, Enum):
     PRESIDENTIAL = "presidential"
 
 
+class MatchMode(str, Enum):
+    """How a list filter matches: the hotel has all of the values, or any of them"""
+    ALL = "all"
+    ANY = "any"
+
+
+class HotelSort(str, Enum):
+    """Orderings offered by the hotel searches; prices sort by the cheapest room in USD"""
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+    RATING = "rating"
+
+
+class HotelFacet(str, Enum):
+    """Counts the hotel search can return alongside a page"""
+    STAR_RATING = "star_rating"
+    AMENITIES = "amenities"
+    ROOM_TYPES = "room_types"
+    CITY = "city"
+    PRICE = "price"
+
+
+# Bit of each amenity and room type in hotel bitmasks; bits are persisted, so only append members
+AMENITY_BITS = {amenity.value: 1 << bit for bit, amenity in enumerate(HotelAmenity)}
+ROOM_TYPE_BITS = {room_type.value: 1 << bit for bit, room_type in enumerate(RoomType)}
+
+
 class Specialization(str, Enum):
     LUXURY = "luxury"
     BUDGET = "budget"
@@ -65,8 +92,34 @@ class Specialization(str, Enum):
     GROUPS = "groups"
 
 
+class IdempotencyStatus(str, Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class OperationClass(str, Enum):
+    """Database read workloads with their own read preference and time budget"""
+    SEARCH = "search"
+    REPORT = "report"
+
+
 # Common constants
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp"]
 DEFAULT_PAGE_SIZE = 20
-MAX_PAGE_SIZE = 100
\ No newline at end of file
+MAX_PAGE_SIZE = 100
+EXPORT_BATCH_SIZE = 1000  # Documents per cursor batch when streaming exports
+EXPORT_FLUSH_SIZE = 64 * 1024  # Bytes buffered before an export chunk is sent
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
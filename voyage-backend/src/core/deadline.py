@@ -0,0 +1,21 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+# Monotonic time by which the current request must be answered; None when it has no deadline
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """Whether a driver error means a deadline or time budget was exhausted"""
+    return isinstance(exc, PyMongoError) and exc.timeout
@@ -0,0 +1,152 @@
+import os
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from core.metrics import HTTP_REQUEST_PEAK_ALLOCATION
+
+# Snapshots kept for diffing; each holds every traced allocation, so they are not cheap
+MAX_SNAPSHOTS = 5
+
+# Allocations made by the tracing machinery itself are left out of the statistics
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def format_traceback(traceback: tracemalloc.Traceback) -> List[str]:
+    """Allocation sites, innermost last"""
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+
+
+class RouteAllocationStats:
+    def __init__(self):
+        self.samples = 0
+        self.total_peak = 0
+        self.max_peak = 0
+        self.total_retained = 0
+
+    def add(self, peak: int, retained: int):
+        self.samples += 1
+        self.total_peak += peak
+        self.max_peak = max(self.max_peak, peak)
+        self.total_retained += retained
+
+
+class MemoryProfiler:
+    """tracemalloc snapshots and diffs, plus sampled per-route peak allocation"""
+
+    def __init__(self):
+        self.snapshots: "OrderedDict[int, Tuple[datetime, tracemalloc.Snapshot]]" = OrderedDict()
+        self.routes: Dict[Tuple[str, str], RouteAllocationStats] = {}
+        self.sampling = False
+        self._next_snapshot_id = 1
+
+    def status(self) -> dict:
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "rss_bytes": rss_bytes(),
+            "snapshots": list(self.snapshots)
+        }
+
+    def start_tracing(self, frames: int):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+
+    def stop_tracing(self):
+        """Stop tracing; snapshots already taken are kept"""
+        tracemalloc.stop()
+
+    def take_snapshot(self) -> Tuple[int, datetime, tracemalloc.Snapshot]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        snapshot_id = self._next_snapshot_id
+        self._next_snapshot_id += 1
+        taken_at = datetime.utcnow()
+
+        self.snapshots[snapshot_id] = (taken_at, snapshot)
+        while len(self.snapshots) > MAX_SNAPSHOTS:
+            self.snapshots.popitem(last=False)
+        return snapshot_id, taken_at, snapshot
+
+    def top(self, snapshot: tracemalloc.Snapshot, group_by: str, limit: int) -> List[dict]:
+        """Largest allocation sites in a snapshot"""
+        return [
+            {"traceback": format_traceback(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(group_by)[:limit]
+        ]
+
+    def diff(self, snapshot_id: int, against_id: Optional[int], group_by: str, limit: int) -> Optional[dict]:
+        """Allocation growth from an earlier snapshot (the previous one by default) to `snapshot_id`"""
+        if snapshot_id not in self.snapshots:
+            return None
+        if against_id is None:
+            earlier = [sid for sid in self.snapshots if sid < snapshot_id]
+            if not earlier:
+                return None
+            against_id = earlier[-1]
+        if against_id not in self.snapshots:
+            return None
+
+        stats = self.snapshots[snapshot_id][1].compare_to(self.snapshots[against_id][1], group_by)
+        return {
+            "snapshot_id": snapshot_id,
+            "against_id": against_id,
+            "size_diff_bytes": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "traceback": format_traceback(stat.traceback),
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff
+                }
+                for stat in stats[:limit]
+            ]
+        }
+
+    def record_route(self, method: str, route: str, peak: int, retained: int):
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = RouteAllocationStats()
+        stats.add(peak, retained)
+        HTTP_REQUEST_PEAK_ALLOCATION.labels(method, route).observe(peak)
+
+    def route_allocations(self, limit: int) -> List[dict]:
+        """Sampled routes ranked by average peak allocation per request"""
+        ranked = sorted(
+            self.routes.items(), key=lambda item: item[1].total_peak / item[1].samples, reverse=True
+        )
+        return [
+            {
+                "method": method,
+                "route": route,
+                "samples": stats.samples,
+                "avg_peak_bytes": stats.total_peak // stats.samples,
+                "max_peak_bytes": stats.max_peak,
+                "avg_retained_bytes": stats.total_retained // stats.samples
+            }
+            for (method, route), stats in ranked[:limit]
+        ]
+
+
+memory_profiler = MemoryProfiler()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+# Label used for requests that did not match any route, keeping label cardinality bounded
+UNMATCHED_ROUTE = "<unmatched>"
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "voyage_http_requests_total",
+    "HTTP requests by route template and status code",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "voyage_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "voyage_http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum"
+)
+HTTP_REQUEST_DB_COMMANDS = Histogram(
+    "voyage_http_request_db_commands",
+    "MongoDB commands issued per request by route template",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+)
+HTTP_REQUEST_DB_DOCUMENTS = Histogram(
+    "voyage_http_request_db_documents",
+    "MongoDB documents returned per request by route template",
+    ["method", "route"],
+    buckets=(0, 1, 5, 10, 20, 50, 100, 250, 500, 1000, 5000)
+)
+HTTP_REQUEST_DB_BYTES = Histogram(
+    "voyage_http_request_db_bytes",
+    "MongoDB reply bytes read per request by route template",
+    ["method", "route"],
+    buckets=(0, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+HTTP_REQUEST_PEAK_ALLOCATION = Histogram(
+    "voyage_http_request_peak_allocation_bytes",
+    "Peak traced memory allocated while serving sampled requests, by route template",
+    ["method", "route"],
+    buckets=(16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+)
+HTTP_REQUEST_DEADLINE_EXCEEDED = Counter(
+    "voyage_http_request_deadline_exceeded_total",
+    "Requests that failed with 504 because their deadline or a database time budget ran out",
+    ["method", "route"]
+)
+COALESCED_CALLS = Counter(
+    "voyage_coalesced_calls_total",
+    "Service calls that joined an identical call already in flight instead of querying the database",
+    ["operation"]
+)
+
+# Hotel search index
+HOTEL_INDEX_ROWS = Gauge(
+    "voyage_hotel_index_rows",
+    "Hotels held in the in-memory search index",
+    multiprocess_mode="livemax"
+)
+HOTEL_INDEX_SEARCHES = Counter(
+    "voyage_hotel_index_searches_total",
+    "Hotel searches answered from the in-memory index or, when it can't, by MongoDB",
+    ["path"]
+)
+HOTEL_FACET_CACHE = Counter(
+    "voyage_hotel_facet_cache_total",
+    "Hotel search facet counts served from the per-worker cache (hit) or aggregated (miss)",
+    ["result"]
+)
+
+# Exchange rates
+EXCHANGE_RATE_REFRESHES = Counter(
+    "voyage_exchange_rate_refreshes_total",
+    "Exchange rate refreshes from the configured provider by result",
+    ["provider", "result"]
+)
+EXCHANGE_RATES_UPDATED = Gauge(
+    "voyage_exchange_rates_updated_timestamp_seconds",
+    "Unix time the exchange rates in use were fetched",
+    multiprocess_mode="livemin"
+)
+
+# Event loop
+EVENT_LOOP_LAG = Histogram(
+    "voyage_event_loop_lag_seconds",
+    "Delay between when a periodic timer was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "voyage_event_loop_blocks_total",
+    "Times the event loop was blocked for longer than the watchdog threshold"
+)
+
+# MongoDB commands
+MONGO_COMMAND_DURATION = Histogram(
+    "voyage_mongo_command_duration_seconds",
+    "MongoDB command round trip time by collection and command",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+MONGO_COMMAND_ERRORS = Counter(
+    "voyage_mongo_command_errors_total",
+    "Failed MongoDB commands by collection and command",
+    ["collection", "command"]
+)
+MONGO_DOCUMENTS_RETURNED = Counter(
+    "voyage_mongo_documents_returned_total",
+    "Documents returned by MongoDB cursors by collection and command",
+    ["collection", "command"]
+)
+SLOW_QUERIES = Counter(
+    "voyage_mongo_slow_queries_total",
+    "MongoDB commands slower than the slow query threshold",
+    ["collection", "command"]
+)
+SLOW_QUERIES_DROPPED = Counter(
+    "voyage_mongo_slow_queries_dropped_total",
+    "Slow MongoDB commands not logged because too many were pending"
+)
+MONGO_COUNTS_SKIPPED = Counter(
+    "voyage_mongo_counts_skipped_total",
+    "Paginated results returned without a total because the deadline ran out while counting",
+    ["collection"]
+)
+
+# MongoDB connection pool
+MONGO_POOL_CONNECTIONS = Gauge(
+    "voyage_mongo_pool_connections",
+    "Open connections in the MongoDB pool",
+    ["address"],
+    multiprocess_mode="livesum"
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "voyage_mongo_pool_checked_out_connections",
+    "Connections currently checked out of the MongoDB pool",
+    ["address"],
+    multiprocess_mode="livesum"
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "voyage_mongo_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the MongoDB pool",
+    ["address"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "voyage_mongo_pool_checkout_failures_total",
+    "Failed connection checkouts by reason",
+    ["address", "reason"]
+)
+
+
+def render_metrics() -> bytes:
+    """Exposition of this process's metrics, or of all workers' when run by the multi-worker server"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+async def monitor_event_loop_lag(interval: float):
+    """Record how late a periodic timer fires; sustained lag means something blocks the loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - scheduled)
+        EVENT_LOOP_LAG.observe(lag)
+        if lag > 1:
+            logger.warning(f"Event loop lagged {lag:.3f}s behind schedule")
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from types import CodeType, FrameType
+from typing import Dict, FrozenSet, List, Optional
+
+from starlette.routing import compile_path
+
+from core.metrics import EVENT_LOOP_BLOCKS
+
+logger = logging.getLogger(__name__)
+
+# Deepest stack kept per sample
+MAX_STACK_DEPTH = 256
+
+# Innermost frames logged for a blocked event loop
+BLOCKED_STACK_FRAMES = 30
+
+
+def _path_prefixes() -> List[str]:
+    # An empty sys.path entry is the working directory
+    prefixes = {os.path.join(os.path.abspath(path), "") for path in sys.path}
+    return sorted(prefixes, key=len, reverse=True)
+
+
+class FrameNamer:
+    """Short, stable frame names for folded stacks, e.g. `search_hotels (services/hotel.py:120)`"""
+
+    def __init__(self):
+        self._prefixes = _path_prefixes()
+        self._names: Dict[CodeType, str] = {}
+
+    def __call__(self, code: CodeType) -> str:
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            for prefix in self._prefixes:
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix):]
+                    break
+            # ";" separates frames in the folded format
+            name = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+            self._names[code] = name
+        return name
+
+
+class ProfilingSession:
+    """Samples collected from the next `requests` requests to one route"""
+
+    def __init__(self, route: str, method: str, requests: int, sample_interval: float):
+        self.route = route
+        self.method = method.upper()
+        self.requests = requests
+        self.sample_interval = sample_interval
+        self.route_regex = compile_path(route)[0]
+        self.claimed = 0
+        self.completed = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.durations: List[float] = []
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        # The sampler thread adds stacks while the loop reads them
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.completed >= self.requests
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.route_regex.match(path) is not None
+
+    def summary(self) -> dict:
+        durations = self.durations
+        return {
+            "route": self.route,
+            "method": self.method,
+            "requests": self.requests,
+            "completed": self.completed,
+            "finished": self.finished,
+            "samples": self.samples,
+            "sample_interval_ms": self.sample_interval * 1000,
+            "avg_duration_ms": round(sum(durations) / len(durations) * 1000, 3) if durations else None,
+            "max_duration_ms": round(max(durations) * 1000, 3) if durations else None,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "top_frames": self.top_frames()
+        }
+
+    def folded(self) -> str:
+        """Folded stacks (`frame;frame;frame count`), for flamegraph.pl, speedscope or inferno"""
+        with self.lock:
+            stacks = self.stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks)
+
+    def top_frames(self, limit: int = 20) -> List[dict]:
+        """Frames where the most samples were taken (self time)"""
+        with self.lock:
+            stacks = list(self.stacks.items())
+        leaves: Counter = Counter()
+        for stack, count in stacks:
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [
+            {"frame": frame, "samples": count, "percent": round(100 * count / max(self.samples, 1), 2)}
+            for frame, count in leaves.most_common(limit)
+        ]
+
+
+class RequestProfiler:
+    """Statistical profiler for the next N requests to a route.
+
+    A sampler thread reads the event loop thread's stack every sample
+    interval. A sample is kept only when a profiled request's middleware
+    frame is on the stack, i.e. that request (not another one interleaved on
+    the loop) was running. Work the request hands to other tasks or to the
+    thread pool is not attributed to it.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfilingSession] = None
+        # Middleware frames of profiled requests in flight; replaced, never mutated, so the sampler can read it
+        self._active: FrozenSet[FrameType] = frozenset()
+        self._loop_thread_id: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def armed(self) -> bool:
+        session = self.session
+        return session is not None and session.claimed < session.requests
+
+    def arm(self, route: str, method: str, requests: int, sample_interval: float) -> ProfilingSession:
+        """Profile the next `requests` requests to `route`; must be called on the event loop"""
+        self._loop_thread_id = threading.get_ident()
+        self.session = ProfilingSession(route, method, requests, sample_interval)
+        return self.session
+
+    def disarm(self):
+        """Stop profiling; samples collected so far are kept"""
+        session = self.session
+        if session and not session.finished:
+            # Requests already being profiled still complete
+            session.requests = session.claimed
+            if session.finished:
+                session.finished_at = datetime.utcnow()
+
+    def claim(self, method: str, path: str) -> Optional[ProfilingSession]:
+        """The session profiling this request, if it should be profiled"""
+        session = self.session
+        if session is None or session.claimed >= session.requests or not session.matches(method, path):
+            return None
+        session.claimed += 1
+        return session
+
+    def begin(self, frame: FrameType):
+        self._active = self._active | {frame}
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+            self._sampler.start()
+
+    def end(self, frame: FrameType, session: ProfilingSession, duration: float):
+        self._active = self._active - {frame}
+        session.completed += 1
+        session.durations.append(duration)
+        if session.finished and session.finished_at is None:
+            session.finished_at = datetime.utcnow()
+
+    def _sample(self):
+        """Sampler thread: runs while profiled requests are in flight"""
+        name_frame = FrameNamer()
+        while True:
+            session = self.session
+            active = self._active
+            if session is None or not active:
+                return
+            time.sleep(session.sample_interval)
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(name_frame(frame.f_code))
+                if frame in active:
+                    break
+                frame = frame.f_back
+            else:
+                continue  # No profiled request running at this instant
+
+            with session.lock:
+                session.stacks[";".join(reversed(stack))] += 1
+                session.samples += 1
+
+
+class EventLoopWatchdog:
+    """Log the stack of whatever blocks the event loop for longer than the threshold.
+
+    A watchdog thread schedules a heartbeat callback on the loop and, if it
+    has not run within the threshold, captures the loop thread's current
+    stack: the code that is blocking it.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._pending_since: Optional[float] = None
+        self._reported = False
+
+    def start(self):
+        """Start watching the running loop; must be called on it"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=self.threshold)
+            self._thread = None
+
+    def _beat(self):
+        pending_since, reported = self._pending_since, self._reported
+        self._pending_since = None
+        self._reported = False
+        if reported and pending_since is not None:
+            logger.warning(f"Event loop unblocked after {(time.monotonic() - pending_since) * 1000:.0f}ms")
+
+    def _watch(self):
+        check_interval = self.threshold / 4
+        while not self._stopped.wait(check_interval):
+            pending_since = self._pending_since
+            if pending_since is None:
+                self._pending_since = time.monotonic()
+                try:
+                    self._loop.call_soon_threadsafe(self._beat)
+                except RuntimeError:
+                    return  # Loop closed
+                continue
+
+            blocked_for = time.monotonic() - pending_since
+            if blocked_for > self.threshold and not self._reported:
+                self._reported = True
+                EVENT_LOOP_BLOCKS.inc()
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)[-BLOCKED_STACK_FRAMES:]) if frame else ""
+                logger.warning(f"Event loop blocked for over {blocked_for * 1000:.0f}ms in:\n{stack}")
+
+
+request_profiler = RequestProfiler()
@@ -1,6 +1,20 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import ContextManager, Optional
+
+import pymongo
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.read_preferences import Primary, _ServerMode, make_read_preference, read_pref_mode_from_name
+
 from core.config import settings
+from core.constants import OperationClass
+from db.monitoring import CommandMetricsListener, PoolMetricsListener, RequestStatsListener, SlowQueryListener
+
+logger = logging.getLogger(__name__)
+
+# Startup does not wait longer than this for the pool to fill
+WARM_UP_TIMEOUT_SECONDS = 10
 
 
 class Database:
@@ -17,11 +31,85 @@ async def get_database() -> AsyncIOMotorDatabase:
 
 async def connect_to_mongo():
     """Create database connection"""
-    db.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    event_listeners = []
+    if settings.METRICS_ENABLED:
+        event_listeners = [CommandMetricsListener(), PoolMetricsListener()]
+    if settings.SLOW_QUERY_LOG_ENABLED:
+        event_listeners.append(SlowQueryListener(settings.SLOW_QUERY_THRESHOLD_MS))
+    if settings.REQUEST_DB_STATS_ENABLED:
+        event_listeners.append(RequestStatsListener(settings.REQUEST_DB_STATS_MEASURE_BYTES))
+    
+    db.client = AsyncIOMotorClient(
+        settings.MONGODB_URL,
+        event_listeners=event_listeners,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGODB_SOCKET_TIMEOUT_MS,
+        timeoutMS=settings.MONGODB_TIMEOUT_MS,
+        # Compressors whose package is not installed are skipped with a warning
+        compressors=[name.strip() for name in settings.MONGODB_COMPRESSORS.split(",") if name.strip()]
+    )
     db.database = db.client[settings.DATABASE_NAME]
     print("Connected to MongoDB")
 
 
+def search_read_preference() -> _ServerMode:
+    """Read preference of public searches, which may tolerate MONGODB_SEARCH_MAX_STALENESS_SECONDS of lag"""
+    if settings.MONGODB_SEARCH_READ_PREFERENCE == "primary":
+        return Primary()
+    return make_read_preference(
+        read_pref_mode_from_name(settings.MONGODB_SEARCH_READ_PREFERENCE),
+        None,
+        settings.MONGODB_SEARCH_MAX_STALENESS_SECONDS
+    )
+
+
+def search_collection(collection: AsyncIOMotorCollection) -> AsyncIOMotorCollection:
+    """`collection` reading with the search read preference.
+
+    Only for read-only listings: anything that reads a document in order to
+    change it must use the collection as is, so it reads the primary.
+    """
+    return collection.with_options(read_preference=search_read_preference())
+
+
+# Operation class -> setting holding its time budget in milliseconds
+OPERATION_TIMEOUT_SETTINGS = {
+    OperationClass.SEARCH: "MONGODB_SEARCH_TIMEOUT_MS",
+    OperationClass.REPORT: "MONGODB_REPORT_TIMEOUT_MS",
+}
+
+
+def operation_timeout(operation: OperationClass) -> ContextManager:
+    """Time budget for the database operations in the block.
+
+    The driver sends the remaining budget as maxTimeMS with each command and
+    raises a timeout error once it is spent. Blocks nest: the earliest
+    deadline applies, so a budget never extends an enclosing request deadline.
+    """
+    timeout_ms = getattr(settings, OPERATION_TIMEOUT_SETTINGS[operation])
+    if not timeout_ms:
+        return nullcontext()
+    return pymongo.timeout(timeout_ms / 1000)
+
+
+async def warm_up_mongo(connections: int):
+    """Open pool connections before serving, so the first requests do not pay for connection setup"""
+    if not db.client or connections <= 0:
+        return
+    
+    # Concurrent pings each need their own connection
+    pings = [db.client.admin.command("ping") for _ in range(connections)]
+    try:
+        await asyncio.wait_for(asyncio.gather(*pings), timeout=WARM_UP_TIMEOUT_SECONDS)
+    except Exception as exc:
+        logger.warning(f"Could not warm up the MongoDB connection pool: {exc}")
+
+
 async def close_mongo_connection():
     """Close database connection"""
     if db.client:
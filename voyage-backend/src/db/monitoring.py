@@ -0,0 +1,212 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+from core.metrics import (
+    MONGO_COMMAND_DURATION,
+    MONGO_COMMAND_ERRORS,
+    MONGO_DOCUMENTS_RETURNED,
+    MONGO_POOL_CONNECTIONS,
+    MONGO_POOL_CHECKED_OUT,
+    MONGO_POOL_CHECKOUT_WAIT,
+    MONGO_POOL_CHECKOUT_FAILURES,
+)
+from services.slow_queries import LOGGED_COMMANDS, SLOW_QUERIES_COLLECTION, slow_query_log
+
+# Commands whose first argument is not a collection name
+NON_COLLECTION_COMMANDS = {"getMore", "killCursors", "endSessions", "ping", "hello", "isMaster", "ismaster"}
+
+
+def format_address(address: Tuple[str, int]) -> str:
+    return f"{address[0]}:{address[1]}"
+
+
+def count_returned_documents(reply: dict) -> int:
+    """Number of documents in a find/aggregate/getMore reply"""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        if batch is not None:
+            return len(batch)
+    return 0
+
+
+class RequestDatabaseStats:
+    """MongoDB commands, reply bytes, documents returned and time spent while serving one request"""
+
+    def __init__(self):
+        self.commands = 0
+        self.bytes_read = 0
+        self.documents = 0
+        self.duration = 0.0
+        # Commands of one request can complete on several executor threads at once
+        self._lock = threading.Lock()
+
+    def add(self, duration_micros: int, bytes_read: int, documents: int):
+        with self._lock:
+            self.commands += 1
+            self.bytes_read += bytes_read
+            self.documents += documents
+            self.duration += duration_micros / 1_000_000
+
+
+# Stats of the request being served; Motor runs commands in a copy of the caller's context
+current_request_stats: ContextVar[Optional[RequestDatabaseStats]] = ContextVar("current_request_stats", default=None)
+
+
+class RequestStatsListener(monitoring.CommandListener):
+    """Add each command to the stats of the request that issued it"""
+
+    def __init__(self, measure_bytes: bool = True):
+        self.measure_bytes = measure_bytes
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        stats = current_request_stats.get()
+        if stats is None:
+            return
+        # Replies arrive decoded, so their size is measured by re-encoding them
+        bytes_read = len(bson.encode(event.reply)) if self.measure_bytes else 0
+        stats.add(event.duration_micros, bytes_read, count_returned_documents(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.add(event.duration_micros, 0, 0)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Record MongoDB command durations, errors and returned documents per collection"""
+
+    def __init__(self):
+        # Collection of each started command, keyed by (connection id, request id)
+        self._collections: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        command_name = event.command_name
+        if command_name == "getMore":
+            collection = event.command.get("collection", "")
+        elif command_name in NON_COLLECTION_COMMANDS:
+            collection = ""
+        else:
+            collection = event.command.get(command_name, "")
+            if not isinstance(collection, str):
+                collection = ""
+
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        labels = self._labels(event)
+        MONGO_COMMAND_DURATION.labels(*labels).observe(event.duration_micros / 1_000_000)
+
+        returned = count_returned_documents(event.reply)
+        if returned:
+            MONGO_DOCUMENTS_RETURNED.labels(*labels).inc(returned)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        labels = self._labels(event)
+        MONGO_COMMAND_DURATION.labels(*labels).observe(event.duration_micros / 1_000_000)
+        MONGO_COMMAND_ERRORS.labels(*labels).inc()
+
+    def _labels(self, event) -> Tuple[str, str]:
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        return collection, event.command_name
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Hand commands slower than the threshold to the slow query log"""
+
+    def __init__(self, threshold_ms: float):
+        self.threshold_micros = threshold_ms * 1000
+        # (collection, command, database) of each started command that may be logged
+        self._started: Dict[Tuple, Tuple[str, dict, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name not in LOGGED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str) or collection == SLOW_QUERIES_COLLECTION:
+            return
+
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (collection, event.command, event.database_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event)
+
+    def _finished(self, event):
+        if event.command_name not in LOGGED_COMMANDS:
+            return
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+        if started and event.duration_micros >= self.threshold_micros:
+            collection, command, database_name = started
+            slow_query_log.record(
+                collection, event.command_name, command, event.duration_micros / 1000, database_name
+            )
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Track MongoDB connection pool size, checkouts and checkout wait time"""
+
+    def __init__(self):
+        # Checkout start and completion are reported on the thread doing the checkout
+        self._checkout_started = threading.local()
+
+    def pool_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(format_address(event.address)).set(0)
+        MONGO_POOL_CHECKED_OUT.labels(format_address(event.address)).set(0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(format_address(event.address)).set(0)
+        MONGO_POOL_CHECKED_OUT.labels(format_address(event.address)).set(0)
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(format_address(event.address)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(format_address(event.address)).dec()
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        address = format_address(event.address)
+        self._observe_wait(address)
+        MONGO_POOL_CHECKOUT_FAILURES.labels(address, str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        address = format_address(event.address)
+        self._observe_wait(address)
+        MONGO_POOL_CHECKED_OUT.labels(address).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(format_address(event.address)).dec()
+
+    def _observe_wait(self, address: str):
+        started = getattr(self._checkout_started, "value", None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_WAIT.labels(address).observe(time.perf_counter() - started)
+            self._checkout_started.value = None
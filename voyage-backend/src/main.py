@@ -1,13 +1,32 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
+from pymongo.errors import PyMongoError
 import uvicorn
 import logging
 
 from core.config import settings
-from db.mongodb import connect_to_mongo, close_mongo_connection
+from db.mongodb import connect_to_mongo, close_mongo_connection, get_database, warm_up_mongo
+from services.events import event_broker
+from services.slow_queries import slow_query_log
+from services.hotel_index import hotel_search_index
+from services.exchange_rates import exchange_rates
+from services.hotel import HotelService
+from middleware.compression import CompressionMiddleware
+from middleware.rate_limit import RateLimitMiddleware
+from middleware.deadline import DeadlineMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.request_stats import RequestStatsMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.memory import AllocationSamplingMiddleware
+from middleware.metrics import route_template
+from core.metrics import CONTENT_TYPE_LATEST, HTTP_REQUEST_DEADLINE_EXCEEDED, monitor_event_loop_lag, render_metrics
+from core.deadline import is_timeout
+from core.profiling import EventLoopWatchdog
+from core.memory import memory_profiler
 from api.v1.api import api_router
 
 
@@ -25,11 +44,39 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up Voyage Backend API...")
     await connect_to_mongo()
     logger.info("Connected to MongoDB")
+    await warm_up_mongo(settings.MONGODB_WARM_CONNECTIONS)
+    if settings.SLOW_QUERY_LOG_ENABLED:
+        await slow_query_log.start(await get_database())
+    await event_broker.start()
+    if settings.HOTEL_SEARCH_INDEX_ENABLED:
+        # Loads in the background; searches use MongoDB until it is ready
+        hotel_search_index.start(await get_database())
+    # Workers share the rates stored in MongoDB; the one that fetched new rates reprices the hotels
+    exchange_rates.start(await get_database(), on_change=HotelService(await get_database()).refresh_search_fields)
+    lag_monitor = None
+    if settings.METRICS_ENABLED:
+        lag_monitor = asyncio.create_task(monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS))
+    watchdog = None
+    if settings.EVENT_LOOP_WATCHDOG_ENABLED:
+        watchdog = EventLoopWatchdog(settings.EVENT_LOOP_BLOCK_THRESHOLD_MS / 1000)
+        watchdog.start()
+    if settings.MEMORY_ROUTE_SAMPLE_RATE > 0:
+        memory_profiler.start_tracing(settings.MEMORY_TRACEMALLOC_FRAMES)
     
     yield
     
     # Shutdown
     logger.info("Shutting down Voyage Backend API...")
+    if watchdog:
+        watchdog.stop()
+    if lag_monitor:
+        lag_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await lag_monitor
+    await event_broker.stop()
+    await exchange_rates.stop()
+    await hotel_search_index.stop()
+    await slow_query_log.stop()
     await close_mongo_connection()
     logger.info("Disconnected from MongoDB")
 
@@ -44,6 +91,64 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Add response compression middleware
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        cache_max_bytes=settings.COMPRESSION_CACHE_MAX_BYTES,
+        excluded_paths=settings.COMPRESSION_EXCLUDED_PATHS
+    )
+
+# Add rate limiting and load shedding middleware
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        default_rate=settings.RATE_LIMIT_DEFAULT,
+        rules=settings.RATE_LIMIT_RULES,
+        backend=settings.RATE_LIMIT_BACKEND,
+        redis_url=settings.REDIS_URL,
+        max_in_flight=settings.MAX_IN_FLIGHT_REQUESTS,
+        max_queued=settings.MAX_QUEUED_REQUESTS,
+        queue_timeout=settings.REQUEST_QUEUE_TIMEOUT_SECONDS,
+        excluded_paths=settings.RATE_LIMIT_EXCLUDED_PATHS,
+        # Event streams stay open indefinitely and must not hold in-flight slots
+        unqueued_paths=[f"{settings.API_V1_STR}/events/stream"],
+        trust_forwarded_for=settings.RATE_LIMIT_TRUST_FORWARDED_FOR
+    )
+
+# Add request deadline middleware; outside rate limiting so time queued for a slot counts
+if settings.REQUEST_DEADLINE_ENABLED:
+    app.add_middleware(
+        DeadlineMiddleware,
+        default_timeout=settings.REQUEST_DEADLINE_MS / 1000,
+        rules={prefix: timeout / 1000 for prefix, timeout in settings.REQUEST_DEADLINE_RULES.items()},
+        excluded_paths=settings.REQUEST_DEADLINE_EXCLUDED_PATHS
+    )
+
+# Add per-request database stats middleware (Server-Timing header)
+if settings.REQUEST_DB_STATS_ENABLED:
+    app.add_middleware(
+        RequestStatsMiddleware,
+        record_metrics=settings.METRICS_ENABLED,
+        server_timing=settings.REQUEST_DB_STATS_SERVER_TIMING,
+        admin_token=settings.ADMIN_API_KEY,
+        include_bytes=settings.REQUEST_DB_STATS_MEASURE_BYTES
+    )
+
+# Add request metrics middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Add on-demand request profiling middleware (armed through the admin API)
+app.add_middleware(ProfilingMiddleware)
+
+# Add sampled per-route allocation tracking (needs tracemalloc, started when enabled)
+if settings.MEMORY_ROUTE_SAMPLE_RATE > 0:
+    app.add_middleware(AllocationSamplingMiddleware, sample_rate=settings.MEMORY_ROUTE_SAMPLE_RATE)
+
 # Add CORS middleware
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -76,6 +181,26 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     )
 
 
+@app.exception_handler(PyMongoError)
+async def database_exception_handler(request: Request, exc: PyMongoError):
+    """504 when the request deadline or an operation's time budget ran out"""
+    if not is_timeout(exc):
+        return await general_exception_handler(request, exc)
+    
+    logger.warning(f"Deadline exceeded on {request.method} {request.url.path}: {exc}")
+    if settings.METRICS_ENABLED:
+        HTTP_REQUEST_DEADLINE_EXCEEDED.labels(request.method, route_template(request.scope)).inc()
+    return JSONResponse(
+        status_code=504,
+        content={
+            "success": False,
+            "message": "The request did not complete within its deadline. Please retry.",
+            "error_code": "DEADLINE_EXCEEDED",
+            "data": None
+        }
+    )
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """General exception handler for unhandled exceptions"""
@@ -113,6 +238,13 @@ async def health_check():
     }
 
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics endpoint"""
+        return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Include API routes
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -0,0 +1,263 @@
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.constants import COMPRESSIBLE_CONTENT_TYPES
+from utils.etag import encoded_etag
+
+try:
+    import brotli
+except ImportError:  # brotli is in requirements.txt, but gzip alone still works without it
+    brotli = None
+
+# Approximate memory of a cache entry besides its body (key, digest and dict slot), so that
+# entries with no body, which mark responses not worth compressing, still count toward the bound
+CACHE_ENTRY_OVERHEAD_BYTES = 200
+
+
+def compression_exempt(endpoint: Callable) -> Callable:
+    """Mark an endpoint whose responses must never be compressed by the middleware"""
+    endpoint.compression_exempt = True
+    return endpoint
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    """Whether a content type benefits from compression"""
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    if not content_type or content_type == "text/event-stream":
+        return False
+    return content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+
+class StreamCompressor:
+    """Incremental gzip/brotli compressor that flushes after every chunk"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by encoding and content digest, bounded by total bytes
+    including a fixed overhead per entry"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Optional[bytes]]" = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def key(encoding: str, body: bytes) -> tuple:
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._entries
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        """Return a cached body (None if it was found not to compress) and mark it recently used"""
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    @staticmethod
+    def entry_size(compressed: Optional[bytes]) -> int:
+        return CACHE_ENTRY_OVERHEAD_BYTES + (len(compressed) if compressed else 0)
+
+    def put(self, key: tuple, compressed: Optional[bytes]):
+        size = self.entry_size(compressed)
+        if self.max_bytes <= 0 or size > self.max_bytes // 4:
+            return
+
+        if key in self._entries:
+            self._size -= self.entry_size(self._entries.pop(key))
+        self._entries[key] = compressed
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= self.entry_size(evicted)
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli response compression
+
+    Responses are compressed only when the client accepts it, the content type
+    is compressible, the body is at least ``minimum_size`` bytes and the route
+    is not marked with ``compression_exempt``. Complete bodies are served from
+    a cache of compressed bytes so hot responses are not recompressed;
+    streaming bodies are compressed chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache_max_bytes: int = 32 * 1024 * 1024,
+        excluded_paths: Iterable[str] = ()
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = CompressedBodyCache(cache_max_bytes)
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compress_body(self, encoding: str, body: bytes) -> Optional[bytes]:
+        """Compress a complete body, returning None when compression does not pay off"""
+        key = self.cache.key(encoding, body)
+        if key in self.cache:
+            return self.cache.get(key)
+
+        compressor = StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+        compressed = compressor.compress(body) + compressor.finish()
+        if len(compressed) >= len(body):
+            compressed = None
+
+        self.cache.put(key, compressed)
+        return compressed
+
+
+class CompressionResponder:
+    """Per-request send wrapper that decides on and applies compression"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, encoding: str, send: Send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows how large the response is
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        if self.compressor:
+            await self._send_compressed_chunk(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self._should_compress() or (not more_body and len(body) < self.middleware.minimum_size):
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        if not more_body:
+            compressed = self.middleware.compress_body(self.encoding, body)
+            if compressed is None:
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            headers = self._set_encoding_headers()
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        # Streaming response: compress incrementally without knowing the final size
+        self.compressor = StreamCompressor(
+            self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality
+        )
+        headers = self._set_encoding_headers()
+        del headers["Content-Length"]
+        await self._send(self.start_message)
+        await self._send_compressed_chunk(message)
+
+    async def _send_compressed_chunk(self, message: Message):
+        more_body = message.get("more_body", False)
+        chunk = self.compressor.compress(message.get("body", b""))
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _should_compress(self) -> bool:
+        if self.start_message["status"] in (204, 304) or self.start_message["status"] < 200:
+            return False
+
+        endpoint = self.scope.get("endpoint")
+        if getattr(endpoint, "compression_exempt", False):
+            return False
+
+        headers = Headers(raw=self.start_message["headers"])
+        if "content-encoding" in headers:
+            return False
+        return is_compressible(headers.get("content-type", ""))
+
+    def _set_encoding_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+        # The compressed representation differs byte-for-byte, so a strong ETag gets the
+        # encoding as a suffix; it stays strong, so it can still be used in If-Match
+        etag = headers.get("etag")
+        if etag:
+            headers["ETag"] = encoded_etag(etag, self.encoding)
+        return headers
@@ -0,0 +1,55 @@
+import time
+from typing import Dict, Iterable
+
+import pymongo
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.deadline import current_deadline
+
+
+class DeadlineMiddleware:
+    """Give each request a deadline that bounds all of its MongoDB operations.
+
+    The deadline is the default timeout or the one of the longest matching
+    path prefix in ``rules``. Database operations issued while the request is
+    served carry the remaining time as maxTimeMS, and the driver fails them
+    as soon as it is spent, so a request cannot wait on the database past
+    its deadline. Streaming responses must be excluded: their cursors are
+    read after the handler returns.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_timeout: float,
+        rules: Dict[str, float],
+        excluded_paths: Iterable[str] = ()
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        # Longest prefix first so the most specific rule wins
+        self.rules = sorted(rules.items(), key=lambda rule: len(rule[0]), reverse=True)
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        timeout = self._timeout_for(scope["path"])
+        if timeout <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        token = current_deadline.set(time.monotonic() + timeout)
+        try:
+            with pymongo.timeout(timeout):
+                await self.app(scope, receive, send)
+        finally:
+            current_deadline.reset(token)
+
+    def _timeout_for(self, path: str) -> float:
+        for prefix, timeout in self.rules:
+            if path.startswith(prefix):
+                return timeout
+        return self.default_timeout
@@ -0,0 +1,44 @@
+import random
+import tracemalloc
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.memory import memory_profiler
+from middleware.metrics import route_template
+
+
+class AllocationSamplingMiddleware:
+    """Measure the peak traced allocation of a sample of requests, per route template.
+
+    tracemalloc has one global peak, so one sampled request is measured at a
+    time; allocations of requests interleaved with it on the loop are
+    included, which makes the figures an upper bound.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or memory_profiler.sampling
+            or not tracemalloc.is_tracing()
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        memory_profiler.sampling = True
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            memory_profiler.sampling = False
+            # Tracing may have been stopped by an admin while the request ran
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                memory_profiler.record_route(
+                    scope["method"], route_template(scope), max(0, peak - baseline), current - baseline
+                )
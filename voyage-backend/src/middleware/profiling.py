@@ -0,0 +1,32 @@
+import sys
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.profiling import request_profiler
+
+
+class ProfilingMiddleware:
+    """Profile requests claimed by an armed profiling session (see core.profiling)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not request_profiler.armed:
+            await self.app(scope, receive, send)
+            return
+
+        session = request_profiler.claim(scope["method"], scope["path"])
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+
+        # This coroutine's frame is on the loop thread's stack exactly while this request runs
+        frame = sys._getframe()
+        request_profiler.begin(frame)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_profiler.end(frame, session, time.perf_counter() - started)
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import redis.asyncio as redis
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.security import verify_token
+
+logger = logging.getLogger(__name__)
+
+# Seconds per unit accepted in rate specs such as "60/minute"
+RATE_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Atomically refill and take one token; uses the Redis clock so all workers agree
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+def parse_rate(spec: str) -> Tuple[float, int]:
+    """Parse a rate spec like "60/minute" into (tokens per second, burst size)"""
+    count, _, period = spec.partition("/")
+    burst = int(count)
+    if burst <= 0 or period not in RATE_PERIODS:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    return burst / RATE_PERIODS[period], burst
+
+
+class MemoryTokenBuckets:
+    """Per-process token buckets, evicting the least recently used keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class RedisTokenBuckets:
+    """Token buckets shared by all workers through a Redis Lua script"""
+
+    KEY_PREFIX = "voyage:ratelimit:"
+
+    def __init__(self, redis_url: str, fallback: MemoryTokenBuckets):
+        self._redis = redis.from_url(redis_url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._fallback = fallback
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        try:
+            return float(await self._script(keys=[f"{self.KEY_PREFIX}{key}"], args=[rate, burst]))
+        except Exception as exc:
+            # Keep limiting per worker rather than failing requests while Redis is unavailable
+            logger.warning(f"Rate limit backend unavailable, using local buckets: {exc}")
+            return await self._fallback.take(key, rate, burst)
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limiting per client and route, plus global load shedding
+
+    Clients are identified by the user id in their bearer token, or by IP
+    address for anonymous requests. Each path prefix in ``rules`` gets its own
+    bucket per client; other paths share the client's default bucket. At most
+    ``max_in_flight`` requests run at once; up to ``max_queued`` more wait up
+    to ``queue_timeout`` seconds for a slot, and the rest are shed with 503.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_rate: str,
+        rules: Dict[str, str],
+        backend: str = "memory",
+        redis_url: Optional[str] = None,
+        max_in_flight: int = 0,
+        max_queued: int = 0,
+        queue_timeout: float = 0,
+        excluded_paths: Iterable[str] = (),
+        unqueued_paths: Iterable[str] = (),
+        trust_forwarded_for: bool = False
+    ):
+        self.app = app
+        self.default_rate = parse_rate(default_rate)
+        # Longest prefix first so the most specific rule wins
+        self.rules = sorted(
+            ((prefix, parse_rate(spec)) for prefix, spec in rules.items()),
+            key=lambda rule: len(rule[0]),
+            reverse=True
+        )
+        self.excluded_paths = tuple(excluded_paths)
+        self.unqueued_paths = tuple(unqueued_paths)
+        self.trust_forwarded_for = trust_forwarded_for
+
+        memory_buckets = MemoryTokenBuckets()
+        if backend == "redis" and redis_url:
+            self.buckets = RedisTokenBuckets(redis_url, memory_buckets)
+        else:
+            self.buckets = memory_buckets
+
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+        self._queued = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await self._take_token(scope)
+        if retry_after > 0:
+            response = self._error_response(429, "Rate limit exceeded. Please slow down.", retry_after)
+            await response(scope, receive, send)
+            return
+
+        if self._slots is None or scope["path"].startswith(self.unqueued_paths):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self._acquire_slot():
+            response = self._error_response(
+                503, "Server is busy. Please retry shortly.", max(self.queue_timeout, 1)
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _take_token(self, scope: Scope) -> float:
+        path = scope["path"]
+        route_key, (rate, burst) = "*", self.default_rate
+        for prefix, limit in self.rules:
+            if path.startswith(prefix):
+                route_key, (rate, burst) = prefix, limit
+                break
+
+        return await self.buckets.take(f"{self._client_key(scope)}:{route_key}", rate, burst)
+
+    def _client_key(self, scope: Scope) -> str:
+        headers = Headers(scope=scope)
+
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            user_id = verify_token(token)
+            if user_id:
+                return f"user:{user_id}"
+
+        if self.trust_forwarded_for and "x-forwarded-for" in headers:
+            return f"ip:{headers['x-forwarded-for'].split(',')[0].strip()}"
+
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def _acquire_slot(self) -> bool:
+        """Take an in-flight slot, queueing briefly; False means the request should be shed"""
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+
+        if self._queued >= self.max_queued:
+            return False
+
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._queued -= 1
+
+    @staticmethod
+    def _error_response(status_code: int, message: str, retry_after: float) -> JSONResponse:
+        return JSONResponse(
+            status_code=status_code,
+            content={
+                "success": False,
+                "message": message,
+                "error_code": f"HTTP_{status_code}",
+                "data": None
+            },
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
@@ -0,0 +1,82 @@
+import secrets
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import HTTP_REQUEST_DB_BYTES, HTTP_REQUEST_DB_COMMANDS, HTTP_REQUEST_DB_DOCUMENTS
+from db.monitoring import RequestDatabaseStats, current_request_stats
+from middleware.metrics import route_template
+
+
+def server_timing(stats: RequestDatabaseStats, total: float, include_bytes: bool = True) -> str:
+    """Server-Timing header value; counts are carried in the description of zero-duration metrics"""
+    metrics = [
+        f"db;dur={stats.duration * 1000:.2f}",
+        f'db-commands;desc="{stats.commands}"',
+        f'db-docs;desc="{stats.documents}"',
+    ]
+    if include_bytes:
+        metrics.append(f'db-bytes;desc="{stats.bytes_read}"')
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+class RequestStatsMiddleware:
+    """Count the MongoDB commands, documents and bytes read by each request.
+
+    The counts are recorded per route template, so a handler that quietly
+    grows its round trips shows up. They are also sent in a Server-Timing
+    header, to every client with ``server_timing`` and otherwise only to
+    requests carrying the admin token.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        record_metrics: bool = True,
+        server_timing: bool = False,
+        admin_token: Optional[str] = None,
+        include_bytes: bool = True
+    ):
+        self.app = app
+        self.record_metrics = record_metrics
+        self.server_timing = server_timing
+        self.admin_token = admin_token
+        self.include_bytes = include_bytes
+
+    def exposes_server_timing(self, scope: Scope) -> bool:
+        if self.server_timing:
+            return True
+        token = Headers(scope=scope).get("x-admin-token")
+        return bool(self.admin_token and token and secrets.compare_digest(token, self.admin_token))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDatabaseStats()
+        token = current_request_stats.set(stats)
+        started = time.perf_counter()
+        expose = self.exposes_server_timing(scope)
+
+        async def send_wrapper(message: Message):
+            if expose and message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append(
+                    "Server-Timing", server_timing(stats, time.perf_counter() - started, self.include_bytes)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_stats.reset(token)
+            if self.record_metrics:
+                method, route = scope["method"], route_template(scope)
+                HTTP_REQUEST_DB_COMMANDS.labels(method, route).observe(stats.commands)
+                HTTP_REQUEST_DB_DOCUMENTS.labels(method, route).observe(stats.documents)
+                if self.include_bytes:
+                    HTTP_REQUEST_DB_BYTES.labels(method, route).observe(stats.bytes_read)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional, Dict
 from pydantic import Field
 from models.base import BaseDocument, PyObjectId
@@ -39,6 +40,21 @@ class Hotel(BaseDocument):
     check_in_time: str = "15:00"
     check_out_time: str = "11:00"
     
+    # Bitmasks of amenities and room types (core.constants.AMENITY_BITS / ROOM_TYPE_BITS) for searches
+    amenity_mask: int = 0
+    room_type_mask: int = 0
+    
+    # Room rates converted to USD (services.hotel.compute_hotel_prices) for price filters and sorting
+    min_rate_usd: Optional[float] = None
+    max_rate_usd: Optional[float] = None
+    room_rates_usd: Dict[str, float] = Field(default_factory=dict)  # Cheapest rate per room type
+    search_updated_at: Optional[datetime] = None  # Last repricing; unlike updated_at, leaves the ETag alone
+    
+    # Catalogue sync
+    external_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    field_hashes: Dict[str, str] = Field(default_factory=dict)
+    
     class Config:
         schema_extra = {
             "example": {
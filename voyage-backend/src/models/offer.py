@@ -27,6 +27,7 @@ class Offer(BaseDocument):
     travel_agent_id: PyObjectId
     dmc_agent_id: Optional[PyObjectId] = None
     hotel_id: PyObjectId
+    rfq_id: Optional[PyObjectId] = None
     
     # Request details
     check_in_date: date
@@ -47,6 +48,7 @@ class Offer(BaseDocument):
     status: OfferStatus = OfferStatus.PENDING
     expires_at: Optional[datetime] = None
     quoted_at: Optional[datetime] = None
+    quote_batch_id: Optional[PyObjectId] = None  # Batch quote that set the quote, if any
     responded_at: Optional[datetime] = None
     
     # Additional terms
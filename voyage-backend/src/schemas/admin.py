@@ -0,0 +1,102 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class ExplainSummary(BaseModel):
+    docs_examined: int
+    keys_examined: int
+    returned: int
+    examined_per_returned: float
+    execution_time_ms: Optional[int] = None
+    stages: List[str]
+    indexes: List[str]
+    collection_scan: bool
+
+
+class SlowQueryShape(BaseModel):
+    shape_id: str
+    collection: str
+    command: str
+    shape: Dict[str, Any]
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    last_seen: datetime
+    explain: Optional[ExplainSummary] = None
+
+
+class ProfilingRequest(BaseModel):
+    route: str = Field(..., description="Route template to profile, e.g. /api/v1/hotels/search or /api/v1/offers/{offer_id}")
+    method: str = "GET"
+    requests: int = Field(10, ge=1, le=1000, description="Number of requests to profile")
+
+
+class ProfiledFrame(BaseModel):
+    frame: str
+    samples: int
+    percent: float
+
+
+class ProfilingStatus(BaseModel):
+    route: str
+    method: str
+    requests: int
+    completed: int
+    finished: bool
+    samples: int
+    sample_interval_ms: float
+    avg_duration_ms: Optional[float] = None
+    max_duration_ms: Optional[float] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    top_frames: List[ProfiledFrame]
+
+
+class MemoryTracingRequest(BaseModel):
+    frames: int = Field(10, ge=1, le=100, description="Frames kept per traced allocation")
+
+
+class MemoryStatus(BaseModel):
+    tracing: bool
+    frames: int
+    traced_bytes: int
+    peak_bytes: int
+    rss_bytes: Optional[int] = None
+    snapshots: List[int]
+
+
+class MemoryStat(BaseModel):
+    traceback: List[str]
+    size_bytes: int
+    count: int
+
+
+class MemorySnapshot(BaseModel):
+    snapshot_id: int
+    taken_at: datetime
+    traced_bytes: int
+    rss_bytes: Optional[int] = None
+    top: List[MemoryStat]
+
+
+class MemoryDiffStat(MemoryStat):
+    size_diff_bytes: int
+    count_diff: int
+
+
+class MemoryDiff(BaseModel):
+    snapshot_id: int
+    against_id: int
+    size_diff_bytes: int
+    top: List[MemoryDiffStat]
+
+
+class RouteAllocation(BaseModel):
+    method: str
+    route: str
+    samples: int
+    avg_peak_bytes: int
+    max_peak_bytes: int
+    avg_retained_bytes: int
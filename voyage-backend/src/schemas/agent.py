@@ -10,7 +10,7 @@ class LocationCreate(BaseModel):
 
 
 class LocationResponse(BaseModel):
-    id: str
+    id: Optional[str] = None
     country: str
     city: str
     region: Optional[str] = None
@@ -23,19 +23,19 @@ class PaginationParams(BaseModel):
 
 class PaginatedResponse(BaseModel, Generic[T]):
     items: List[T]
-    total: int
+    total: Optional[int]  # None when the count was skipped to meet the request deadline
     page: int
     size: int
-    pages: int
+    pages: Optional[int]
     
     @classmethod
-    def create(cls, items: List[T], total: int, pagination: PaginationParams):
+    def create(cls, items: List[T], total: Optional[int], pagination: PaginationParams):
         return cls(
             items=items,
             total=total,
             page=pagination.page,
             size=pagination.size,
-            pages=(total + pagination.size - 1) // pagination.size
+            pages=None if total is None else (total + pagination.size - 1) // pagination.size
         )
 
 
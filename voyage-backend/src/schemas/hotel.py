@@ -1,6 +1,7 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 from pydantic import BaseModel, Field
-from core.constants import HotelAmenity, RoomType
+from core.constants import HotelAmenity, RoomType, MatchMode
+from schemas.base import PaginatedResponse
 
 
 class HotelLocationCreate(BaseModel):
@@ -80,15 +81,18 @@ class HotelResponse(BaseModel):
     star_rating: Optional[int] = None
     amenities: List[HotelAmenity]
     room_types: List[RoomRateResponse]
+    min_rate_usd: Optional[float] = None
+    max_rate_usd: Optional[float] = None
     images: List[str]
     description: Optional[str] = None
-    policies: Dict[str, str]
-    contact_info: Dict[str, str]
+    policies: Dict[str, Optional[str]]
+    contact_info: Dict[str, Optional[str]]
     is_active: bool
     minimum_stay: int
     maximum_stay: Optional[int] = None
     check_in_time: str
     check_out_time: str
+    external_id: Optional[str] = None
     created_at: str
     updated_at: Optional[str] = None
     
@@ -96,6 +100,23 @@ class HotelResponse(BaseModel):
         from_attributes = True
 
 
+class HotelSyncItem(HotelCreate):
+    external_id: str = Field(..., min_length=1, max_length=100)
+    images: List[str] = Field(default_factory=list)
+
+
+class HotelSyncRequest(BaseModel):
+    hotels: List[HotelSyncItem] = Field(..., min_items=1, max_items=1000)
+
+
+class HotelSyncResult(BaseModel):
+    total: int
+    inserted: int
+    updated: int
+    unchanged: int
+    conflicted: int = 0  # New hotels another sync inserted, then changed again before ours applied
+
+
 class HotelSearchFilters(BaseModel):
     country: Optional[str] = None
     city: Optional[str] = None
@@ -104,6 +125,30 @@ class HotelSearchFilters(BaseModel):
     max_star_rating: Optional[int] = Field(None, ge=1, le=5)
     amenities: Optional[List[HotelAmenity]] = None
     room_types: Optional[List[RoomType]] = None
-    min_rate: Optional[float] = Field(None, gt=0)
+    match: MatchMode = MatchMode.ANY  # Whether hotels need all or any of the amenities and room types
+    min_rate: Optional[float] = Field(None, gt=0)  # USD; matches hotels with rooms priced in the range
     max_rate: Optional[float] = Field(None, gt=0)
-    dmc_agent_id: Optional[str] = None
\ No newline at end of file
+    dmc_agent_id: Optional[str] = None
+
+
+class FacetCount(BaseModel):
+    value: Union[int, str]
+    count: int
+
+
+class PriceBucketCount(BaseModel):
+    min: float  # USD, by the hotel's cheapest room
+    max: Optional[float] = None  # None for the open-ended top bucket
+    count: int
+
+
+class HotelFacets(BaseModel):
+    star_rating: Optional[List[FacetCount]] = None
+    amenities: Optional[List[FacetCount]] = None
+    room_types: Optional[List[FacetCount]] = None
+    city: Optional[List[FacetCount]] = None
+    price: Optional[List[PriceBucketCount]] = None
+
+
+class HotelSearchPage(PaginatedResponse[HotelResponse]):
+    facets: Optional[HotelFacets] = None  # Only the requested facets are set
@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Optional, Dict
 from pydantic import BaseModel, Field, validator
 from core.constants import OfferStatus, RoomType
 
@@ -31,6 +31,10 @@ class QuotedRoomCreate(BaseModel):
     currency: str = "USD"
     includes: List[str] = Field(default_factory=list)
     conditions: Optional[str] = Field(None, max_length=500)
+    
+    @validator('currency')
+    def normalize_currency(cls, v):
+        return v.upper()
 
 
 class QuotedRoomResponse(BaseModel):
@@ -46,8 +50,7 @@ class QuotedRoomResponse(BaseModel):
         from_attributes = True
 
 
-class OfferCreate(BaseModel):
-    hotel_id: str
+class OfferRequestDetails(BaseModel):
     check_in_date: date
     check_out_date: date
     rooms: List[RoomRequestCreate] = Field(..., min_items=1)
@@ -67,6 +70,14 @@ class OfferCreate(BaseModel):
         return v
 
 
+class OfferCreate(OfferRequestDetails):
+    hotel_id: str
+
+
+class OfferRFQCreate(OfferRequestDetails):
+    hotel_ids: List[str] = Field(..., min_items=1, max_items=50)
+
+
 class OfferQuote(BaseModel):
     quoted_rooms: List[QuotedRoomCreate] = Field(..., min_items=1)
     total_price: float = Field(..., gt=0)
@@ -76,6 +87,31 @@ class OfferQuote(BaseModel):
     payment_terms: Optional[str] = Field(None, max_length=500)
     notes: Optional[str] = Field(None, max_length=1000)
     expires_in_hours: int = Field(48, ge=1, le=168)
+    
+    @validator('currency')
+    def normalize_currency(cls, v):
+        return v.upper()
+
+
+class OfferQuoteBatchItem(OfferQuote):
+    offer_id: str
+
+
+class OfferQuoteBatch(BaseModel):
+    quotes: List[OfferQuoteBatchItem] = Field(..., min_items=1, max_items=100)
+
+
+class OfferQuoteResult(BaseModel):
+    offer_id: str
+    success: bool
+    error: Optional[str] = None
+
+
+class OfferQuoteBatchResponse(BaseModel):
+    total: int
+    quoted: int
+    failed: int
+    results: List[OfferQuoteResult]
 
 
 class OfferResponse(BaseModel):
@@ -83,6 +119,7 @@ class OfferResponse(BaseModel):
     travel_agent_id: str
     dmc_agent_id: Optional[str] = None
     hotel_id: str
+    rfq_id: Optional[str] = None
     
     check_in_date: str
     check_out_date: str
@@ -94,6 +131,7 @@ class OfferResponse(BaseModel):
     quoted_rooms: List[QuotedRoomResponse]
     total_price: Optional[float] = None
     currency: str
+    total_price_usd: Optional[float] = None  # Set where quotes are compared across currencies
     commission_rate: Optional[float] = None
     commission_amount: Optional[float] = None
     
@@ -113,6 +151,20 @@ class OfferResponse(BaseModel):
         from_attributes = True
 
 
+class RFQResponse(BaseModel):
+    rfq_id: str
+    offers: List[OfferResponse]
+    offers_by_dmc_agent: Dict[str, List[str]]
+    missing_hotel_ids: List[str]
+
+
+class RFQComparisonResponse(BaseModel):
+    rfq_id: str
+    total: int
+    quoted: int
+    offers: List[OfferResponse]
+
+
 class OfferSearchFilters(BaseModel):
     status: Optional[OfferStatus] = None
     hotel_id: Optional[str] = None
@@ -122,5 +174,5 @@ class OfferSearchFilters(BaseModel):
     check_in_to: Optional[date] = None
     created_from: Optional[datetime] = None
     created_to: Optional[datetime] = None
-    min_price: Optional[float] = Field(None, gt=0)
+    min_price: Optional[float] = Field(None, gt=0)  # USD, whatever currency the offer was quoted in
     max_price: Optional[float] = Field(None, gt=0)
\ No newline at end of file
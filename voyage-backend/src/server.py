@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Production server: pre-forked uvicorn workers sharing one listening socket
+
+The parent imports the application once, freezes the garbage collector so the
+imported objects stay shared copy-on-write, binds the socket and forks
+WEB_CONCURRENCY workers (one per available CPU by default). Each worker runs
+uvicorn with uvloop and httptools. SIGTERM/SIGINT are forwarded to the workers,
+which stop accepting, drain in-flight requests for up to
+SERVER_GRACEFUL_TIMEOUT_SECONDS and run the application's shutdown. Workers
+that die are replaced. More than one worker requires EVENTS_BACKEND=redis.
+
+Usage (from voyage-backend/):
+    python src/server.py
+"""
+import gc
+import logging
+import math
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import uvicorn
+
+from core.config import settings
+
+# Metrics from all workers are aggregated through files in this directory; it
+# must be set before prometheus_client is imported by the application
+METRICS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# A worker exiting this soon after it started is restarted after a delay, so a
+# failing startup (e.g. MongoDB unreachable) does not spin
+MIN_WORKER_UPTIME_SECONDS = 5
+RESPAWN_DELAY_SECONDS = 1
+
+# Time the parent waits beyond the graceful timeout before killing workers
+KILL_GRACE_SECONDS = 5
+
+logger = logging.getLogger("voyage.server")
+logger.setLevel(logging.INFO)
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, honouring affinity and a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def create_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Fork, watch and stop the worker processes"""
+
+    def __init__(self, app, sock: socket.socket, workers: int):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.pids: Dict[int, float] = {}  # pid -> start time
+        self.stopping = False
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        for _ in range(self.workers):
+            self._spawn()
+        logger.info(f"Started {self.workers} workers on {self.sock.getsockname()}")
+
+        while not self.stopping:
+            self._reap(respawn=True)
+            time.sleep(0.5)
+
+        self._stop_workers()
+        return 0
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self.pids[pid] = time.monotonic()
+
+    def _run_worker(self):
+        """Worker process: serve until told to stop, then exit without running the parent's cleanup"""
+        # uvicorn installs its own handlers for a graceful shutdown
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        config = uvicorn.Config(
+            self.app,
+            loop="uvloop",
+            http="httptools",
+            lifespan="on",
+            backlog=settings.SERVER_BACKLOG,
+            timeout_keep_alive=settings.SERVER_KEEPALIVE_SECONDS,
+            timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+            log_level="info" if settings.DEBUG else "warning",
+            access_log=settings.DEBUG
+        )
+        server = uvicorn.Server(config)
+
+        exit_code = 1
+        try:
+            server.run(sockets=[self.sock])
+            exit_code = 0 if server.started else 3
+        except BaseException:
+            logger.exception(f"Worker {os.getpid()} crashed")
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _reap(self, respawn: bool):
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.pids.clear()
+                return
+            if pid == 0:
+                return
+
+            started = self.pids.pop(pid, None)
+            mark_worker_dead(pid)
+            if not respawn or self.stopping:
+                continue
+
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            if started is not None and time.monotonic() - started < MIN_WORKER_UPTIME_SECONDS:
+                time.sleep(RESPAWN_DELAY_SECONDS)
+            self._spawn()
+
+    def _stop_workers(self):
+        logger.info(f"Stopping {len(self.pids)} workers")
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + settings.SERVER_GRACEFUL_TIMEOUT_SECONDS + KILL_GRACE_SECONDS
+        while self.pids and time.monotonic() < deadline:
+            self._reap(respawn=False)
+            time.sleep(0.1)
+
+        for pid in list(self.pids):
+            logger.warning(f"Worker {pid} did not drain in time; killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.pids:
+            self._reap(respawn=False)
+            time.sleep(0.1)
+
+
+def mark_worker_dead(pid: int):
+    """Drop a dead worker's live gauges from the aggregated metrics"""
+    if os.environ.get(METRICS_DIR_ENV):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+
+def prepare_metrics_dir() -> Optional[str]:
+    """Point prometheus_client at an empty multiprocess directory; returns it if created here"""
+    metrics_dir = os.environ.get(METRICS_DIR_ENV)
+    if metrics_dir:
+        # Files left by a previous run would be counted again
+        for path in Path(metrics_dir).glob("*.db"):
+            path.unlink()
+        return None
+
+    metrics_dir = tempfile.mkdtemp(prefix="voyage-metrics-")
+    os.environ[METRICS_DIR_ENV] = metrics_dir
+    return metrics_dir
+
+
+def main() -> int:
+    workers = settings.WEB_CONCURRENCY or available_cpus()
+    if workers > 1 and settings.EVENTS_BACKEND == "memory":
+        # Each worker would only deliver events to its own subscribers, so most would be silently lost
+        logger.error(
+            f"EVENTS_BACKEND=memory cannot serve {workers} workers: set EVENTS_BACKEND=redis "
+            f"or WEB_CONCURRENCY=1"
+        )
+        return 1
+    created_metrics_dir = prepare_metrics_dir() if workers > 1 and settings.METRICS_ENABLED else None
+
+    # Preload: import the application once, before forking (this also configures logging)
+    from main import app
+
+    # Objects that exist now live for the whole process; keeping the collector
+    # away from them keeps their pages shared between the workers
+    gc.collect()
+    gc.freeze()
+
+    sock = create_socket(settings.SERVER_HOST, settings.SERVER_PORT, settings.SERVER_BACKLOG)
+    try:
+        return Supervisor(app, sock, workers).run()
+    finally:
+        sock.close()
+        if created_metrics_dir:
+            shutil.rmtree(created_metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import HTTPException, status
@@ -12,7 +13,14 @@ from schemas.agent import (
 from schemas.base import PaginationParams
 from utils.helpers import prepare_document_for_response
 from utils.pagination import paginate_collection
-from core.constants import UserType
+from utils.etag import ETAG_PROJECTION, check_if_match
+from utils.singleflight import SingleFlight, call_key
+from core.constants import UserType, OperationClass
+from db.mongodb import operation_timeout, search_collection
+
+
+# Concurrent identical DMC agent searches on this worker share one database execution
+dmc_agent_searches: SingleFlight[dict] = SingleFlight("dmc_agent_search")
 
 
 class AgentService:
@@ -74,7 +82,13 @@ class AgentService:
             return None
         return prepare_document_for_response(agent)
 
-    async def update_travel_agent(self, agent_id: str, user_id: str, update_data: TravelAgentUpdate) -> dict:
+    async def update_travel_agent(
+        self, 
+        agent_id: str, 
+        user_id: str, 
+        update_data: TravelAgentUpdate,
+        expected_etag: Optional[str] = None
+    ) -> dict:
         """Update travel agent profile"""
         # Verify ownership
         agent = await self.travel_agents_collection.find_one({
@@ -88,15 +102,28 @@ class AgentService:
                 detail="Travel agent not found"
             )
 
+        check_if_match(expected_etag, agent, "Travel agent profile")
+
         # Update agent
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
-        update_dict["updated_at"] = None  # Will be set by the model
+        update_dict["updated_at"] = datetime.utcnow()
         
-        await self.travel_agents_collection.update_one(
-            {"_id": ObjectId(agent_id)},
+        # With If-Match, only apply the update if nobody else wrote in between
+        update_filter = {"_id": ObjectId(agent_id)}
+        if expected_etag:
+            update_filter["updated_at"] = agent.get("updated_at")
+        
+        result = await self.travel_agents_collection.update_one(
+            update_filter,
             {"$set": update_dict}
         )
         
+        if result.matched_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Travel agent profile has been modified. Please reload and try again."
+            )
+        
         # Get updated agent
         updated_agent = await self.travel_agents_collection.find_one({"_id": ObjectId(agent_id)})
         return prepare_document_for_response(updated_agent)
@@ -146,6 +173,13 @@ class AgentService:
             return None
         return prepare_document_for_response(agent)
 
+    async def get_dmc_agent_version(self, agent_id: str) -> Optional[dict]:
+        """Get only the fields needed to compute a DMC agent's ETag"""
+        agent = await self.dmc_agents_collection.find_one({"_id": ObjectId(agent_id)}, ETAG_PROJECTION)
+        if not agent:
+            return None
+        return prepare_document_for_response(agent)
+
     async def get_dmc_agent_by_user_id(self, user_id: str) -> Optional[dict]:
         """Get DMC agent by user ID"""
         agent = await self.dmc_agents_collection.find_one({"user_id": ObjectId(user_id)})
@@ -153,7 +187,13 @@ class AgentService:
             return None
         return prepare_document_for_response(agent)
 
-    async def update_dmc_agent(self, agent_id: str, user_id: str, update_data: DMCAgentUpdate) -> dict:
+    async def update_dmc_agent(
+        self, 
+        agent_id: str, 
+        user_id: str, 
+        update_data: DMCAgentUpdate,
+        expected_etag: Optional[str] = None
+    ) -> dict:
         """Update DMC agent profile"""
         # Verify ownership
         agent = await self.dmc_agents_collection.find_one({
@@ -167,15 +207,28 @@ class AgentService:
                 detail="DMC agent not found"
             )
 
+        check_if_match(expected_etag, agent, "DMC agent profile")
+
         # Update agent
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
-        update_dict["updated_at"] = None  # Will be set by the model
+        update_dict["updated_at"] = datetime.utcnow()
         
-        await self.dmc_agents_collection.update_one(
-            {"_id": ObjectId(agent_id)},
+        # With If-Match, only apply the update if nobody else wrote in between
+        update_filter = {"_id": ObjectId(agent_id)}
+        if expected_etag:
+            update_filter["updated_at"] = agent.get("updated_at")
+        
+        result = await self.dmc_agents_collection.update_one(
+            update_filter,
             {"$set": update_dict}
         )
         
+        if result.matched_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="DMC agent profile has been modified. Please reload and try again."
+            )
+        
         # Get updated agent
         updated_agent = await self.dmc_agents_collection.find_one({"_id": ObjectId(agent_id)})
         return prepare_document_for_response(updated_agent)
@@ -206,19 +259,23 @@ class AgentService:
         if filters.max_response_time:
             query["response_time_hours"] = {"$lte": filters.max_response_time}
 
-        # Paginate results
-        result = await paginate_collection(
-            self.dmc_agents_collection,
-            query,
-            pagination,
-            sort_field="rating",
-            sort_direction=-1
-        )
+        async def run() -> dict:
+            with operation_timeout(OperationClass.SEARCH):
+                result = await paginate_collection(
+                    search_collection(self.dmc_agents_collection),
+                    query,
+                    pagination,
+                    sort_field="rating",
+                    sort_direction=-1,
+                    allow_partial=True
+                )
 
-        # Convert documents for response
-        result["items"] = [prepare_document_for_response(item) for item in result["items"]]
-        
-        return result
+            # Convert documents for response
+            result["items"] = [prepare_document_for_response(item) for item in result["items"]]
+            return result
+
+        # The returned dict is shared with identical concurrent searches
+        return await dmc_agent_searches.do(call_key(query, pagination.page, pagination.size), run)
 
     async def get_travel_agents(self, pagination: PaginationParams) -> dict:
         """Get all travel agents with pagination"""
@@ -236,10 +293,11 @@ class AgentService:
     async def verify_agent(self, agent_id: str, is_dmc: bool = False) -> dict:
         """Verify agent (admin only)"""
         collection = self.dmc_agents_collection if is_dmc else self.travel_agents_collection
+        now = datetime.utcnow()
         
         result = await collection.update_one(
             {"_id": ObjectId(agent_id)},
-            {"$set": {"is_verified": True, "verified_at": None}}
+            {"$set": {"is_verified": True, "verified_at": now, "updated_at": now}}
         )
         
         if result.matched_count == 0:
@@ -1,15 +1,51 @@
+import math
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import HTTPException, status
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from models.booking import Booking
 from schemas.booking import BookingCreate, BookingUpdate, BookingCancellation, BookingSearchFilters
 from schemas.base import PaginationParams
 from utils.helpers import prepare_document_for_response, generate_confirmation_number
 from utils.pagination import paginate_collection
-from core.constants import UserType, OfferStatus, BookingStatus, PaymentStatus
+from utils.export import build_export_projection, stream_export
+from utils.etag import ETAG_PROJECTION, check_if_match
+from core.constants import (
+    UserType, OfferStatus, BookingStatus, PaymentStatus, ExportFormat, OperationClass, EXPORT_BATCH_SIZE
+)
+from db.mongodb import operation_timeout
+from services.events import event_broker
+from services.exchange_rates import exchange_rates
+
+
+# Columns included in booking exports
+BOOKING_EXPORT_FIELDS = [
+    "id",
+    "confirmation_number",
+    "status",
+    "payment_status",
+    "booking_date",
+    "offer_id",
+    "travel_agent_id",
+    "dmc_agent_id",
+    "hotel_id",
+    "lead_guest.first_name",
+    "lead_guest.last_name",
+    "lead_guest.email",
+    "lead_guest.nationality",
+    "payment_info.amount",
+    "payment_info.currency",
+    "amount_usd",
+    "payment_info.payment_method",
+    "payment_info.payment_date",
+    "cancelled_at",
+    "cancellation_fee",
+    "created_at",
+    "updated_at",
+]
 
 
 class BookingService:
@@ -43,24 +79,6 @@ class BookingService:
                 detail="Booking already exists for this offer"
             )
 
-        # Generate unique confirmation number
-        confirmation_number = generate_confirmation_number()
-        
-        # Ensure uniqueness
-        tries = 0
-        while tries < 5:
-            existing = await self.bookings_collection.find_one({"confirmation_number": confirmation_number})
-            if not existing:
-                break
-            confirmation_number = generate_confirmation_number()
-            tries += 1
-        
-        if tries >= 5:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate unique confirmation number"
-            )
-
         # Create booking document
         booking_dict = booking_data.dict()
         booking_dict.update({
@@ -68,18 +86,32 @@ class BookingService:
             "travel_agent_id": ObjectId(travel_agent_id),
             "dmc_agent_id": offer["dmc_agent_id"],
             "hotel_id": offer["hotel_id"],
-            "confirmation_number": confirmation_number
+            "confirmation_number": generate_confirmation_number()
         })
         
         booking = Booking(**booking_dict)
         booking_doc = booking.dict(by_alias=True)
         
-        # Insert booking
-        result = await self.bookings_collection.insert_one(booking_doc)
+        # Insert booking; the unique index on confirmation_number rejects collisions,
+        # so a fresh number is only generated when one actually occurs
+        for _ in range(5):
+            try:
+                result = await self.bookings_collection.insert_one(booking_doc)
+                break
+            except DuplicateKeyError:
+                booking_doc["confirmation_number"] = generate_confirmation_number()
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to generate unique confirmation number"
+            )
         
         # Get created booking
-        created_booking = await self.bookings_collection.find_one({"_id": result.inserted_id})
-        return prepare_document_for_response(created_booking)
+        created_booking = prepare_document_for_response(
+            await self.bookings_collection.find_one({"_id": result.inserted_id})
+        )
+        await event_broker.publish_status_change("booking", "created", created_booking)
+        return created_booking
 
     async def get_booking(self, booking_id: str) -> Optional[dict]:
         """Get booking by ID"""
@@ -88,6 +120,16 @@ class BookingService:
             return None
         return prepare_document_for_response(booking)
 
+    async def get_booking_version(self, booking_id: str) -> Optional[dict]:
+        """Get only the fields needed to compute a booking's ETag and check access"""
+        booking = await self.bookings_collection.find_one(
+            {"_id": ObjectId(booking_id)},
+            {**ETAG_PROJECTION, "travel_agent_id": 1, "dmc_agent_id": 1}
+        )
+        if not booking:
+            return None
+        return prepare_document_for_response(booking)
+
     async def get_booking_by_confirmation(self, confirmation_number: str) -> Optional[dict]:
         """Get booking by confirmation number"""
         booking = await self.bookings_collection.find_one({"confirmation_number": confirmation_number})
@@ -95,7 +137,13 @@ class BookingService:
             return None
         return prepare_document_for_response(booking)
 
-    async def update_booking(self, booking_id: str, travel_agent_id: str, update_data: BookingUpdate) -> dict:
+    async def update_booking(
+        self, 
+        booking_id: str, 
+        travel_agent_id: str, 
+        update_data: BookingUpdate,
+        expected_etag: Optional[str] = None
+    ) -> dict:
         """Update booking (only by travel agent)"""
         # Verify booking exists and belongs to travel agent
         booking = await self.bookings_collection.find_one({
@@ -110,15 +158,28 @@ class BookingService:
                 detail="Booking not found or cannot be updated"
             )
 
+        check_if_match(expected_etag, booking, "Booking")
+
         # Update booking
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
         update_dict["updated_at"] = datetime.utcnow()
         
-        await self.bookings_collection.update_one(
-            {"_id": ObjectId(booking_id)},
+        # With If-Match, only apply the update if nobody else wrote in between
+        update_filter = {"_id": ObjectId(booking_id)}
+        if expected_etag:
+            update_filter["updated_at"] = booking.get("updated_at")
+        
+        result = await self.bookings_collection.update_one(
+            update_filter,
             {"$set": update_dict}
         )
         
+        if result.matched_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Booking has been modified. Please reload and try again."
+            )
+        
         # Get updated booking
         updated_booking = await self.bookings_collection.find_one({"_id": ObjectId(booking_id)})
         return prepare_document_for_response(updated_booking)
@@ -185,45 +246,33 @@ class BookingService:
         )
         
         # Get updated booking
-        updated_booking = await self.bookings_collection.find_one({"_id": ObjectId(booking_id)})
-        return prepare_document_for_response(updated_booking)
+        updated_booking = prepare_document_for_response(
+            await self.bookings_collection.find_one({"_id": ObjectId(booking_id)})
+        )
+        await event_broker.publish_status_change("booking", "cancelled", updated_booking)
+        return updated_booking
 
-    async def search_bookings(
+    async def build_search_query(
         self, 
         user_id: str, 
         user_type: str, 
-        filters: BookingSearchFilters, 
-        pagination: PaginationParams
-    ) -> dict:
-        """Search bookings based on user type and filters"""
+        filters: BookingSearchFilters
+    ) -> Optional[dict]:
+        """Build the booking search query for a user (None if the user has no agent profile)"""
         query = {}
         
         # Filter by user type
         if user_type == UserType.TRAVEL_AGENT:
             travel_agent = await self.travel_agents_collection.find_one({"user_id": ObjectId(user_id)})
-            if travel_agent:
-                query["travel_agent_id"] = travel_agent["_id"]
-            else:
-                return {
-                    "items": [],
-                    "total": 0,
-                    "page": pagination.page,
-                    "size": pagination.size,
-                    "pages": 0
-                }
+            if not travel_agent:
+                return None
+            query["travel_agent_id"] = travel_agent["_id"]
         
         elif user_type == UserType.DMC_AGENT:
             dmc_agent = await self.dmc_agents_collection.find_one({"user_id": ObjectId(user_id)})
-            if dmc_agent:
-                query["dmc_agent_id"] = dmc_agent["_id"]
-            else:
-                return {
-                    "items": [],
-                    "total": 0,
-                    "page": pagination.page,
-                    "size": pagination.size,
-                    "pages": 0
-                }
+            if not dmc_agent:
+                return None
+            query["dmc_agent_id"] = dmc_agent["_id"]
 
         # Apply additional filters
         if filters.status:
@@ -245,6 +294,27 @@ class BookingService:
             if filters.booking_to:
                 booking_query["$lte"] = filters.booking_to
             query["booking_date"] = booking_query
+        
+        return query
+
+    async def search_bookings(
+        self, 
+        user_id: str, 
+        user_type: str, 
+        filters: BookingSearchFilters, 
+        pagination: PaginationParams
+    ) -> dict:
+        """Search bookings based on user type and filters"""
+        query = await self.build_search_query(user_id, user_type, filters)
+        
+        if query is None:
+            return {
+                "items": [],
+                "total": 0,
+                "page": pagination.page,
+                "size": pagination.size,
+                "pages": 0
+            }
 
         # Paginate results
         result = await paginate_collection(
@@ -260,6 +330,30 @@ class BookingService:
         
         return result
 
+    def export_bookings(
+        self, 
+        query: Optional[dict], 
+        export_format: ExportFormat, 
+        compress: bool = False
+    ) -> AsyncIterator[bytes]:
+        """Stream bookings matching a search query as CSV or NDJSON"""
+        cursor = None
+        if query is not None:
+            cursor = self.bookings_collection.find(
+                query, 
+                build_export_projection(BOOKING_EXPORT_FIELDS)
+            ).sort("booking_date", -1).batch_size(EXPORT_BATCH_SIZE)
+        
+        return stream_export(
+            cursor,
+            BOOKING_EXPORT_FIELDS,
+            export_format,
+            compress,
+            prepare_batch=lambda docs: exchange_rates.add_usd_amounts(
+                docs, "payment_info.amount", "payment_info.currency", "amount_usd"
+            )
+        )
+
     async def get_booking_statistics(self, user_id: str, user_type: str) -> dict:
         """Get booking statistics for user"""
         query = {}
@@ -267,33 +361,41 @@ class BookingService:
         if user_type == UserType.TRAVEL_AGENT:
             travel_agent = await self.travel_agents_collection.find_one({"user_id": ObjectId(user_id)})
             if not travel_agent:
-                return {"total": 0, "confirmed": 0, "cancelled": 0, "completed": 0}
+                return {"total": 0, "confirmed": 0, "cancelled": 0, "completed": 0, "value_usd": {}}
             query["travel_agent_id"] = travel_agent["_id"]
         
         elif user_type == UserType.DMC_AGENT:
             dmc_agent = await self.dmc_agents_collection.find_one({"user_id": ObjectId(user_id)})
             if not dmc_agent:
-                return {"total": 0, "confirmed": 0, "cancelled": 0, "completed": 0}
+                return {"total": 0, "confirmed": 0, "cancelled": 0, "completed": 0, "value_usd": {}}
             query["dmc_agent_id"] = dmc_agent["_id"]
 
-        # Aggregate statistics
+        # Aggregate statistics; payments are summed per currency and converted to USD here
         pipeline = [
             {"$match": query},
             {"$group": {
-                "_id": "$status",
-                "count": {"$sum": 1}
+                "_id": {"status": "$status", "currency": "$payment_info.currency"},
+                "count": {"$sum": 1},
+                "value": {"$sum": "$payment_info.amount"}
             }}
         ]
         
-        results = await self.bookings_collection.aggregate(pipeline).to_list(length=None)
+        with operation_timeout(OperationClass.REPORT):
+            results = await self.bookings_collection.aggregate(pipeline).to_list(length=None)
         
-        stats = {"total": 0, "confirmed": 0, "cancelled": 0, "completed": 0}
+        stats = {"total": 0, "confirmed": 0, "cancelled": 0, "completed": 0, "value_usd": {}}
+        values_usd = exchange_rates.convert(
+            [result["value"] for result in results],
+            [result["_id"].get("currency") for result in results]
+        )
         
-        for result in results:
-            status = result["_id"]
+        for result, value_usd in zip(results, values_usd.tolist()):
+            status = result["_id"]["status"]
             count = result["count"]
             stats["total"] += count
-            stats[status] = count
+            stats[status] = stats.get(status, 0) + count
+            if not math.isnan(value_usd):
+                stats["value_usd"][status] = round(stats["value_usd"].get(status, 0) + value_usd, 2)
         
         return stats
 
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel prefix shared by all workers
+EVENTS_CHANNEL_PREFIX = "voyage:events:"
+
+
+def travel_agent_channel(travel_agent_id: str) -> str:
+    """Channel carrying events for a travel agent"""
+    return f"travel_agent:{travel_agent_id}"
+
+
+def dmc_agent_channel(dmc_agent_id: str) -> str:
+    """Channel carrying events for a DMC agent"""
+    return f"dmc_agent:{dmc_agent_id}"
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format an event as a Server-Sent Events message"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class Subscription:
+    """A single connection's bounded event queue"""
+
+    def __init__(self, channels: List[str], max_queue_size: int):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.overflowed = False
+
+    def deliver(self, event: Dict[str, Any]):
+        """Queue an event without blocking the publisher"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The consumer cannot keep up; it is told to resync and disconnected
+            self.overflowed = True
+
+
+class EventBroker:
+    """Fan out offer and booking status events to connected subscribers"""
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._redis: Optional[redis.Redis] = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Connect to Redis pub/sub when it is the configured backend"""
+        if settings.EVENTS_BACKEND != "redis":
+            return
+
+        self._redis = redis.from_url(settings.REDIS_URL)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{EVENTS_CHANNEL_PREFIX}*")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop listening and close the Redis connection"""
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+
+        if self._redis:
+            await self._redis.close()
+            self._redis = None
+
+    async def publish(self, messages: List[Tuple[str, Dict[str, Any]]]):
+        """Publish (channel, event) pairs; failures are logged, never raised"""
+        try:
+            if self._redis:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for channel, event in messages:
+                        pipe.publish(f"{EVENTS_CHANNEL_PREFIX}{channel}", json.dumps(event, default=str))
+                    await pipe.execute()
+            else:
+                for channel, event in messages:
+                    self._dispatch(channel, event)
+        except Exception as exc:
+            logger.warning(f"Failed to publish {len(messages)} events: {exc}")
+
+    async def publish_status_change(self, resource: str, action: str, *docs: Dict[str, Any]):
+        """Publish status transitions of offers or bookings to the agents involved"""
+        timestamp = datetime.utcnow().isoformat()
+        messages = []
+
+        for doc in docs:
+            event = {
+                "type": f"{resource}.{action}",
+                "resource": resource,
+                "id": doc.get("id"),
+                "status": doc.get("status"),
+                "hotel_id": doc.get("hotel_id"),
+                "travel_agent_id": doc.get("travel_agent_id"),
+                "dmc_agent_id": doc.get("dmc_agent_id"),
+                "timestamp": timestamp
+            }
+            if doc.get("travel_agent_id"):
+                messages.append((travel_agent_channel(doc["travel_agent_id"]), event))
+            if doc.get("dmc_agent_id"):
+                messages.append((dmc_agent_channel(doc["dmc_agent_id"]), event))
+
+        if messages:
+            await self.publish(messages)
+
+    @asynccontextmanager
+    async def subscribe(self, channels: List[str]) -> AsyncIterator[Subscription]:
+        """Register a subscription for the lifetime of the context"""
+        subscription = Subscription(channels, settings.EVENTS_QUEUE_SIZE)
+        for channel in channels:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+
+        try:
+            yield subscription
+        finally:
+            for channel in channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+    async def stream(self, channels: List[str]) -> AsyncIterator[str]:
+        """Yield Server-Sent Events for channels until the client goes away or falls behind"""
+        async with self.subscribe(channels) as subscription:
+            yield ": connected\n\n"
+
+            while True:
+                if subscription.overflowed:
+                    yield format_sse({"type": "resync", "timestamp": datetime.utcnow().isoformat()})
+                    break
+
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=settings.EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield format_sse(event)
+
+    def _dispatch(self, channel: str, event: Dict[str, Any]):
+        """Deliver an event to this worker's subscribers of a channel"""
+        for subscription in tuple(self._subscriptions.get(channel, ())):
+            subscription.deliver(event)
+
+    async def _listen(self):
+        """Relay Redis pub/sub messages to local subscribers"""
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"].decode()[len(EVENTS_CHANNEL_PREFIX):]
+                    self._dispatch(channel, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Event listener error, reconnecting: {exc}")
+                await asyncio.sleep(1)
+
+
+event_broker = EventBroker()
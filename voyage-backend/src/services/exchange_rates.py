@@ -0,0 +1,325 @@
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+import httpx
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.config import settings
+from core.metrics import EXCHANGE_RATE_REFRESHES, EXCHANGE_RATES_UPDATED
+from utils.export import get_field_value
+
+logger = logging.getLogger(__name__)
+
+# Currency all rates are expressed in, and that stats, exports and price filters convert to
+BASE_CURRENCY = "USD"
+
+# Rates shared by all workers: one document in this collection
+EXCHANGE_RATES_COLLECTION = "exchange_rates"
+SHARED_RATES_ID = "current"
+
+
+def usd_rates_from_quotes(base: str, quotes: Dict[str, Any]) -> Dict[str, float]:
+    """USD value of one unit of each currency, from quotes in units of each currency per one `base`"""
+    quotes = {code.upper(): float(value) for code, value in quotes.items()}
+    quotes[base.upper()] = 1.0
+    usd_per_base = quotes.get(BASE_CURRENCY)
+    if not usd_per_base:
+        raise ValueError(f"Exchange rates quoted in {base} have no {BASE_CURRENCY} rate")
+    return {code: usd_per_base / value for code, value in quotes.items() if value > 0}
+
+
+def parse_quotes(payload: Dict[str, Any]) -> Dict[str, float]:
+    """Rates from an exchangerate-api.com style (`base_code`/`conversion_rates`) or
+    openexchangerates style (`base`/`rates`) document"""
+    if payload.get("result") == "error":
+        raise ValueError(f"Exchange rate provider error: {payload.get('error-type', 'unknown')}")
+    base = payload.get("base_code") or payload.get("base") or BASE_CURRENCY
+    quotes = payload.get("conversion_rates") or payload.get("rates")
+    if not isinstance(quotes, dict):
+        raise ValueError("Exchange rate document has no rates")
+    return usd_rates_from_quotes(base, quotes)
+
+
+class RateProvider:
+    """Source of exchange rates: USD value of one unit of each currency"""
+
+    name: str
+
+    async def fetch(self) -> Dict[str, float]:
+        raise NotImplementedError
+
+
+class StaticRateProvider(RateProvider):
+    """Fixed rates from the settings"""
+
+    name = "static"
+
+    def __init__(self, rates: Dict[str, float]):
+        self._rates = rates
+
+    async def fetch(self) -> Dict[str, float]:
+        return {code.upper(): value for code, value in self._rates.items()}
+
+
+class FileRateProvider(RateProvider):
+    """Rates read from a local JSON document, e.g. for tests or an offline deployment"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def fetch(self) -> Dict[str, float]:
+        text = await asyncio.to_thread(self.path.read_text)
+        return parse_quotes(json.loads(text))
+
+
+class HttpRateProvider(RateProvider):
+    """Rates fetched from an HTTP API; `url` is formatted with the API key"""
+
+    name = "http"
+
+    def __init__(self, url: str, api_key: Optional[str], timeout: float):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    async def fetch(self) -> Dict[str, float]:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(self.url.format(api_key=self.api_key or ""))
+            response.raise_for_status()
+        return parse_quotes(response.json())
+
+
+def create_provider(name: str) -> RateProvider:
+    """The configured rate provider; the static rates for any other name"""
+    if name == "file":
+        return FileRateProvider(settings.EXCHANGE_RATE_FILE)
+    if name == "http":
+        return HttpRateProvider(
+            settings.EXCHANGE_RATE_API_URL, settings.EXCHANGE_RATE_API_KEY, settings.EXCHANGE_RATE_TIMEOUT_SECONDS
+        )
+    return StaticRateProvider(settings.EXCHANGE_RATES_USD)
+
+
+class ExchangeRates:
+    """Per-worker cache of exchange rates with scheduled refresh and batch conversion.
+
+    The currencies are those of EXCHANGE_RATES_USD, whose values are used
+    until the provider has answered; the provider only refreshes them.
+    Workers share one snapshot of the rates in MongoDB: a single worker
+    claims each scheduled refresh, fetches and stores the rates and
+    reprices, and the others adopt the stored rates.
+    Conversions work on NumPy arrays: each distinct currency is looked up
+    once per call, however many amounts are converted.
+    """
+
+    def __init__(self, provider: RateProvider, rates: Dict[str, float]):
+        self.provider = provider
+        self.fetched_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._set({code.upper(): value for code, value in rates.items()})
+
+    def _set(self, rates: Dict[str, float]):
+        self.rates = rates
+        self._codes = {code: index for index, code in enumerate(rates)}
+        # Trailing NaN is the value of unknown currencies
+        self._values = np.array([*rates.values(), np.nan], dtype=np.float64)
+
+    # Conversion
+
+    def usd_value(self, currency: Optional[str]) -> float:
+        """USD value of one unit of `currency` (NaN if it has no rate); a missing currency is USD"""
+        return self.rates.get((currency or BASE_CURRENCY).upper(), math.nan)
+
+    def convert(
+        self,
+        amounts: Union[Sequence[Optional[float]], np.ndarray],
+        currencies: Union[str, Sequence[Optional[str]]],
+        to: str = BASE_CURRENCY
+    ) -> np.ndarray:
+        """Convert amounts, each in its own currency or all in one, to `to`.
+
+        None amounts and amounts in currencies without a rate come back as NaN.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if isinstance(currencies, str):
+            factors = self.usd_value(currencies)
+        else:
+            codes, inverse = np.unique(
+                np.array([currency or BASE_CURRENCY for currency in currencies], dtype=str), return_inverse=True
+            )
+            lookup = np.array([self._codes.get(code.upper(), -1) for code in codes], dtype=np.intp)
+            factors = self._values[lookup[inverse]]
+        return amounts * factors / self.usd_value(to)
+
+    def to_usd(self, amount: Optional[float], currency: Optional[str]) -> Optional[float]:
+        if amount is None:
+            return None
+        value = amount * self.usd_value(currency)
+        return None if math.isnan(value) else round(value, 2)
+
+    def add_usd_amounts(self, docs: List[Dict[str, Any]], amount_field: str, currency_field: str, target_field: str):
+        """Set `target_field` on each document to its amount in USD (None where it can't be converted)"""
+        if not docs:
+            return
+        usd = self.convert(
+            [get_field_value(doc, amount_field) for doc in docs],
+            [get_field_value(doc, currency_field) for doc in docs]
+        ).round(2)
+        for doc, value in zip(docs, usd.tolist()):
+            doc[target_field] = None if math.isnan(value) else value
+
+    def range_query(
+        self,
+        amount_field: str,
+        currency_field: str,
+        min_usd: Optional[float],
+        max_usd: Optional[float]
+    ) -> Dict[str, Any]:
+        """Filter for amounts within a USD range, whatever their currency.
+
+        One branch per currency with a rate, matched case-insensitively (a
+        missing currency is USD); amounts in any other currency have no USD
+        value and are compared with the bounds unconverted, as before.
+        """
+        def bounds(low: Optional[float], high: Optional[float]) -> Dict[str, float]:
+            condition = {}
+            if low is not None:
+                condition["$gte"] = low
+            if high is not None:
+                condition["$lte"] = high
+            return condition
+
+        codes = list(self.rates)
+        values = self._values[:-1]
+        low = (min_usd / values).tolist() if min_usd else [None] * len(codes)
+        high = (max_usd / values).tolist() if max_usd else [None] * len(codes)
+
+        patterns = {code: re.compile(f"^{re.escape(code)}$", re.IGNORECASE) for code in codes}
+        branches = []
+        for code, low_bound, high_bound in zip(codes, low, high):
+            currencies = [patterns[code], None] if code == BASE_CURRENCY else [patterns[code]]
+            branches.append({currency_field: {"$in": currencies}, amount_field: bounds(low_bound, high_bound)})
+        branches.append({
+            currency_field: {"$nin": [*patterns.values(), None]},
+            amount_field: bounds(min_usd or None, max_usd or None)
+        })
+        return {"$or": branches}
+
+    # Refresh
+
+    async def refresh(self) -> bool:
+        """Fetch the rates of our currencies from the provider; returns whether any changed"""
+        try:
+            fetched = await self.provider.fetch()
+        except Exception:
+            EXCHANGE_RATE_REFRESHES.labels(self.provider.name, "error").inc()
+            raise
+
+        rates = {}
+        for code, value in self.rates.items():
+            fresh = fetched.get(code)
+            if fresh is None or not math.isfinite(fresh) or fresh <= 0:
+                logger.warning(f"Exchange rate provider has no rate for {code}; keeping {value}")
+                fresh = value
+            rates[code] = round(fresh, 8)
+
+        self.fetched_at = time.time()
+        EXCHANGE_RATE_REFRESHES.labels(self.provider.name, "success").inc()
+        EXCHANGE_RATES_UPDATED.set(self.fetched_at)
+        if rates == self.rates:
+            return False
+        self._set(rates)
+        return True
+
+    def start(self, db: AsyncIOMotorDatabase, on_change: Callable[[Dict[str, float]], Awaitable[Any]]):
+        """Follow the shared rates, refreshing them every EXCHANGE_RATE_REFRESH_SECONDS.
+
+        `on_change` is called with new rates by the one worker that fetched them.
+        """
+        self._task = asyncio.create_task(self._follow(db[EXCHANGE_RATES_COLLECTION], on_change))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _follow(
+        self,
+        collection: AsyncIOMotorCollection,
+        on_change: Callable[[Dict[str, float]], Awaitable[Any]]
+    ):
+        while True:
+            try:
+                if await self._claim_refresh(collection):
+                    await self._refresh_shared(collection, on_change)
+                await self._load_shared(collection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Exchange rate refresh failed; keeping the current rates: {exc}")
+            await asyncio.sleep(settings.EXCHANGE_RATE_SYNC_SECONDS)
+
+    async def _claim_refresh(self, collection: AsyncIOMotorCollection) -> bool:
+        """Take the next scheduled refresh if it is due and no other worker took it"""
+        now = datetime.utcnow()
+        try:
+            await collection.update_one(
+                {"_id": SHARED_RATES_ID, "next_refresh_at": {"$not": {"$gt": now}}},
+                {"$set": {"next_refresh_at": now + timedelta(seconds=settings.EXCHANGE_RATE_REFRESH_SECONDS)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False  # The document exists and its refresh is not due
+        return True
+
+    async def _refresh_shared(
+        self,
+        collection: AsyncIOMotorCollection,
+        on_change: Callable[[Dict[str, float]], Awaitable[Any]]
+    ):
+        """Fetch and store the rates; reprice unless the stored rates were already repriced"""
+        try:
+            await self.refresh()
+        except Exception:
+            # Due again, so the next sync of any worker retries
+            await collection.update_one({"_id": SHARED_RATES_ID}, {"$set": {"next_refresh_at": datetime.utcnow()}})
+            raise
+
+        rates = dict(self.rates)
+        shared = await collection.find_one_and_update(
+            {"_id": SHARED_RATES_ID},
+            {"$set": {"rates": rates, "fetched_at": datetime.utcnow(), "provider": self.provider.name}},
+            return_document=ReturnDocument.BEFORE
+        )
+        # Compared with the last repricing, so one cut short by a restart is redone
+        if (shared or {}).get("repriced_rates") != rates:
+            logger.info(f"Exchange rates changed ({self.provider.name} provider); repricing")
+            await on_change(rates)
+            await collection.update_one({"_id": SHARED_RATES_ID}, {"$set": {"repriced_rates": rates}})
+
+    async def _load_shared(self, collection: AsyncIOMotorCollection):
+        """Adopt the stored rates of our currencies"""
+        shared = await collection.find_one({"_id": SHARED_RATES_ID}, {"rates": 1})
+        stored = (shared or {}).get("rates") or {}
+        rates = {code: stored.get(code, value) for code, value in self.rates.items()}
+        if rates != self.rates:
+            self._set(rates)
+
+
+exchange_rates = ExchangeRates(create_provider(settings.EXCHANGE_RATE_PROVIDER), settings.EXCHANGE_RATES_USD)
@@ -1,13 +1,175 @@
-from typing import List, Optional, Dict, Any
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import HTTPException, status
 from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 
 from models.hotel import Hotel
-from schemas.hotel import HotelCreate, HotelUpdate, HotelSearchFilters
+from schemas.hotel import HotelCreate, HotelUpdate, HotelSearchFilters, HotelSyncItem
 from schemas.base import PaginationParams
-from utils.helpers import prepare_document_for_response
-from utils.pagination import paginate_collection
+from utils.helpers import prepare_document_for_response, compute_content_hash, compute_bitmask
+from utils.pagination import paginate_collection, page_result
+from utils.etag import ETAG_PROJECTION, DERIVED_VERSION_FIELD, check_if_match
+from utils.singleflight import SingleFlight, call_key
+from utils.cache import TTLCache
+from db.mongodb import operation_timeout, search_collection
+from core.config import settings
+from core.constants import OperationClass, MatchMode, HotelSort, HotelFacet, RoomType, AMENITY_BITS, ROOM_TYPE_BITS
+from core.metrics import HOTEL_INDEX_SEARCHES, HOTEL_FACET_CACHE
+from services.hotel_index import hotel_search_index
+from services.exchange_rates import exchange_rates
+
+
+# Server error code of a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+# Supplier-provided fields covered by the hotel content hash
+HOTEL_CONTENT_FIELDS = (
+    "name",
+    "location",
+    "star_rating",
+    "amenities",
+    "room_types",
+    "images",
+    "description",
+    "policies",
+    "contact_info",
+    "minimum_stay",
+    "maximum_stay",
+    "check_in_time",
+    "check_out_time",
+)
+
+
+def compute_hotel_hashes(hotel: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+    """Compute the overall content hash and per-field hashes of a hotel"""
+    field_hashes = {
+        field: compute_content_hash(hotel.get(field))
+        for field in HOTEL_CONTENT_FIELDS
+    }
+    return compute_content_hash(field_hashes), field_hashes
+
+
+def compute_hotel_masks(hotel: Dict[str, Any]) -> Dict[str, int]:
+    """Amenity and room type bitmasks of a hotel, matched with $bitsAllSet / $bitsAnySet"""
+    return {
+        "amenity_mask": compute_bitmask(hotel.get("amenities") or [], AMENITY_BITS),
+        "room_type_mask": compute_bitmask(
+            [room["room_type"] for room in hotel.get("room_types") or []], ROOM_TYPE_BITS
+        )
+    }
+
+
+def compute_hotel_prices(hotel: Dict[str, Any], rates: Dict[str, float]) -> Dict[str, Any]:
+    """Room rates of a hotel in USD; rooms priced in a currency without a rate are left out"""
+    room_rates = {}
+    for room in hotel.get("room_types") or []:
+        rate = rates.get((room.get("currency") or "USD").upper())
+        if rate is None or room.get("base_rate") is None:
+            continue
+        room_type = RoomType(room["room_type"]).value
+        usd = round(room["base_rate"] * rate, 2)
+        room_rates[room_type] = min(usd, room_rates.get(room_type, usd))
+    
+    return {
+        "min_rate_usd": min(room_rates.values()) if room_rates else None,
+        "max_rate_usd": max(room_rates.values()) if room_rates else None,
+        "room_rates_usd": room_rates
+    }
+
+
+def compute_search_fields(hotel: Dict[str, Any], rates: Dict[str, float]) -> Dict[str, Any]:
+    """Fields derived from a hotel's amenities and room types that searches filter and sort on"""
+    return {**compute_hotel_masks(hotel), **compute_hotel_prices(hotel, rates)}
+
+
+def bits_condition(values: List[Any], bits: Dict[str, int], match: MatchMode) -> Dict[str, int]:
+    operator = "$bitsAllSet" if match == MatchMode.ALL else "$bitsAnySet"
+    return {operator: compute_bitmask(values, bits)}
+
+
+# Stored fields computed by compute_search_fields
+SEARCH_FIELDS = ("amenity_mask", "room_type_mask", "min_rate_usd", "max_rate_usd", "room_rates_usd")
+
+# Sort field and direction of each search ordering
+HOTEL_SORTS = {
+    HotelSort.PRICE_ASC: ("min_rate_usd", 1),
+    HotelSort.PRICE_DESC: ("min_rate_usd", -1),
+    HotelSort.RATING: ("star_rating", -1),
+}
+
+# Concurrent identical hotel searches on this worker share one database execution
+hotel_searches: SingleFlight[dict] = SingleFlight("hotel_search")
+
+
+def count_values(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Facet stages counting hotels per value of `path`, most frequent first"""
+    stages = [
+        {"$match": {path[1:]: {"$ne": None}}},
+        {"$group": {"_id": path, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]
+    return stages + [{"$limit": limit}] if limit else stages
+
+
+def facet_stages(facet: HotelFacet) -> List[Dict[str, Any]]:
+    """Stages of one facet in the $facet aggregation"""
+    if facet == HotelFacet.STAR_RATING:
+        return count_values("$star_rating")
+    if facet == HotelFacet.AMENITIES:
+        return [{"$unwind": "$amenities"}] + count_values("$amenities")
+    if facet == HotelFacet.ROOM_TYPES:
+        # A hotel counts once per room type, however many rooms of that type it lists
+        return [
+            {"$project": {"room_type": {"$setUnion": ["$room_types.room_type", []]}}},
+            {"$unwind": "$room_type"}
+        ] + count_values("$room_type")
+    if facet == HotelFacet.CITY:
+        return count_values("$location.city", settings.HOTEL_FACET_CITY_LIMIT)
+    return [
+        {"$match": {"min_rate_usd": {"$type": "number"}}},
+        {"$bucket": {
+            "groupBy": "$min_rate_usd",
+            "boundaries": [*settings.HOTEL_FACET_PRICE_BOUNDARIES, float("inf")],
+            "default": "out_of_range"
+        }}
+    ]
+
+
+def format_facet(facet: HotelFacet, buckets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if facet != HotelFacet.PRICE:
+        return [{"value": bucket["_id"], "count": bucket["count"]} for bucket in buckets]
+
+    # Every price bucket is listed, empty ones included
+    counts = {bucket["_id"]: bucket["count"] for bucket in buckets}
+    boundaries = settings.HOTEL_FACET_PRICE_BOUNDARIES
+    return [
+        {
+            "min": low,
+            "max": boundaries[position + 1] if position + 1 < len(boundaries) else None,
+            "count": counts.get(low, 0)
+        }
+        for position, low in enumerate(boundaries)
+    ]
+
+
+# Only the fields facets count on are carried into the $facet stage
+FACET_PROJECTION = {
+    "star_rating": 1,
+    "amenities": 1,
+    "room_types.room_type": 1,
+    "location.city": 1,
+    "min_rate_usd": 1
+}
+
+# Facet counts per (normalized search filter, facet); a worker reuses them for HOTEL_FACET_CACHE_SECONDS
+hotel_facet_cache: TTLCache[List[Dict[str, Any]]] = TTLCache(
+    settings.HOTEL_FACET_CACHE_SIZE, settings.HOTEL_FACET_CACHE_SECONDS
+)
+hotel_facet_counts: SingleFlight[Dict[HotelFacet, List[Dict[str, Any]]]] = SingleFlight("hotel_facets")
 
 
 class HotelService:
@@ -29,6 +191,8 @@ class HotelService:
         # Create hotel document
         hotel_dict = hotel_data.dict()
         hotel_dict["dmc_agent_id"] = ObjectId(dmc_agent_id)
+        hotel_dict["content_hash"], hotel_dict["field_hashes"] = compute_hotel_hashes(hotel_dict)
+        hotel_dict.update(compute_search_fields(hotel_dict, exchange_rates.rates))
         
         hotel = Hotel(**hotel_dict)
         hotel_doc = hotel.dict(by_alias=True)
@@ -47,7 +211,22 @@ class HotelService:
             return None
         return prepare_document_for_response(hotel)
 
-    async def update_hotel(self, hotel_id: str, dmc_agent_id: str, update_data: HotelUpdate) -> dict:
+    async def get_hotel_version(self, hotel_id: str) -> Optional[dict]:
+        """Get only the fields needed to compute a hotel's ETag"""
+        hotel = await self.hotels_collection.find_one(
+            {"_id": ObjectId(hotel_id)}, {**ETAG_PROJECTION, DERIVED_VERSION_FIELD: 1}
+        )
+        if not hotel:
+            return None
+        return prepare_document_for_response(hotel)
+
+    async def update_hotel(
+        self, 
+        hotel_id: str, 
+        dmc_agent_id: str, 
+        update_data: HotelUpdate,
+        expected_etag: Optional[str] = None
+    ) -> dict:
         """Update hotel (only by owning DMC agent)"""
         # Verify ownership
         hotel = await self.hotels_collection.find_one({
@@ -61,19 +240,213 @@ class HotelService:
                 detail="Hotel not found or access denied"
             )
 
-        # Update hotel
+        check_if_match(expected_etag, hotel, "Hotel")
+
+        # Only write the fields whose content actually changed
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
-        update_dict["updated_at"] = None  # Will be set by the model
+        changes = self._diff_hotel_fields(hotel, update_dict)
         
-        await self.hotels_collection.update_one(
-            {"_id": ObjectId(hotel_id)},
-            {"$set": update_dict}
+        if not changes:
+            return prepare_document_for_response(hotel)
+        
+        changes["content_hash"], changes["field_hashes"] = compute_hotel_hashes({**hotel, **changes})
+        if "amenities" in changes or "room_types" in changes:
+            changes.update(compute_search_fields({**hotel, **changes}, exchange_rates.rates))
+        changes["updated_at"] = datetime.utcnow()
+        
+        # With If-Match, only apply the update if nobody else wrote in between
+        update_filter = {"_id": ObjectId(hotel_id)}
+        if expected_etag:
+            update_filter["updated_at"] = hotel.get("updated_at")
+        
+        updated_hotel = await self.hotels_collection.find_one_and_update(
+            update_filter,
+            {"$set": changes},
+            return_document=ReturnDocument.AFTER
         )
         
-        # Get updated hotel
-        updated_hotel = await self.hotels_collection.find_one({"_id": ObjectId(hotel_id)})
+        if not updated_hotel:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Hotel has been modified. Please reload and try again."
+            )
+        
         return prepare_document_for_response(updated_hotel)
 
+    async def sync_hotels(self, dmc_agent_id: str, items: List[HotelSyncItem]) -> dict:
+        """Sync a DMC agent's supplier catalogue, writing only hotels whose content changed"""
+        agent_oid = ObjectId(dmc_agent_id)
+        
+        # Hash the incoming catalogue (last entry wins for repeated external IDs)
+        incoming = {}
+        for item in items:
+            hotel_dict = item.dict()
+            content_hash, field_hashes = compute_hotel_hashes(hotel_dict)
+            incoming[item.external_id] = (hotel_dict, content_hash, field_hashes)
+        
+        existing = await self._fetch_sync_hashes(agent_oid, list(incoming))
+        
+        operations = []
+        insert_ids: Dict[ObjectId, str] = {}  # _id -> external ID of each new hotel
+        inserted = updated = unchanged = conflicted = 0
+        now = datetime.utcnow()
+        
+        for external_id, (hotel_dict, content_hash, field_hashes) in incoming.items():
+            current = existing.get(external_id)
+            
+            if current is None:
+                new_hotel = {
+                    **hotel_dict,
+                    "dmc_agent_id": agent_oid,
+                    "content_hash": content_hash,
+                    "field_hashes": field_hashes,
+                    **compute_search_fields(hotel_dict, exchange_rates.rates)
+                }
+                # Upserted, so a concurrent sync of the same catalogue cannot insert the hotel twice
+                hotel_doc = Hotel(**new_hotel).dict(by_alias=True)
+                insert_ids[hotel_doc["_id"]] = external_id
+                operations.append(UpdateOne(
+                    {"dmc_agent_id": agent_oid, "external_id": external_id},
+                    {"$setOnInsert": hotel_doc},
+                    upsert=True
+                ))
+                inserted += 1
+                continue
+            
+            if current.get("content_hash") == content_hash:
+                unchanged += 1
+                continue
+            
+            changes = self._build_sync_changes(current, hotel_dict, content_hash, field_hashes, now)
+            operations.append(UpdateOne({"_id": current["_id"]}, {"$set": changes}))
+            updated += 1
+        
+        if operations:
+            upserted = await self._bulk_write_upserts(operations)
+            lost = [external_id for hotel_id, external_id in insert_ids.items() if hotel_id not in upserted]
+            
+            if lost:
+                # Another sync inserted these hotels first: apply our content as an update over
+                # theirs, unless their content changed yet again in the meantime
+                inserted -= len(lost)
+                current_hotels = await self._fetch_sync_hashes(agent_oid, lost)
+                retries = []
+                for external_id in lost:
+                    hotel_dict, content_hash, field_hashes = incoming[external_id]
+                    current = current_hotels.get(external_id)
+                    if current is None:
+                        conflicted += 1  # Deleted again since
+                    elif current.get("content_hash") == content_hash:
+                        unchanged += 1
+                    else:
+                        changes = self._build_sync_changes(current, hotel_dict, content_hash, field_hashes, now)
+                        retries.append(UpdateOne(
+                            {"_id": current["_id"], "content_hash": current.get("content_hash")},
+                            {"$set": changes}
+                        ))
+                if retries:
+                    result = await self.hotels_collection.bulk_write(retries, ordered=False)
+                    updated += result.modified_count
+                    conflicted += len(retries) - result.modified_count
+        
+        return {
+            "total": len(incoming),
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": unchanged,
+            "conflicted": conflicted
+        }
+
+    async def _fetch_sync_hashes(self, agent_oid: ObjectId, external_ids: List[str]) -> Dict[str, dict]:
+        """Stored hashes of a DMC agent's hotels by external ID, in a single query"""
+        cursor = self.hotels_collection.find(
+            {"dmc_agent_id": agent_oid, "external_id": {"$in": external_ids}},
+            {"external_id": 1, "content_hash": 1, "field_hashes": 1}
+        )
+        return {doc["external_id"]: doc for doc in await cursor.to_list(length=None)}
+
+    def _build_sync_changes(
+        self,
+        current: dict,
+        hotel_dict: Dict[str, Any],
+        content_hash: str,
+        field_hashes: Dict[str, str],
+        now: datetime
+    ) -> Dict[str, Any]:
+        """The $set document that brings a stored hotel to the synced content, changed fields only"""
+        stored_hashes = current.get("field_hashes") or {}
+        changes = {
+            field: hotel_dict[field]
+            for field in HOTEL_CONTENT_FIELDS
+            if stored_hashes.get(field) != field_hashes[field]
+        }
+        if "amenities" in changes or "room_types" in changes:
+            changes.update(compute_search_fields(hotel_dict, exchange_rates.rates))
+        changes.update({
+            "content_hash": content_hash,
+            "field_hashes": field_hashes,
+            "updated_at": now
+        })
+        return changes
+
+    async def _bulk_write_upserts(self, operations: List[UpdateOne]) -> set:
+        """Run the sync's writes; returns the _ids of the hotels they inserted"""
+        try:
+            result = await self.hotels_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            # Both syncs tried to insert the same hotel at once; the one that won stands
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in exc.details.get("writeErrors", [])):
+                raise
+            return {upsert["_id"] for upsert in exc.details.get("upserted", [])}
+        return set(result.upserted_ids.values())
+
+    async def refresh_search_fields(self, rates: Dict[str, float], batch_size: int = 500) -> int:
+        """Recompute every hotel's bitmasks and USD prices, e.g. after exchange rates changed.
+
+        Only hotels whose fields change are written, and only if they were not
+        modified since they were read: a hotel edited in between already got
+        its search fields from the edit. `updated_at` (and so the ETag) is left
+        alone, since the hotel's content did not change; `search_updated_at`
+        is stamped instead for the search index to pick the new prices up.
+        Returns the number of hotels updated.
+        """
+        projection = {field: 1 for field in ("amenities", "room_types", "updated_at", *SEARCH_FIELDS)}
+        updated = 0
+        operations = []
+        
+        async for hotel in self.hotels_collection.find({}, projection):
+            fields = compute_search_fields(hotel, rates)
+            if all(hotel.get(field) == value for field, value in fields.items()):
+                continue
+            operations.append(UpdateOne(
+                {"_id": hotel["_id"], "updated_at": hotel.get("updated_at")},
+                {"$set": {**fields, "search_updated_at": datetime.utcnow()}}
+            ))
+            if len(operations) >= batch_size:
+                result = await self.hotels_collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                operations = []
+        
+        if operations:
+            result = await self.hotels_collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+        return updated
+
+    def _diff_hotel_fields(self, hotel: dict, update_dict: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the subset of update_dict that differs from the stored hotel"""
+        stored_hashes = hotel.get("field_hashes") or {}
+        changes = {}
+        
+        for field, value in update_dict.items():
+            if field in HOTEL_CONTENT_FIELDS:
+                stored_hash = stored_hashes.get(field) or compute_content_hash(hotel.get(field))
+                if compute_content_hash(value) != stored_hash:
+                    changes[field] = value
+            elif hotel.get(field) != value:
+                changes[field] = value
+        
+        return changes
+
     async def delete_hotel(self, hotel_id: str, dmc_agent_id: str) -> bool:
         """Delete hotel (only by owning DMC agent)"""
         # Verify ownership
@@ -91,13 +464,19 @@ class HotelService:
         # Soft delete by setting is_active to False
         result = await self.hotels_collection.update_one(
             {"_id": ObjectId(hotel_id)},
-            {"$set": {"is_active": False, "updated_at": None}}
+            {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
         )
         
         return result.modified_count > 0
 
-    async def search_hotels(self, filters: HotelSearchFilters, pagination: PaginationParams) -> dict:
-        """Search hotels with filters"""
+    async def search_hotels(
+        self,
+        filters: HotelSearchFilters,
+        pagination: PaginationParams,
+        sort: Optional[HotelSort] = None,
+        facets: Optional[List[HotelFacet]] = None
+    ) -> dict:
+        """Search hotels with filters, optionally with counts per facet over all matching hotels"""
         query = {"is_active": True}  # Only show active hotels
         
         # Build search query
@@ -117,35 +496,31 @@ class HotelService:
             query.setdefault("star_rating", {})["$lte"] = filters.max_star_rating
         
         if filters.amenities:
-            query["amenities"] = {"$in": filters.amenities}
+            query["amenity_mask"] = bits_condition(filters.amenities, AMENITY_BITS, filters.match)
         
         if filters.room_types:
-            query["room_types.room_type"] = {"$in": filters.room_types}
+            query["room_type_mask"] = bits_condition(filters.room_types, ROOM_TYPE_BITS, filters.match)
+        
+        # Hotels whose USD price range overlaps the requested one
+        if filters.min_rate:
+            query["max_rate_usd"] = {"$gte": filters.min_rate}
         
-        if filters.min_rate or filters.max_rate:
-            rate_query = {}
-            if filters.min_rate:
-                rate_query["$gte"] = filters.min_rate
-            if filters.max_rate:
-                rate_query["$lte"] = filters.max_rate
-            query["room_types.base_rate"] = rate_query
+        if filters.max_rate:
+            query["min_rate_usd"] = {"$lte": filters.max_rate}
         
         if filters.dmc_agent_id:
             query["dmc_agent_id"] = ObjectId(filters.dmc_agent_id)
 
-        # Paginate results
-        result = await paginate_collection(
-            self.hotels_collection,
-            query,
-            pagination,
-            sort_field="created_at",
-            sort_direction=-1
-        )
-
-        # Convert documents for response
-        result["items"] = [prepare_document_for_response(item) for item in result["items"]]
+        sort_field, sort_direction = HOTEL_SORTS.get(sort, ("created_at", -1))
+        if not facets:
+            return await self._search(query, pagination, sort_field, sort_direction)
         
-        return result
+        result, facet_counts = await asyncio.gather(
+            self._search(query, pagination, sort_field, sort_direction),
+            self._facets(query, facets)
+        )
+        # The page result is shared with identical concurrent searches, so it is copied, not modified
+        return {**result, "facets": facet_counts}
 
     async def get_hotels_by_dmc(self, dmc_agent_id: str, pagination: PaginationParams) -> dict:
         """Get all hotels for a specific DMC agent"""
@@ -171,7 +546,8 @@ class HotelService:
         check_out_date: str, 
         rooms: int,
         filters: HotelSearchFilters,
-        pagination: PaginationParams
+        pagination: PaginationParams,
+        sort: Optional[HotelSort] = None
     ) -> dict:
         """Get available hotels for specific dates (simplified - real implementation would check actual availability)"""
         # This is a simplified version. In a real system, you would:
@@ -189,20 +565,80 @@ class HotelService:
             query["location.city"] = {"$regex": filters.city, "$options": "i"}
         
         if filters.amenities:
-            query["amenities"] = {"$in": filters.amenities}
+            query["amenity_mask"] = bits_condition(filters.amenities, AMENITY_BITS, filters.match)
         
         if filters.room_types:
-            query["room_types.room_type"] = {"$in": filters.room_types}
+            query["room_type_mask"] = bits_condition(filters.room_types, ROOM_TYPE_BITS, filters.match)
 
-        result = await paginate_collection(
-            self.hotels_collection,
-            query,
-            pagination,
-            sort_field="star_rating",
-            sort_direction=-1
-        )
+        sort_field, sort_direction = HOTEL_SORTS.get(sort, ("star_rating", -1))
+        return await self._search(query, pagination, sort_field, sort_direction)
 
-        # Convert documents for response
-        result["items"] = [prepare_document_for_response(item) for item in result["items"]]
+    async def _search(
+        self,
+        query: Dict[str, Any],
+        pagination: PaginationParams,
+        sort_field: str,
+        sort_direction: int
+    ) -> dict:
+        """Paginated search results; the returned dict is shared with identical concurrent searches"""
+        async def run() -> dict:
+            hits = hotel_search_index.search(query, sort_field, sort_direction, pagination.skip, pagination.size)
+            HOTEL_INDEX_SEARCHES.labels("database" if hits is None else "index").inc()
+            with operation_timeout(OperationClass.SEARCH):
+                if hits is None:
+                    result = await paginate_collection(
+                        search_collection(self.hotels_collection),
+                        query,
+                        pagination,
+                        sort_field=sort_field,
+                        sort_direction=sort_direction,
+                        allow_partial=True
+                    )
+                else:
+                    hotel_ids, total = hits
+                    result = page_result(await self._fetch_page(hotel_ids, query), total, pagination)
+
+            # Convert documents for response
+            result["items"] = [prepare_document_for_response(item) for item in result["items"]]
+            return result
+
+        key = call_key(query, sort_field, sort_direction, pagination.page, pagination.size)
+        return await hotel_searches.do(key, run)
+
+    async def _facets(self, query: Dict[str, Any], facets: List[HotelFacet]) -> Dict[str, List[Dict[str, Any]]]:
+        """Counts per facet over the hotels matching `query`; facets not cached run in one $facet aggregation"""
+        base_key = call_key(query)
+        counts = {facet: hotel_facet_cache.get((base_key, facet)) for facet in facets}
+        missing = sorted(facet for facet, cached in counts.items() if cached is None)
+        HOTEL_FACET_CACHE.labels("hit").inc(len(counts) - len(missing))
+        
+        if missing:
+            HOTEL_FACET_CACHE.labels("miss").inc(len(missing))
+            
+            async def run() -> Dict[HotelFacet, List[Dict[str, Any]]]:
+                pipeline = [
+                    {"$match": query},
+                    {"$project": FACET_PROJECTION},
+                    {"$facet": {facet.value: facet_stages(facet) for facet in missing}}
+                ]
+                with operation_timeout(OperationClass.SEARCH):
+                    results = await search_collection(self.hotels_collection).aggregate(pipeline).to_list(length=1)
+                return {facet: format_facet(facet, results[0][facet.value]) for facet in missing}
+            
+            fresh = await hotel_facet_counts.do(call_key(query, missing), run)
+            for facet in missing:
+                hotel_facet_cache.put((base_key, facet), fresh[facet])
+                counts[facet] = fresh[facet]
+        
+        return {facet.value: counts[facet] for facet in facets}
+
+    async def _fetch_page(self, hotel_ids: List[ObjectId], query: Dict[str, Any]) -> List[dict]:
+        """Documents of a page found by the search index, in its order"""
+        page_filter = {"_id": {"$in": hotel_ids}}
+        if "is_active" in query:
+            # The index may lag a deactivation
+            page_filter["is_active"] = query["is_active"]
         
-        return result
\ No newline at end of file
+        docs = await search_collection(self.hotels_collection).find(page_filter).to_list(length=len(hotel_ids))
+        by_id = {doc["_id"]: doc for doc in docs}
+        return [by_id[hotel_id] for hotel_id in hotel_ids if hotel_id in by_id]
\ No newline at end of file
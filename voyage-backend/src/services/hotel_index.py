@@ -0,0 +1,365 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from core.config import settings
+from core.constants import AMENITY_BITS, ROOM_TYPE_BITS
+from core.metrics import HOTEL_INDEX_ROWS
+from utils.helpers import compute_bitmask
+
+logger = logging.getLogger(__name__)
+
+# Hotel fields the index is built from
+INDEX_PROJECTION = {
+    "is_active": 1,
+    "star_rating": 1,
+    "amenities": 1,
+    "room_types.room_type": 1,
+    "min_rate_usd": 1,
+    "max_rate_usd": 1,
+    "location.country": 1,
+    "location.city": 1,
+    "location.district": 1,
+    "dmc_agent_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "search_updated_at": 1
+}
+
+COLUMN_TYPES = {
+    "is_active": np.bool_,
+    "star_rating": np.int8,  # 0 when unset
+    "min_rate_usd": np.float64,  # NaN when unpriced
+    "max_rate_usd": np.float64,
+    "amenities": np.int64,
+    "room_types": np.int64,
+    "created_at": np.float64,
+}
+
+# Query fields matched case-insensitively by regex, and exact-match fields; stored dictionary-encoded
+REGEX_FIELDS = ("location.country", "location.city", "location.district")
+EXACT_FIELDS = ("dmc_agent_id",)
+
+# Sortable query fields -> column
+SORT_COLUMNS = {"created_at": "created_at", "star_rating": "star_rating", "min_rate_usd": "min_rate_usd"}
+
+INITIAL_CAPACITY = 1024
+
+# Polling re-reads changes this far back, so writes stamped by a worker with a slightly slow clock are not missed
+POLL_OVERLAP = timedelta(seconds=5)
+RETRY_DELAY_SECONDS = 5
+
+# Server error when change streams are unavailable (standalone mongod)
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+
+class UnsupportedQuery(Exception):
+    """The query uses a field or operator the index cannot evaluate"""
+
+
+class ValueDictionary:
+    """Distinct values of a field, each with an integer code; rows store the code (-1 for none)"""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[Any, int] = {}
+
+    def encode(self, value: Any) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value: Any) -> int:
+        return self._codes.get(value, -1)
+
+    def matching_codes(self, predicate: Callable[[Any], bool]) -> np.ndarray:
+        return np.array([code for code, value in enumerate(self.values) if predicate(value)], dtype=np.int32)
+
+
+def get_path(doc: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+class HotelSearchIndex:
+    """Per-worker, in-memory columnar index of the hotel catalogue.
+
+    Hotel searches are answered from NumPy columns: each supported query
+    condition becomes a boolean mask, and the matching rows are sorted and
+    paginated in memory, so MongoDB is only asked for the page's documents
+    by _id. Text fields are dictionary-encoded: a regex is run once per
+    distinct value, not once per hotel. The index follows the hotels
+    collection through a change stream, or by polling `updated_at` and
+    `search_updated_at` (stamped by repricing) where change streams are
+    unavailable, and lags writes by up to that delay.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._reset()
+        self._task: Optional[asyncio.Task] = None
+        self._last_seen: Optional[datetime] = None
+
+    def _reset(self):
+        self._size = 0
+        self._ids: List[ObjectId] = []
+        self._rows: Dict[ObjectId, int] = {}
+        self._columns = {name: np.zeros(INITIAL_CAPACITY, dtype) for name, dtype in COLUMN_TYPES.items()}
+        self._codes = {field: np.full(INITIAL_CAPACITY, -1, np.int32) for field in REGEX_FIELDS + EXACT_FIELDS}
+        self._dictionaries = {field: ValueDictionary() for field in REGEX_FIELDS + EXACT_FIELDS}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def start(self, db: AsyncIOMotorDatabase):
+        self._task = asyncio.create_task(self._maintain(db.hotels))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+    # Search
+
+    def search(
+        self,
+        query: Dict[str, Any],
+        sort_field: str,
+        sort_direction: int,
+        skip: int,
+        limit: int
+    ) -> Optional[Tuple[List[ObjectId], int]]:
+        """Ids of the requested page and the total number of matches, or None if the index can't answer"""
+        if not self.ready or sort_field not in SORT_COLUMNS:
+            return None
+        try:
+            mask = self._mask(query)
+        except UnsupportedQuery:
+            return None
+
+        rows = np.flatnonzero(mask)
+        keys = self._columns[SORT_COLUMNS[sort_field]][rows]
+        if keys.dtype.kind == "f":
+            # Unpriced hotels (NaN) sort as MongoDB sorts null: below every number
+            keys = np.where(np.isnan(keys), -np.inf, keys)
+        # Stable, so equal keys keep catalogue order
+        order = np.argsort(-keys if sort_direction < 0 else keys, kind="stable")
+        page = rows[order[skip:skip + limit]]
+        return [self._ids[row] for row in page], len(rows)
+
+    def _mask(self, query: Dict[str, Any]) -> np.ndarray:
+        size = self._size
+        columns = {name: column[:size] for name, column in self._columns.items()}
+        mask = np.ones(size, dtype=bool)
+
+        for field, condition in query.items():
+            if field == "is_active" and isinstance(condition, bool):
+                mask &= columns["is_active"] == condition
+            elif field in REGEX_FIELDS:
+                mask &= self._regex_mask(field, condition)
+            elif field in EXACT_FIELDS and not isinstance(condition, dict):
+                mask &= self._codes[field][:size] == self._dictionaries[field].code(condition)
+            elif field == "star_rating":
+                # Hotels without a rating never match a range, as in MongoDB
+                mask &= self._range_mask(columns["star_rating"], condition) & (columns["star_rating"] > 0)
+            elif field == "amenity_mask":
+                mask &= self._bits_mask(columns["amenities"], condition)
+            elif field == "room_type_mask":
+                mask &= self._bits_mask(columns["room_types"], condition)
+            elif field in ("min_rate_usd", "max_rate_usd"):
+                # NaN (unpriced) fails every comparison, as null does in MongoDB
+                mask &= self._range_mask(columns[field], condition)
+            else:
+                raise UnsupportedQuery(field)
+
+        return mask
+
+    def _operators(self, condition: Any, allowed: set) -> Dict[str, Any]:
+        if not isinstance(condition, dict) or not condition or set(condition) - allowed:
+            raise UnsupportedQuery(condition)
+        return condition
+
+    def _range_mask(self, column: np.ndarray, condition: Any) -> np.ndarray:
+        bounds = self._operators(condition, {"$gte", "$lte"})
+        mask = np.ones(len(column), dtype=bool)
+        if "$gte" in bounds:
+            mask &= column >= bounds["$gte"]
+        if "$lte" in bounds:
+            mask &= column <= bounds["$lte"]
+        return mask
+
+    def _bits_mask(self, column: np.ndarray, condition: Any) -> np.ndarray:
+        operators = self._operators(condition, {"$bitsAllSet", "$bitsAnySet"})
+        if not all(isinstance(bits, int) for bits in operators.values()):
+            raise UnsupportedQuery(condition)  # Bit positions or BinData
+        mask = np.ones(len(column), dtype=bool)
+        if "$bitsAllSet" in operators:
+            bits = operators["$bitsAllSet"]
+            mask &= (column & bits) == bits
+        if "$bitsAnySet" in operators:
+            mask &= (column & operators["$bitsAnySet"]) != 0
+        return mask
+
+    def _regex_mask(self, field: str, condition: Any) -> np.ndarray:
+        options = self._operators(condition, {"$regex", "$options"})
+        if options.get("$options", "") not in ("", "i"):
+            raise UnsupportedQuery(condition)
+        try:
+            pattern = re.compile(options["$regex"], re.IGNORECASE if options.get("$options") else 0)
+        except (re.error, TypeError, KeyError):
+            raise UnsupportedQuery(condition)
+
+        codes = self._dictionaries[field].matching_codes(
+            lambda value: isinstance(value, str) and pattern.search(value) is not None
+        )
+        return np.isin(self._codes[field][:self._size], codes)
+
+    # Maintenance
+
+    def apply(self, doc: Dict[str, Any]):
+        """Add or update one hotel's row"""
+        row = self._rows.get(doc["_id"])
+        if row is None:
+            row = self._append(doc["_id"])
+
+        created_at = doc.get("created_at")
+
+        self._columns["is_active"][row] = bool(doc.get("is_active", True))
+        self._columns["star_rating"][row] = doc.get("star_rating") or 0
+        for name in ("min_rate_usd", "max_rate_usd"):
+            self._columns[name][row] = np.nan if doc.get(name) is None else doc[name]
+        self._columns["amenities"][row] = compute_bitmask(doc.get("amenities") or [], AMENITY_BITS)
+        self._columns["room_types"][row] = compute_bitmask(
+            [room.get("room_type") for room in doc.get("room_types") or []], ROOM_TYPE_BITS
+        )
+        self._columns["created_at"][row] = created_at.timestamp() if isinstance(created_at, datetime) else 0
+        for field in REGEX_FIELDS + EXACT_FIELDS:
+            self._codes[field][row] = self._dictionaries[field].encode(get_path(doc, field))
+
+        for stamp in (created_at, doc.get("updated_at"), doc.get("search_updated_at")):
+            if isinstance(stamp, datetime) and (self._last_seen is None or stamp > self._last_seen):
+                self._last_seen = stamp
+
+    def remove(self, hotel_id: ObjectId):
+        """Hide a deleted hotel; its row is reused if the id comes back"""
+        row = self._rows.get(hotel_id)
+        if row is not None:
+            self._columns["is_active"][row] = False
+
+    def _append(self, hotel_id: ObjectId) -> int:
+        row = self._size
+        capacity = len(self._columns["is_active"])
+        if row == capacity:
+            for name, column in self._columns.items():
+                grown = np.zeros(capacity * 2, column.dtype)
+                grown[:capacity] = column
+                self._columns[name] = grown
+            for field, codes in self._codes.items():
+                grown = np.full(capacity * 2, -1, np.int32)
+                grown[:capacity] = codes
+                self._codes[field] = grown
+
+        self._size += 1
+        self._ids.append(hotel_id)
+        self._rows[hotel_id] = row
+        return row
+
+    async def load(self, collection: AsyncIOMotorCollection):
+        """(Re)build the index from the whole collection"""
+        docs = await collection.find({}, INDEX_PROJECTION).to_list(length=None)
+
+        # Built aside and swapped in, so searches never see a half-built index
+        fresh = HotelSearchIndex()
+        for doc in docs:
+            fresh.apply(doc)
+        self._size, self._ids, self._rows = fresh._size, fresh._ids, fresh._rows
+        self._columns, self._codes, self._dictionaries = fresh._columns, fresh._codes, fresh._dictionaries
+        self._last_seen = fresh._last_seen
+        self.ready = True
+        HOTEL_INDEX_ROWS.set(self._size)
+
+    async def _maintain(self, collection: AsyncIOMotorCollection):
+        """Load the index, then follow changes; any gap is closed by reloading"""
+        use_change_stream = settings.HOTEL_SEARCH_INDEX_CHANGE_STREAM
+        while True:
+            try:
+                if use_change_stream:
+                    # Opened before loading, so no change falls between the load and the stream
+                    async with collection.watch(full_document="updateLookup") as stream:
+                        await self.load(collection)
+                        logger.info(f"Hotel search index loaded {self._size} hotels; following the change stream")
+                        async for change in stream:
+                            self._apply_change(change)
+                else:
+                    await self.load(collection)
+                    logger.info(f"Hotel search index loaded {self._size} hotels; polling every "
+                                f"{settings.HOTEL_SEARCH_INDEX_POLL_SECONDS}s")
+                    await self._poll(collection)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if use_change_stream and exc.code == CHANGE_STREAM_UNSUPPORTED:
+                    logger.info("Change streams are unavailable; the hotel search index polls for changes")
+                    use_change_stream = False
+                    continue
+                logger.warning(f"Hotel search index update failed: {exc}")
+            except Exception as exc:
+                logger.warning(f"Hotel search index update failed: {exc}")
+            await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+    def _apply_change(self, change: Dict[str, Any]):
+        operation = change.get("operationType")
+        if operation in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is None:
+                # Deleted before the update could be looked up
+                self.remove(change["documentKey"]["_id"])
+            else:
+                self.apply(doc)
+        elif operation == "delete":
+            self.remove(change["documentKey"]["_id"])
+        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            raise PyMongoError(f"Hotel change stream ended by {operation}")
+        HOTEL_INDEX_ROWS.set(self._size)
+
+    async def _poll(self, collection: AsyncIOMotorCollection):
+        while True:
+            await asyncio.sleep(settings.HOTEL_SEARCH_INDEX_POLL_SECONDS)
+            if self._last_seen is None:
+                await self.load(collection)
+                continue
+
+            since = self._last_seen - POLL_OVERLAP
+            cursor = collection.find(
+                {"$or": [
+                    {"updated_at": {"$gt": since}},
+                    {"created_at": {"$gt": since}},
+                    {"search_updated_at": {"$gt": since}}
+                ]},
+                INDEX_PROJECTION
+            )
+            async for doc in cursor:
+                self.apply(doc)
+            HOTEL_INDEX_ROWS.set(self._size)
+
+
+hotel_search_index = HotelSearchIndex()
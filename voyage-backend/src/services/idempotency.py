@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from core.config import settings
+from core.constants import IdempotencyStatus
+
+
+# Executions in flight on this worker (future, request fingerprint), so local
+# duplicates await the result instead of polling the database
+_in_flight: Dict[str, Tuple[asyncio.Future, str]] = {}
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """Hash a request payload so a reused key with a different body can be rejected"""
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class IdempotencyService:
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.keys_collection = db.idempotency_keys
+
+    async def execute(
+        self,
+        idempotency_key: Optional[str],
+        user_id: str,
+        operation_name: str,
+        payload: Dict[str, Any],
+        operation: Callable[[], Awaitable[dict]]
+    ) -> Tuple[dict, bool]:
+        """Run an operation at most once per idempotency key.
+
+        Returns the operation's result and whether it was replayed from an earlier
+        execution. Concurrent requests with the same key wait for the first one.
+        """
+        if not idempotency_key:
+            return await operation(), False
+
+        if len(idempotency_key) > 255:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key must be at most 255 characters"
+            )
+
+        key_id = f"{user_id}:{operation_name}:{idempotency_key}"
+        fingerprint = request_fingerprint(payload)
+        deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.05
+
+        while True:
+            in_flight = _in_flight.get(key_id)
+            if in_flight:
+                future, claimed_fingerprint = in_flight
+                self._check_fingerprint({"fingerprint": claimed_fingerprint}, fingerprint)
+                try:
+                    result = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        # The first execution was cancelled and released the key; try again
+                        continue
+                    raise
+                return result, True
+
+            if await self._claim(key_id, fingerprint):
+                return await self._run(key_id, fingerprint, operation), False
+
+            record = await self.keys_collection.find_one({"_id": key_id})
+            if record:
+                self._check_fingerprint(record, fingerprint)
+                if record["status"] == IdempotencyStatus.COMPLETED:
+                    return record["response"], True
+
+            # Another worker is executing the request (or just failed and released the key)
+            if asyncio.get_running_loop().time() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def _claim(self, key_id: str, fingerprint: str) -> bool:
+        """Claim a key for execution; abandoned claims past their lock time are taken over"""
+        now = datetime.utcnow()
+        claim = {
+            "status": IdempotencyStatus.IN_PROGRESS,
+            "fingerprint": fingerprint,
+            "locked_until": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+            "created_at": now,
+            "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+        }
+
+        try:
+            await self.keys_collection.insert_one({"_id": key_id, **claim})
+            return True
+        except DuplicateKeyError:
+            pass
+
+        result = await self.keys_collection.update_one(
+            {
+                "_id": key_id,
+                "status": IdempotencyStatus.IN_PROGRESS,
+                "fingerprint": fingerprint,
+                "locked_until": {"$lt": now}
+            },
+            {"$set": claim}
+        )
+        return result.modified_count == 1
+
+    async def _run(self, key_id: str, fingerprint: str, operation: Callable[[], Awaitable[dict]]) -> dict:
+        """Execute a claimed operation, storing its result for replay"""
+        future = asyncio.get_running_loop().create_future()
+        _in_flight[key_id] = (future, fingerprint)
+
+        try:
+            try:
+                result = await operation()
+            except BaseException as exc:
+                # Release the key so the client can retry after a failure
+                await self.keys_collection.delete_one({"_id": key_id})
+                if isinstance(exc, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(exc)
+                raise
+
+            await self.keys_collection.update_one(
+                {"_id": key_id},
+                {"$set": {"status": IdempotencyStatus.COMPLETED, "response": result}}
+            )
+            future.set_result(result)
+            return result
+        finally:
+            _in_flight.pop(key_id, None)
+            if not future.done():
+                # Storing the result failed; waiters retry against the database
+                future.cancel()
+            elif not future.cancelled():
+                # Nobody may be waiting; avoid "exception was never retrieved" warnings
+                future.exception()
+
+    @staticmethod
+    def _check_fingerprint(record: dict, fingerprint: str):
+        if record.get("fingerprint") != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request body"
+            )
@@ -1,15 +1,52 @@
+import math
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import HTTPException, status
 from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
 
 from models.offer import Offer
-from schemas.offer import OfferCreate, OfferQuote, OfferSearchFilters
+from schemas.offer import (
+    OfferCreate, OfferRFQCreate, OfferQuote, OfferQuoteBatchItem, OfferSearchFilters
+)
 from schemas.base import PaginationParams
 from utils.helpers import prepare_document_for_response, calculate_nights, calculate_commission
 from utils.pagination import paginate_collection
-from core.constants import UserType, OfferStatus
+from utils.export import build_export_projection, stream_export
+from utils.etag import ETAG_PROJECTION
+from core.constants import UserType, OfferStatus, ExportFormat, OperationClass, EXPORT_BATCH_SIZE
+from db.mongodb import operation_timeout
+from services.events import event_broker
+from services.exchange_rates import exchange_rates
+
+
+# Columns included in offer exports
+OFFER_EXPORT_FIELDS = [
+    "id",
+    "rfq_id",
+    "status",
+    "hotel_id",
+    "travel_agent_id",
+    "dmc_agent_id",
+    "check_in_date",
+    "check_out_date",
+    "nights",
+    "guest_nationality",
+    "total_price",
+    "currency",
+    "total_price_usd",
+    "commission_rate",
+    "commission_amount",
+    "quoted_at",
+    "expires_at",
+    "responded_at",
+    "created_at",
+    "updated_at",
+]
+
+# Fields published in offer status events
+OFFER_EVENT_PROJECTION = {"status": 1, "hotel_id": 1, "travel_agent_id": 1, "dmc_agent_id": 1}
 
 
 class OfferService:
@@ -34,25 +71,130 @@ class OfferService:
                 detail="Hotel not found or inactive"
             )
 
-        # Get DMC agent ID from hotel
-        dmc_agent_id = hotel["dmc_agent_id"]
-
         # Create offer document
-        offer_dict = offer_data.dict()
-        offer_dict["travel_agent_id"] = ObjectId(travel_agent_id)
-        offer_dict["dmc_agent_id"] = ObjectId(dmc_agent_id)
-        offer_dict["hotel_id"] = ObjectId(offer_data.hotel_id)
-        offer_dict["nights"] = calculate_nights(offer_data.check_in_date, offer_data.check_out_date)
-        
-        offer = Offer(**offer_dict)
-        offer_doc = offer.dict(by_alias=True)
+        offer_doc = self._build_offer_document(
+            offer_data.dict(exclude={"hotel_id"}),
+            travel_agent_id=ObjectId(travel_agent_id),
+            dmc_agent_id=hotel["dmc_agent_id"],
+            hotel_id=hotel["_id"]
+        )
         
         # Insert offer
         result = await self.offers_collection.insert_one(offer_doc)
         
         # Get created offer
-        created_offer = await self.offers_collection.find_one({"_id": result.inserted_id})
-        return prepare_document_for_response(created_offer)
+        created_offer = prepare_document_for_response(
+            await self.offers_collection.find_one({"_id": result.inserted_id})
+        )
+        await event_broker.publish_status_change("offer", "requested", created_offer)
+        return created_offer
+
+    async def create_rfq(self, travel_agent_id: str, rfq_data: OfferRFQCreate) -> dict:
+        """Broadcast one request for quotes to many hotels (by travel agent)"""
+        hotel_ids = list(dict.fromkeys(rfq_data.hotel_ids))
+        
+        # Load all requested hotels in a single query
+        hotels = await self.hotels_collection.find(
+            {"_id": {"$in": [ObjectId(hotel_id) for hotel_id in hotel_ids]}, "is_active": True},
+            {"dmc_agent_id": 1}
+        ).to_list(length=None)
+        
+        if not hotels:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No active hotels found for this request"
+            )
+
+        # Group hotels by the DMC agent who manages them
+        hotels_by_dmc: Dict[ObjectId, List[dict]] = {}
+        for hotel in hotels:
+            hotels_by_dmc.setdefault(hotel["dmc_agent_id"], []).append(hotel)
+
+        rfq_id = ObjectId()
+        details = rfq_data.dict(exclude={"hotel_ids"})
+        offer_docs = []
+        offers_by_dmc_agent = {}
+        
+        for dmc_agent_id, dmc_hotels in hotels_by_dmc.items():
+            for hotel in dmc_hotels:
+                offer_doc = self._build_offer_document(
+                    details,
+                    travel_agent_id=ObjectId(travel_agent_id),
+                    dmc_agent_id=dmc_agent_id,
+                    hotel_id=hotel["_id"],
+                    rfq_id=rfq_id
+                )
+                offer_docs.append(offer_doc)
+                offers_by_dmc_agent.setdefault(str(dmc_agent_id), []).append(str(offer_doc["_id"]))
+        
+        # Insert all offers in one round trip
+        await self.offers_collection.insert_many(offer_docs)
+        
+        offers = [prepare_document_for_response(doc) for doc in offer_docs]
+        await event_broker.publish_status_change("offer", "requested", *offers)
+        
+        found_ids = {str(hotel["_id"]) for hotel in hotels}
+        
+        return {
+            "rfq_id": str(rfq_id),
+            "offers": offers,
+            "offers_by_dmc_agent": offers_by_dmc_agent,
+            "missing_hotel_ids": [hotel_id for hotel_id in hotel_ids if hotel_id not in found_ids]
+        }
+
+    async def get_rfq_offers(self, rfq_id: str, travel_agent_id: str) -> dict:
+        """Get all offers of an RFQ side by side, cheapest quotes (in USD) first"""
+        offers = await self.offers_collection.find({
+            "rfq_id": ObjectId(rfq_id),
+            "travel_agent_id": ObjectId(travel_agent_id)
+        }).to_list(length=None)
+        
+        if not offers:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="RFQ not found"
+            )
+
+        # DMCs quote in their own currencies, so quotes are compared in USD; quotes in a currency
+        # without a rate come after those, then everything still awaiting a quote
+        exchange_rates.add_usd_amounts(offers, "total_price", "currency", "total_price_usd")
+        offers.sort(key=lambda offer: (
+            offer.get("total_price") is None,
+            offer["total_price_usd"] is None,
+            offer["total_price_usd"] or 0
+        ))
+        
+        return {
+            "rfq_id": rfq_id,
+            "total": len(offers),
+            "quoted": sum(1 for offer in offers if offer.get("total_price") is not None),
+            "offers": [prepare_document_for_response(offer) for offer in offers]
+        }
+
+    def _build_offer_document(
+        self,
+        details: Dict[str, Any],
+        travel_agent_id: ObjectId,
+        dmc_agent_id: ObjectId,
+        hotel_id: ObjectId,
+        rfq_id: Optional[ObjectId] = None
+    ) -> dict:
+        """Build an offer document ready for insertion"""
+        offer = Offer(
+            **details,
+            travel_agent_id=travel_agent_id,
+            dmc_agent_id=dmc_agent_id,
+            hotel_id=hotel_id,
+            rfq_id=rfq_id,
+            nights=calculate_nights(details["check_in_date"], details["check_out_date"])
+        )
+        offer_doc = offer.dict(by_alias=True)
+        
+        # BSON has no date type, store stay dates as midnight datetimes
+        for field in ("check_in_date", "check_out_date"):
+            offer_doc[field] = datetime.combine(offer_doc[field], datetime.min.time())
+        
+        return offer_doc
 
     async def get_offer(self, offer_id: str) -> Optional[dict]:
         """Get offer by ID"""
@@ -61,31 +203,109 @@ class OfferService:
             return None
         return prepare_document_for_response(offer)
 
+    async def get_offer_version(self, offer_id: str) -> Optional[dict]:
+        """Get only the fields needed to compute an offer's ETag and check access"""
+        offer = await self.offers_collection.find_one(
+            {"_id": ObjectId(offer_id)},
+            {**ETAG_PROJECTION, "travel_agent_id": 1, "dmc_agent_id": 1}
+        )
+        if not offer:
+            return None
+        return prepare_document_for_response(offer)
+
     async def quote_offer(self, offer_id: str, dmc_agent_id: str, quote_data: OfferQuote) -> dict:
         """Provide quote for offer (by DMC agent)"""
-        # Verify offer exists and belongs to DMC agent
-        offer = await self.offers_collection.find_one({
-            "_id": ObjectId(offer_id),
-            "dmc_agent_id": ObjectId(dmc_agent_id),
-            "status": OfferStatus.PENDING
-        })
+        # Quote only pending offers that belong to the DMC agent
+        updated_offer = await self.offers_collection.find_one_and_update(
+            {
+                "_id": ObjectId(offer_id),
+                "dmc_agent_id": ObjectId(dmc_agent_id),
+                "status": OfferStatus.PENDING
+            },
+            {"$set": self._build_quote_update(quote_data, datetime.utcnow())},
+            return_document=ReturnDocument.AFTER
+        )
         
-        if not offer:
+        if not updated_offer:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Offer not found or already processed"
             )
 
+        updated_offer = prepare_document_for_response(updated_offer)
+        await event_broker.publish_status_change("offer", "quoted", updated_offer)
+        return updated_offer
+
+    async def quote_offers_batch(self, dmc_agent_id: str, quotes: List[OfferQuoteBatchItem]) -> dict:
+        """Quote many pending offers at once (by DMC agent)"""
+        now = datetime.utcnow()
+        # Stamped on every offer this batch quotes, so they can be told apart from any other writer's
+        batch_id = ObjectId()
+        
+        # Errors are keyed by position: a repeated offer_id fails without touching the first occurrence
+        errors: Dict[int, str] = {}
+        operations = []
+        offer_ids = set()
+        
+        for position, quote in enumerate(quotes):
+            if not ObjectId.is_valid(quote.offer_id):
+                errors[position] = "Invalid offer_id format"
+                continue
+            if quote.offer_id in offer_ids:
+                errors[position] = "Duplicate offer in batch"
+                continue
+            
+            offer_ids.add(quote.offer_id)
+            operations.append(UpdateOne(
+                {
+                    "_id": ObjectId(quote.offer_id),
+                    "dmc_agent_id": ObjectId(dmc_agent_id),
+                    "status": OfferStatus.PENDING
+                },
+                {"$set": {**self._build_quote_update(quote, now), "quote_batch_id": batch_id}}
+            ))
+        
+        quoted_ids = set()
+        if operations:
+            await self.offers_collection.bulk_write(operations, ordered=False)
+            
+            applied = await self.offers_collection.find(
+                {
+                    "_id": {"$in": [ObjectId(offer_id) for offer_id in offer_ids]},
+                    "quote_batch_id": batch_id
+                },
+                OFFER_EVENT_PROJECTION
+            ).to_list(length=None)
+            applied = [prepare_document_for_response(offer) for offer in applied]
+            quoted_ids = {offer["id"] for offer in applied}
+            await event_broker.publish_status_change("offer", "quoted", *applied)
+        
+        results = []
+        for position, quote in enumerate(quotes):
+            success = position not in errors and quote.offer_id in quoted_ids
+            results.append({
+                "offer_id": quote.offer_id,
+                "success": success,
+                "error": None if success else errors.get(position, "Offer not found or already processed")
+            })
+        
+        quoted = sum(1 for result in results if result["success"])
+        
+        return {
+            "total": len(results),
+            "quoted": quoted,
+            "failed": len(results) - quoted,
+            "results": results
+        }
+
+    def _build_quote_update(self, quote_data: OfferQuote, now: datetime) -> dict:
+        """Build the $set document that turns a pending offer into a quote"""
         # Calculate commission if rate provided
         commission_amount = None
         if quote_data.commission_rate:
             commission_amount = calculate_commission(quote_data.total_price, quote_data.commission_rate)
 
-        # Set expiration time
-        expires_at = datetime.utcnow() + timedelta(hours=quote_data.expires_in_hours)
-
-        # Update offer with quote
-        update_data = {
+        return {
             "quoted_rooms": [room.dict() for room in quote_data.quoted_rooms],
             "total_price": quote_data.total_price,
             "currency": quote_data.currency,
@@ -95,20 +315,11 @@ class OfferService:
             "payment_terms": quote_data.payment_terms,
             "notes": quote_data.notes,
             "status": OfferStatus.QUOTED,
-            "expires_at": expires_at,
-            "quoted_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "expires_at": now + timedelta(hours=quote_data.expires_in_hours),
+            "quoted_at": now,
+            "updated_at": now
         }
 
-        await self.offers_collection.update_one(
-            {"_id": ObjectId(offer_id)},
-            {"$set": update_data}
-        )
-        
-        # Get updated offer
-        updated_offer = await self.offers_collection.find_one({"_id": ObjectId(offer_id)})
-        return prepare_document_for_response(updated_offer)
-
     async def accept_offer(self, offer_id: str, travel_agent_id: str) -> dict:
         """Accept offer (by travel agent)"""
         # Verify offer exists and belongs to travel agent
@@ -126,11 +337,17 @@ class OfferService:
 
         # Check if offer has expired
         if offer.get("expires_at") and datetime.utcnow() > offer["expires_at"]:
-            # Mark as expired
-            await self.offers_collection.update_one(
-                {"_id": ObjectId(offer_id)},
-                {"$set": {"status": OfferStatus.EXPIRED, "updated_at": datetime.utcnow()}}
+            # Mark as expired, unless expire_old_offers got there first
+            expired_offer = await self.offers_collection.find_one_and_update(
+                {"_id": ObjectId(offer_id), "status": OfferStatus.QUOTED},
+                {"$set": {"status": OfferStatus.EXPIRED, "updated_at": datetime.utcnow()}},
+                projection=OFFER_EVENT_PROJECTION,
+                return_document=ReturnDocument.AFTER
             )
+            if expired_offer:
+                await event_broker.publish_status_change(
+                    "offer", "expired", prepare_document_for_response(expired_offer)
+                )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Offer has expired"
@@ -147,8 +364,11 @@ class OfferService:
         )
         
         # Get updated offer
-        updated_offer = await self.offers_collection.find_one({"_id": ObjectId(offer_id)})
-        return prepare_document_for_response(updated_offer)
+        updated_offer = prepare_document_for_response(
+            await self.offers_collection.find_one({"_id": ObjectId(offer_id)})
+        )
+        await event_broker.publish_status_change("offer", "accepted", updated_offer)
+        return updated_offer
 
     async def reject_offer(self, offer_id: str, travel_agent_id: str) -> dict:
         """Reject offer (by travel agent)"""
@@ -176,49 +396,35 @@ class OfferService:
         )
         
         # Get updated offer
-        updated_offer = await self.offers_collection.find_one({"_id": ObjectId(offer_id)})
-        return prepare_document_for_response(updated_offer)
+        updated_offer = prepare_document_for_response(
+            await self.offers_collection.find_one({"_id": ObjectId(offer_id)})
+        )
+        await event_broker.publish_status_change("offer", "rejected", updated_offer)
+        return updated_offer
 
-    async def search_offers(
+    async def build_search_query(
         self, 
         user_id: str, 
         user_type: str, 
-        filters: OfferSearchFilters, 
-        pagination: PaginationParams
-    ) -> dict:
-        """Search offers based on user type and filters"""
+        filters: OfferSearchFilters
+    ) -> Optional[dict]:
+        """Build the offer search query for a user (None if the user has no agent profile)"""
         query = {}
         
         # Filter by user type
         if user_type == UserType.TRAVEL_AGENT:
             # Get travel agent ID
             travel_agent = await self.travel_agents_collection.find_one({"user_id": ObjectId(user_id)})
-            if travel_agent:
-                query["travel_agent_id"] = travel_agent["_id"]
-            else:
-                # Return empty results if no agent profile
-                return {
-                    "items": [],
-                    "total": 0,
-                    "page": pagination.page,
-                    "size": pagination.size,
-                    "pages": 0
-                }
+            if not travel_agent:
+                return None
+            query["travel_agent_id"] = travel_agent["_id"]
         
         elif user_type == UserType.DMC_AGENT:
             # Get DMC agent ID
             dmc_agent = await self.dmc_agents_collection.find_one({"user_id": ObjectId(user_id)})
-            if dmc_agent:
-                query["dmc_agent_id"] = dmc_agent["_id"]
-            else:
-                # Return empty results if no agent profile
-                return {
-                    "items": [],
-                    "total": 0,
-                    "page": pagination.page,
-                    "size": pagination.size,
-                    "pages": 0
-                }
+            if not dmc_agent:
+                return None
+            query["dmc_agent_id"] = dmc_agent["_id"]
 
         # Apply additional filters
         if filters.status:
@@ -234,11 +440,12 @@ class OfferService:
             query["travel_agent_id"] = ObjectId(filters.travel_agent_id)
         
         if filters.check_in_from or filters.check_in_to:
+            # Stay dates are stored as midnight datetimes; the end date is included
             check_in_query = {}
             if filters.check_in_from:
-                check_in_query["$gte"] = filters.check_in_from
+                check_in_query["$gte"] = datetime.combine(filters.check_in_from, datetime.min.time())
             if filters.check_in_to:
-                check_in_query["$lte"] = filters.check_in_to
+                check_in_query["$lt"] = datetime.combine(filters.check_in_to + timedelta(days=1), datetime.min.time())
             query["check_in_date"] = check_in_query
         
         if filters.created_from or filters.created_to:
@@ -250,12 +457,32 @@ class OfferService:
             query["created_at"] = created_query
         
         if filters.min_price or filters.max_price:
-            price_query = {}
-            if filters.min_price:
-                price_query["$gte"] = filters.min_price
-            if filters.max_price:
-                price_query["$lte"] = filters.max_price
-            query["total_price"] = price_query
+            # Bounds are in USD; offers are compared in the currency they were quoted in
+            query.update(exchange_rates.range_query(
+                "total_price", "currency", filters.min_price, filters.max_price
+            ))
+        
+        return query
+
+    async def search_offers(
+        self, 
+        user_id: str, 
+        user_type: str, 
+        filters: OfferSearchFilters, 
+        pagination: PaginationParams
+    ) -> dict:
+        """Search offers based on user type and filters"""
+        query = await self.build_search_query(user_id, user_type, filters)
+        
+        if query is None:
+            # Return empty results if no agent profile
+            return {
+                "items": [],
+                "total": 0,
+                "page": pagination.page,
+                "size": pagination.size,
+                "pages": 0
+            }
 
         # Paginate results
         result = await paginate_collection(
@@ -271,6 +498,30 @@ class OfferService:
         
         return result
 
+    def export_offers(
+        self, 
+        query: Optional[dict], 
+        export_format: ExportFormat, 
+        compress: bool = False
+    ) -> AsyncIterator[bytes]:
+        """Stream offers matching a search query as CSV or NDJSON"""
+        cursor = None
+        if query is not None:
+            cursor = self.offers_collection.find(
+                query, 
+                build_export_projection(OFFER_EXPORT_FIELDS)
+            ).sort("created_at", -1).batch_size(EXPORT_BATCH_SIZE)
+        
+        return stream_export(
+            cursor,
+            OFFER_EXPORT_FIELDS,
+            export_format,
+            compress,
+            prepare_batch=lambda docs: exchange_rates.add_usd_amounts(
+                docs, "total_price", "currency", "total_price_usd"
+            )
+        )
+
     async def get_offer_statistics(self, user_id: str, user_type: str) -> dict:
         """Get offer statistics for user"""
         query = {}
@@ -278,44 +529,72 @@ class OfferService:
         if user_type == UserType.TRAVEL_AGENT:
             travel_agent = await self.travel_agents_collection.find_one({"user_id": ObjectId(user_id)})
             if not travel_agent:
-                return {"total": 0, "pending": 0, "quoted": 0, "accepted": 0, "rejected": 0, "expired": 0}
+                return {"total": 0, "pending": 0, "quoted": 0, "accepted": 0, "rejected": 0, "expired": 0, "value_usd": {}}
             query["travel_agent_id"] = travel_agent["_id"]
         
         elif user_type == UserType.DMC_AGENT:
             dmc_agent = await self.dmc_agents_collection.find_one({"user_id": ObjectId(user_id)})
             if not dmc_agent:
-                return {"total": 0, "pending": 0, "quoted": 0, "accepted": 0, "rejected": 0, "expired": 0}
+                return {"total": 0, "pending": 0, "quoted": 0, "accepted": 0, "rejected": 0, "expired": 0, "value_usd": {}}
             query["dmc_agent_id"] = dmc_agent["_id"]
 
-        # Aggregate statistics
+        # Aggregate statistics; values are summed per currency and converted to USD here
         pipeline = [
             {"$match": query},
             {"$group": {
-                "_id": "$status",
-                "count": {"$sum": 1}
+                "_id": {"status": "$status", "currency": "$currency"},
+                "count": {"$sum": 1},
+                "value": {"$sum": "$total_price"}
             }}
         ]
         
-        results = await self.offers_collection.aggregate(pipeline).to_list(length=None)
+        with operation_timeout(OperationClass.REPORT):
+            results = await self.offers_collection.aggregate(pipeline).to_list(length=None)
         
-        stats = {"total": 0, "pending": 0, "quoted": 0, "accepted": 0, "rejected": 0, "expired": 0}
+        stats = {"total": 0, "pending": 0, "quoted": 0, "accepted": 0, "rejected": 0, "expired": 0, "value_usd": {}}
+        values_usd = exchange_rates.convert(
+            [result["value"] for result in results],
+            [result["_id"].get("currency") for result in results]
+        )
         
-        for result in results:
-            status = result["_id"]
+        for result, value_usd in zip(results, values_usd.tolist()):
+            status = result["_id"]["status"]
             count = result["count"]
             stats["total"] += count
-            stats[status] = count
+            stats[status] = stats.get(status, 0) + count
+            if not math.isnan(value_usd):
+                stats["value_usd"][status] = round(stats["value_usd"].get(status, 0) + value_usd, 2)
         
         return stats
 
-    async def expire_old_offers(self):
-        """Mark expired offers (background task)"""
+    async def expire_old_offers(self, batch_size: int = EXPORT_BATCH_SIZE) -> int:
+        """Mark expired offers (background task), publishing an event for each; returns how many expired"""
         now = datetime.utcnow()
+        expired_filter = {"status": OfferStatus.QUOTED, "expires_at": {"$lte": now}}
+        expired = 0
         
-        await self.offers_collection.update_many(
-            {
-                "status": OfferStatus.QUOTED,
-                "expires_at": {"$lte": now}
-            },
-            {"$set": {"status": OfferStatus.EXPIRED, "updated_at": now}}
-        )
\ No newline at end of file
+        while True:
+            candidates = await self.offers_collection.find(expired_filter, {"_id": 1}).limit(batch_size).to_list(length=None)
+            if not candidates:
+                break
+            
+            offer_ids = [offer["_id"] for offer in candidates]
+            await self.offers_collection.update_many(
+                {"_id": {"$in": offer_ids}, **expired_filter},
+                {"$set": {"status": OfferStatus.EXPIRED, "updated_at": now}}
+            )
+            
+            # Expired now, by this update or a concurrent accept_offer (which may publish it too)
+            offers = await self.offers_collection.find(
+                {"_id": {"$in": offer_ids}, "status": OfferStatus.EXPIRED},
+                OFFER_EVENT_PROJECTION
+            ).to_list(length=None)
+            await event_broker.publish_status_change(
+                "offer", "expired", *[prepare_document_for_response(offer) for offer in offers]
+            )
+            expired += len(offers)
+            
+            if len(candidates) < batch_size:
+                break
+        
+        return expired
@@ -0,0 +1,322 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import CollectionInvalid
+
+from core.config import settings
+from core.metrics import SLOW_QUERIES, SLOW_QUERIES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES_COLLECTION = "slow_queries"
+
+# Read commands whose plans can be explained without side effects
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+
+# Commands logged when slow; writes are logged by shape but not explained
+LOGGED_COMMANDS = EXPLAINABLE_COMMANDS | {"update", "delete", "findAndModify"}
+
+# Command fields that carry the query shape; values inside them are stripped
+SHAPE_FIELDS = ("filter", "query", "pipeline", "sort", "projection", "key", "hint")
+
+# Session, transaction and routing fields that must not be sent with an explain
+NON_EXPLAIN_FIELDS = {
+    "lsid", "txnNumber", "startTransaction", "autocommit", "writeConcern", "readConcern"
+}
+
+# Pipeline stages that write; such aggregations are never explained
+WRITE_STAGES = {"$out", "$merge"}
+
+# Slow records being written or explained at once; beyond this, records are dropped
+MAX_PENDING_RECORDS = 100
+
+# Shapes remembered as already explained by this worker
+MAX_EXPLAINED_SHAPES = 10000
+
+
+def normalize_query_shape(value: Any) -> Any:
+    """Replace the values in a query with placeholders, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: normalize_query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [normalize_query_shape(item) for item in value]
+        # $in: [...] lists of values collapse to one placeholder, so list length is not part of the shape
+        if all(item == "?" for item in items):
+            return ["?"] if items else []
+        return items
+    return "?"
+
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """The normalized shape of a command, without the values it was called with"""
+    shape: Dict[str, Any] = {}
+    if command_name in ("update", "delete"):
+        # Bulk writes carry one filter per statement; the first describes the batch
+        statements = command.get(f"{command_name}s") or [{}]
+        shape["filter"] = normalize_query_shape(statements[0].get("q", {}))
+        return shape
+
+    for field in SHAPE_FIELDS:
+        if field not in command:
+            continue
+        if field in ("sort", "projection", "hint"):
+            # Sort directions, projected fields and hints describe the query, not user data
+            shape[field] = command[field]
+        else:
+            shape[field] = normalize_query_shape(command[field])
+    return shape
+
+
+def shape_id(collection: str, command_name: str, shape: Dict[str, Any]) -> str:
+    serialized = json.dumps([collection, command_name, shape], default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+def explain_command(command_name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The command to explain, or None when it must not be explained"""
+    if command_name not in EXPLAINABLE_COMMANDS:
+        return None
+    if command_name == "aggregate" and any(
+        isinstance(stage, dict) and WRITE_STAGES.intersection(stage) for stage in command.get("pipeline", [])
+    ):
+        return None
+
+    return {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in NON_EXPLAIN_FIELDS
+    }
+
+
+def _find_key(document: Any, key: str) -> Optional[Dict[str, Any]]:
+    """First nested dict stored under `key` (aggregate explains nest the cursor stage's plan)"""
+    if isinstance(document, dict):
+        if isinstance(document.get(key), dict):
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_stages(plan: Dict[str, Any], stages: List[str], indexes: List[str]):
+    if "queryPlan" in plan:
+        plan = plan["queryPlan"]
+    if plan.get("stage"):
+        stages.append(plan["stage"])
+    if plan.get("indexName"):
+        indexes.append(plan["indexName"])
+    for child in [plan.get("inputStage")] + list(plan.get("inputStages", [])):
+        if isinstance(child, dict):
+            _plan_stages(child, stages, indexes)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Docs examined vs returned and the winning plan's stages and indexes"""
+    query_planner = _find_key(explain, "queryPlanner") or {}
+    execution_stats = _find_key(explain, "executionStats") or {}
+
+    stages: List[str] = []
+    indexes: List[str] = []
+    winning_plan = query_planner.get("winningPlan")
+    if isinstance(winning_plan, dict):
+        _plan_stages(winning_plan, stages, indexes)
+
+    docs_examined = execution_stats.get("totalDocsExamined", 0)
+    returned = execution_stats.get("nReturned", 0)
+    return {
+        "docs_examined": docs_examined,
+        "keys_examined": execution_stats.get("totalKeysExamined", 0),
+        "returned": returned,
+        "examined_per_returned": round(docs_examined / returned, 2) if returned else float(docs_examined),
+        "execution_time_ms": execution_stats.get("executionTimeMillis"),
+        "stages": stages,
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages
+    }
+
+
+class SlowQueryLog:
+    """Record slow MongoDB commands by query shape, explaining each new shape once.
+
+    `record` is called from the driver's command listener, which runs on the
+    executor thread that performed the operation; the work is handed to the
+    event loop so the operation that was slow is not slowed down further.
+    """
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Set[asyncio.Task] = set()
+        self._explained: "OrderedDict[str, None]" = OrderedDict()
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """Create the capped log collection and start accepting records"""
+        try:
+            await db.create_collection(
+                SLOW_QUERIES_COLLECTION,
+                capped=True,
+                size=settings.SLOW_QUERY_LOG_SIZE_MB * 1024 * 1024
+            )
+        except CollectionInvalid:
+            pass  # Already exists
+        except Exception as exc:
+            logger.warning(f"Could not create the {SLOW_QUERIES_COLLECTION} collection: {exc}")
+
+        self.db = db
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        """Stop accepting records and wait for pending writes"""
+        self._loop = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self.db = None
+
+    def record(
+        self,
+        collection: str,
+        command_name: str,
+        command: Dict[str, Any],
+        duration_ms: float,
+        database_name: str
+    ):
+        """Thread-safe: queue a slow command for logging"""
+        SLOW_QUERIES.labels(collection, command_name).inc()
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            # A fresh context, so the log write is neither bound by nor counted against the request that was slow
+            loop.call_soon_threadsafe(
+                self._schedule, collection, command_name, command, duration_ms, database_name,
+                context=contextvars.Context()
+            )
+        except RuntimeError:
+            pass  # Loop closed while shutting down
+
+    def _schedule(self, collection: str, command_name: str, command: Dict[str, Any], duration_ms: float, database_name: str):
+        if self.db is None:
+            return
+        if len(self._pending) >= MAX_PENDING_RECORDS:
+            # Everything is slow; logging every command would only add load
+            SLOW_QUERIES_DROPPED.inc()
+            return
+
+        task = asyncio.create_task(self._log(collection, command_name, command, duration_ms, database_name))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _log(self, collection: str, command_name: str, command: Dict[str, Any], duration_ms: float, database_name: str):
+        shape = query_shape(command_name, command)
+        shape_key = shape_id(collection, command_name, shape)
+        record = {
+            "shape_id": shape_key,
+            "collection": collection,
+            "command": command_name,
+            # Stored serialized: shapes contain operator keys such as $in
+            "shape": json.dumps(shape, default=str),
+            "duration_ms": round(duration_ms, 3),
+            "timestamp": datetime.utcnow()
+        }
+
+        try:
+            if settings.SLOW_QUERY_EXPLAIN and shape_key not in self._explained and database_name == self.db.name:
+                self._remember_explained(shape_key)
+                explain = await self._explain(command_name, command)
+                if explain is not None:
+                    record["explain"] = explain
+                    logger.warning(
+                        f"New slow query shape on {collection}.{command_name} ({duration_ms:.0f}ms): "
+                        f"{record['shape']} -> {explain}"
+                    )
+
+            await self.db[SLOW_QUERIES_COLLECTION].insert_one(record)
+        except Exception as exc:
+            logger.warning(f"Failed to record slow query on {collection}.{command_name}: {exc}")
+
+    async def _explain(self, command_name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        to_explain = explain_command(command_name, command)
+        if to_explain is None:
+            return None
+        try:
+            explain = await self.db.command(
+                {
+                    "explain": to_explain,
+                    "verbosity": "executionStats",
+                    "maxTimeMS": settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS
+                }
+            )
+        except Exception as exc:
+            logger.info(f"Explain of slow {command_name} failed: {exc}")
+            return None
+        return summarize_explain(explain)
+
+    def _remember_explained(self, shape_key: str):
+        self._explained[shape_key] = None
+        if len(self._explained) > MAX_EXPLAINED_SHAPES:
+            self._explained.popitem(last=False)
+
+
+class SlowQueryService:
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.slow_queries_collection = db[SLOW_QUERIES_COLLECTION]
+
+    async def rank_shapes(
+        self,
+        limit: int = 20,
+        collection: Optional[str] = None,
+        since_hours: Optional[int] = None
+    ) -> List[dict]:
+        """Slow query shapes ranked by the total time they spent in the database"""
+        match: Dict[str, Any] = {}
+        if collection:
+            match["collection"] = collection
+        if since_hours:
+            match["timestamp"] = {"$gte": datetime.utcnow() - timedelta(hours=since_hours)}
+
+        pipeline: List[Dict[str, Any]] = [{"$match": match}] if match else []
+        pipeline += [
+            {"$group": {
+                "_id": "$shape_id",
+                "collection": {"$first": "$collection"},
+                "command": {"$first": "$command"},
+                "shape": {"$first": "$shape"},
+                "count": {"$sum": 1},
+                "total_ms": {"$sum": "$duration_ms"},
+                "avg_ms": {"$avg": "$duration_ms"},
+                "max_ms": {"$max": "$duration_ms"},
+                "last_seen": {"$max": "$timestamp"},
+                # Only the record of a shape's first occurrence carries an explain
+                "explain": {"$max": "$explain"}
+            }},
+            {"$sort": {"total_ms": -1}},
+            {"$limit": limit}
+        ]
+
+        shapes = []
+        async for doc in self.slow_queries_collection.aggregate(pipeline):
+            doc["shape_id"] = doc.pop("_id")
+            doc["shape"] = json.loads(doc["shape"])
+            doc["avg_ms"] = round(doc["avg_ms"], 3)
+            doc["total_ms"] = round(doc["total_ms"], 3)
+            shapes.append(doc)
+        return shapes
+
+
+slow_query_log = SlowQueryLog()
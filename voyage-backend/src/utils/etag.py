@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, Response, status
+
+
+# Fields needed to compute an ETag without loading the whole document
+ETAG_PROJECTION = {"updated_at": 1, "created_at": 1}
+
+# Content codings the compression middleware may apply; their ETags carry the coding as a suffix
+CONTENT_ENCODINGS = ("gzip", "br")
+
+# Timestamp of derived fields recomputed without a content change (hotel USD prices)
+DERIVED_VERSION_FIELD = "search_updated_at"
+
+
+def _stamp(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def compute_etag(doc: Dict[str, Any]) -> str:
+    """Compute an ETag from a document's id and last modification time.
+
+    Documents with derived fields get a second part from their refresh time,
+    so a cached representation is revalidated when they change, while
+    If-Match compares only the first, content part.
+    """
+    doc_id = doc.get("id") or doc.get("_id")
+    modified = _stamp(doc.get("updated_at") or doc.get("created_at"))
+
+    digest = hashlib.sha1(f"{doc_id}:{modified}".encode("utf-8")).hexdigest()
+    derived = doc.get(DERIVED_VERSION_FIELD)
+    if derived:
+        digest += "." + hashlib.sha1(str(_stamp(derived)).encode("utf-8")).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Strong ETag of a content-encoded representation: the identity ETag with an encoding suffix"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoding(etag: str) -> str:
+    """The identity ETag of a possibly content-encoded representation's ETag"""
+    for encoding in CONTENT_ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def content_version(etag: str) -> str:
+    """The content part of an ETag, without its derived-fields part"""
+    return etag.strip('"').split(".", 1)[0]
+
+
+def etag_matches(header: Optional[str], etag: str, content_only: bool = False, weak: bool = True) -> bool:
+    """Check an If-Match / If-None-Match header value against an ETag (or only its content part).
+
+    If-None-Match uses weak comparison; If-Match needs strong comparison
+    (``weak=False``), where weak candidates never match. The ETags of
+    compressed representations match the identity ETag they were derived from.
+    """
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        candidate = strip_encoding(candidate)
+        if candidate == etag or (content_only and content_version(candidate) == content_version(etag)):
+            return True
+
+    return False
+
+
+def check_if_match(header: Optional[str], doc: Dict[str, Any], resource: str = "Resource") -> None:
+    """Raise 412 if an If-Match header does not match the document's current ETag.
+
+    Only the content part is compared: refreshed derived fields (repriced hotels)
+    do not make an update conflict.
+    """
+    if header and not etag_matches(header, compute_etag(doc), content_only=True, weak=False):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"{resource} has been modified. Please reload and try again."
+        )
+
+
+def not_modified_response(etag: str) -> Response:
+    """Build a 304 Not Modified response"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorCursor
+
+from core.constants import ExportFormat, EXPORT_BATCH_SIZE, EXPORT_FLUSH_SIZE
+from utils.helpers import prepare_document_for_response
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+
+def build_export_projection(fields: List[str]) -> Dict[str, int]:
+    """Build a MongoDB projection covering the exported fields"""
+    projection = {"_id": 1}
+    for field in fields:
+        if field != "id":
+            projection[field] = 1
+    return projection
+
+
+def get_field_value(doc: Dict[str, Any], field: str) -> Any:
+    """Resolve a dotted field path in a document"""
+    value: Any = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def format_export_row(doc: Dict[str, Any], fields: List[str], export_format: ExportFormat) -> str:
+    """Serialize one document as a CSV line or an NDJSON record"""
+    doc = prepare_document_for_response(doc)
+    values = [get_field_value(doc, field) for field in fields]
+    
+    if export_format == ExportFormat.NDJSON:
+        return json.dumps(dict(zip(fields, values)), default=str) + "\n"
+    
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([
+        json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+        for value in values
+    ])
+    return buffer.getvalue()
+
+
+async def iterate_batches(cursor: AsyncIOMotorCursor, size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Documents of a cursor in lists of up to `size`"""
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_filename(name: str, export_format: ExportFormat, compress: bool) -> str:
+    """Build the attachment filename for an export"""
+    filename = f"{name}.{export_format.value}"
+    return f"{filename}.gz" if compress else filename
+
+
+async def stream_export(
+    cursor: Optional[AsyncIOMotorCursor],
+    fields: List[str],
+    export_format: ExportFormat,
+    compress: bool = False,
+    prepare_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Stream cursor documents as CSV or NDJSON chunks
+    
+    Rows are buffered up to EXPORT_FLUSH_SIZE bytes before being sent, so
+    memory use stays constant regardless of how many documents match.
+    
+    Args:
+        cursor: Motor cursor to export, or None for an empty export
+        fields: Dotted field paths to export, in column order
+        export_format: Output format
+        compress: Gzip-compress the stream
+        prepare_batch: Called with each batch of up to EXPORT_BATCH_SIZE documents
+            before they are written, e.g. to add converted amounts
+    
+    Yields:
+        Encoded (and optionally compressed) chunks
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+    
+    chunks: List[str] = []
+    buffered = 0
+    
+    if export_format == ExportFormat.CSV:
+        header = io.StringIO()
+        csv.writer(header).writerow(fields)
+        chunks.append(header.getvalue())
+    
+    if cursor is not None:
+        async for docs in iterate_batches(cursor, EXPORT_BATCH_SIZE):
+            if prepare_batch:
+                prepare_batch(docs)
+            
+            for doc in docs:
+                row = format_export_row(doc, fields, export_format)
+                chunks.append(row)
+                buffered += len(row)
+                
+                if buffered >= EXPORT_FLUSH_SIZE:
+                    data = encode("".join(chunks))
+                    chunks, buffered = [], 0
+                    if data:
+                        yield data
+    
+    data = encode("".join(chunks))
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
@@ -1,8 +1,13 @@
+import hashlib
+import json
 import uuid
 from datetime import datetime, date
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 from bson import ObjectId
 
+# Bookkeeping keys that change on every write and must not affect content hashes
+VOLATILE_FIELDS = {"_id", "id", "created_at", "updated_at"}
+
 
 def generate_confirmation_number() -> str:
     """Generate unique booking confirmation number"""
@@ -58,6 +63,30 @@ def prepare_document_for_response(doc: Dict[str, Any]) -> Dict[str, Any]:
     return doc
 
 
+def normalize_for_hash(value: Any) -> Any:
+    """Strip bookkeeping fields and empty values so equal content normalizes equally"""
+    if isinstance(value, dict):
+        return {
+            key: normalize_for_hash(item)
+            for key, item in value.items()
+            if key not in VOLATILE_FIELDS and item is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_for_hash(item) for item in value]
+    return value
+
+
+def compute_content_hash(value: Any) -> str:
+    """Compute a stable SHA-256 hash of a JSON-like value"""
+    payload = json.dumps(
+        normalize_for_hash(value),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def calculate_nights(check_in: date, check_out: date) -> int:
     """Calculate number of nights between check-in and check-out dates"""
     return (check_out - check_in).days
@@ -90,4 +119,12 @@ def validate_date_range(start_date: date, end_date: date, max_days: int = 365) -
 
 def format_currency(amount: float, currency: str = "USD") -> str:
     """Format currency amount"""
-    return f"{amount:.2f} {currency}"
\ No newline at end of file
+    return f"{amount:.2f} {currency}"
+
+
+def compute_bitmask(values: Iterable[Any], bits: Dict[str, int]) -> int:
+    """OR together the bits of enum values (or their string values); unknown values set no bit"""
+    mask = 0
+    for value in values:
+        mask |= bits.get(getattr(value, "value", value), 0)
+    return mask
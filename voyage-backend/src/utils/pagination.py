@@ -1,6 +1,9 @@
-from typing import Dict, Any, List, TypeVar, Generic
+from typing import Dict, Any, List, Optional, TypeVar, Generic
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
 from schemas.base import PaginationParams, PaginatedResponse
+from core.deadline import is_timeout
+from core.metrics import MONGO_COUNTS_SKIPPED
 
 T = TypeVar('T')
 
@@ -10,7 +13,8 @@ async def paginate_collection(
     filters: Dict[str, Any],
     pagination: PaginationParams,
     sort_field: str = "created_at",
-    sort_direction: int = -1
+    sort_direction: int = -1,
+    allow_partial: bool = False
 ) -> Dict[str, Any]:
     """
     Paginate MongoDB collection with filters
@@ -21,12 +25,15 @@ async def paginate_collection(
         pagination: Pagination parameters
         sort_field: Field to sort by
         sort_direction: 1 for ascending, -1 for descending
+        allow_partial: Fetch the page first and return it without a total
+            (total and pages None) if the deadline runs out while counting
     
     Returns:
         Dictionary with items and pagination info
     """
-    # Count total documents
-    total = await collection.count_documents(filters)
+    if not allow_partial:
+        # Count total documents
+        total = await collection.count_documents(filters)
     
     # Get paginated items
     cursor = collection.find(filters)
@@ -35,15 +42,34 @@ async def paginate_collection(
     
     items = await cursor.to_list(length=pagination.size)
     
+    if allow_partial:
+        total = await count_within_deadline(collection, filters)
+    
+    return page_result(items, total, pagination)
+
+
+def page_result(items: List[Any], total: Optional[int], pagination: PaginationParams) -> Dict[str, Any]:
+    """Dictionary with items and pagination info, as returned by paginate_collection"""
     return {
         "items": items,
         "total": total,
         "page": pagination.page,
         "size": pagination.size,
-        "pages": (total + pagination.size - 1) // pagination.size
+        "pages": None if total is None else (total + pagination.size - 1) // pagination.size
     }
 
 
+async def count_within_deadline(collection: AsyncIOMotorCollection, filters: Dict[str, Any]) -> Optional[int]:
+    """Count matching documents, or None if the deadline runs out first"""
+    try:
+        return await collection.count_documents(filters)
+    except PyMongoError as exc:
+        if not is_timeout(exc):
+            raise
+        MONGO_COUNTS_SKIPPED.labels(collection.name).inc()
+        return None
+
+
 def create_paginated_response(
     items: List[T],
     total: int,
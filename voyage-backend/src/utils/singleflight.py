@@ -0,0 +1,61 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+
+from core.metrics import COALESCED_CALLS
+
+T = TypeVar("T")
+
+
+def call_key(*parts: Any) -> str:
+    """Stable key for a call's arguments (queries, pagination), independent of dict ordering"""
+    return json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+
+
+class SingleFlight(Generic[T]):
+    """Share one in-flight execution between concurrent calls with the same key.
+
+    Nothing is cached: the key is forgotten as soon as the execution
+    finishes, so a call made afterwards runs again. Callers that join get the
+    very same result object (or exception), which they must treat as
+    read-only. A joining request waits on the leader's database deadline,
+    which for the same route started earlier than its own.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, operation: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                return await self._lead(key, operation)
+
+            COALESCED_CALLS.labels(self.name).inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # The leading request went away (e.g. its client disconnected); run it again
+                    continue
+                raise
+
+    async def _lead(self, key: str, operation: Callable[[], Awaitable[T]]) -> T:
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await operation()
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                # Joining calls re-raise it; don't warn when nobody joined
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]